@@ -0,0 +1,321 @@
+from utils.utils import setup_logging, load_config, align_types_df_to_db_schema, sync_dataframe_with_table_schema
+from utils.mock_data import generate_mock_dataset
+from utils.etl_monitor import reset_peak_rss, get_peak_rss_bytes
+from load.load import get_engine, copy_worker_count, benchmark_copy_formats, load_with_copy, incremental_insert, merge_insert, \
+    resolve_copy_format, serialize_for_copy, validate_chunk
+from load.partitions import ensure_partition, ensure_partitions_for_rows, finish_partition
+from load.readers import benchmark_csv_parse, compile_csv_read_options, iter_csv_chunks
+from transform.transform import get_encryption_key, encrypt_dataframe
+from transform.rules import compile_table_rules
+from sqlalchemy import text
+from datetime import datetime
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+STAGES = ('encryption', 'csv_parse', 'validation', 'load_with_copy', 'incremental_insert', 'merge_insert')
+
+# Stages that need a database sink
+DB_STAGES = ('load_with_copy', 'incremental_insert', 'merge_insert')
+
+
+def _null_sink(ctx, chunk):
+    """
+    Stand-in for the database: serialize the chunk exactly as for COPY and discard the payload.
+    """
+    return serialize_for_copy(chunk, process_id=ctx['process_id'], copy_format=ctx['copy_format'],
+                              pg_types=ctx['pg_types'])["rows"]
+
+
+def _postgres_sink(ctx, chunk):
+    """
+    COPY the chunk into the staging table with load_with_copy.
+    """
+    return load_with_copy(chunk, ctx['engine'], ctx['table'], schema=ctx['schema'], process_id=ctx['process_id'],
+                          copy_format=ctx['copy_format'], pg_types=ctx['pg_types'])
+
+
+# Sinks for the load_with_copy stage; add an entry to benchmark another destination
+SINKS = {
+    'postgres': _postgres_sink,
+    'null': _null_sink,
+}
+
+
+def summarize(latencies, rows, peak_rss):
+    """
+    Summarize the per-chunk latencies of a stage.
+
+    Parameters:
+        latencies (list of float): Seconds spent in the stage for each chunk.
+        rows (int): Rows processed by the stage.
+        peak_rss (int or None): Peak resident set size during the stage, in bytes.
+
+    Returns:
+        dict: rows, chunks, seconds, rows_per_sec, p50_ms, p99_ms and peak_rss_mb.
+    """
+    seconds = float(sum(latencies))
+    return {
+        "rows": int(rows),
+        "chunks": len(latencies),
+        "seconds": round(seconds, 6),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3) if latencies else None,
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3) if latencies else None,
+        "peak_rss_mb": round(peak_rss / (1 << 20), 1) if peak_rss is not None else None,
+    }
+
+
+def run_stage(name, chunks, work, max_chunks=None, before=None, after=None):
+    """
+    Time one stage over the chunks of the benchmark file.
+
+    Every chunk is read and brought to the state the stage expects without being timed; only work(chunk)
+    is timed, so each stage is measured on its own. The peak RSS is reset before the stage starts.
+
+    Parameters:
+        name (str): Stage name, used in log messages.
+        chunks (iterable): Chunks prepared for the stage.
+        work (callable): Function of (chunk) returning the number of rows it processed.
+        max_chunks (int, optional): Stop after this many chunks.
+        before (callable, optional): Untimed setup run on each chunk before work (e.g. staging it).
+        after (callable, optional): Untimed cleanup run on each chunk after work.
+
+    Returns:
+        dict: Stage summary from summarize.
+    """
+    logging.info(f"Benchmark stage {name} started")
+    reset_peak_rss()
+    latencies = []
+    rows = 0
+    for idx, chunk in enumerate(chunks):
+        if max_chunks is not None and idx >= max_chunks:
+            break
+        if before is not None:
+            before(chunk)
+        start = time.perf_counter()
+        rows += work(chunk)
+        latencies.append(time.perf_counter() - start)
+        if after is not None:
+            after(chunk)
+    result = summarize(latencies, rows, get_peak_rss_bytes())
+    logging.info(f"Benchmark stage {name}: {result}")
+    return result
+
+
+def timed_reads(file_path, chunk_size, read_options, parse_engine, latencies):
+    """
+    Iterate over the chunks of a CSV file, recording the time spent parsing each one.
+    """
+    reader = iter_csv_chunks(file_path, chunk_size, read_options, parse_engine=parse_engine)
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = next(reader)
+        except StopIteration:
+            return
+        latencies.append(time.perf_counter() - start)
+        yield chunk
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """
+    Flag the stages whose throughput dropped or whose p99 latency grew by more than threshold.
+
+    Parameters:
+        results (dict): Current results.
+        baseline (dict): Results of a previous run (same JSON layout).
+        threshold (float): Allowed relative change, e.g. 0.1 for 10%.
+
+    Returns:
+        list of str: One message per regression.
+    """
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        if previous.get("rows_per_sec") and current.get("rows_per_sec") is not None \
+                and current["rows_per_sec"] < previous["rows_per_sec"] * (1 - threshold):
+            regressions.append(f"{stage}: rows/sec {current['rows_per_sec']:,.0f} vs baseline {previous['rows_per_sec']:,.0f}")
+        if previous.get("p99_ms") and current.get("p99_ms") is not None \
+                and current["p99_ms"] > previous["p99_ms"] * (1 + threshold):
+            regressions.append(f"{stage}: p99 {current['p99_ms']:.1f}ms vs baseline {previous['p99_ms']:.1f}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each ETL stage on generated data and track regressions.")
+    parser.add_argument("--rows", type=int, default=None, help="Rows to generate (default: mock_data num_rows).")
+    parser.add_argument("--seed", type=int, default=42, help="Mock data seed, keep it fixed to compare runs.")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Rows per chunk (default: csv.chunk_size).")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated stages to run, from {STAGES}.")
+    parser.add_argument("--sink", choices=sorted(SINKS), default="postgres",
+                        help="Where load_with_copy writes; 'null' serializes and discards (database stages are skipped).")
+    parser.add_argument("--incremental-chunks", type=int, default=3,
+                        help="Chunks used for the row-by-row incremental_insert stage.")
+    parser.add_argument("--process-id", type=int, default=-1,
+                        help="process_id of benchmark rows; they are deleted from the tables afterwards.")
+    parser.add_argument("--output", default=None, help="Results JSON path (default: benchmarks/results_<timestamp>.json).")
+    parser.add_argument("--baseline", default=None, help="Results JSON of a previous run to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change flagged as a regression.")
+    parser.add_argument("--compare-formats", action="store_true",
+                        help="Also compare untyped/typed parsing and CSV/binary COPY on the target table.")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repetitions per COPY format (--compare-formats).")
+    args = parser.parse_args()
+
+    config = load_config()
+    setup_logging(config)
+    csv_config = config.get("csv", {})
+    chunk_size = args.chunk_size or csv_config.get("chunk_size", 10000)
+    file_entry = config['files_to_tables_tmp'][0]
+    inc_entry = config['files_to_tables_inc'][0]
+    schema, table = file_entry['schema'], file_entry['table']
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages {sorted(unknown)}. Expected some of {STAGES}")
+    if args.sink == 'null':
+        stages = [stage for stage in stages if stage == 'load_with_copy' or stage not in DB_STAGES]
+
+    engine = get_engine(config['database'], workers=copy_worker_count(config['csv']))
+
+    # Generate the benchmark dataset with the configured mock data rules
+    dataset_config = config['mock_data'][0]
+    num_rows = args.rows or dataset_config.get("num_rows", 1000)
+    dataset = os.path.join(os.path.dirname(dataset_config['file_path']) or '.', "benchmark.csv")
+    generate_mock_dataset(dataset, dataset_config['columns'], num_rows, seed=args.seed,
+                          block_size=dataset_config.get("block_size", 1_000_000))
+
+    encryption_config = config['encryption']
+    encryption_key = get_encryption_key(encryption_config)
+    typed_read = csv_config.get("typed_read", False)
+    parse_engine = csv_config.get("parse_engine", "c")
+    read_options = compile_csv_read_options(engine, schema, table, dataset) if typed_read else None
+    rules = compile_table_rules(config, table)
+    columns = sync_dataframe_with_table_schema(pd.read_csv(dataset, nrows=1), engine, schema, table).columns.tolist()
+    copy_format, pg_types = resolve_copy_format(engine, table, schema, csv_config.get("copy_format", "csv"),
+                                                columns=columns + ['process_id'])
+
+    def chunks(stage):
+        # Bring every chunk to the state the stage starts from, outside the timed section
+        for chunk in iter_csv_chunks(dataset, chunk_size, read_options, parse_engine=parse_engine):
+            if stage != 'encryption' and encryption_key is not None:
+                chunk = encrypt_dataframe(chunk, encryption_config, encryption_key)
+            chunk = align_types_df_to_db_schema(chunk.reindex(columns=columns), engine, schema, table)
+            if stage in DB_STAGES:
+                chunk = validate_chunk(chunk, 0, table, config, rules)[0]
+            yield chunk
+
+    ctx = {"engine": engine, "schema": schema, "table": table, "process_id": args.process_id,
+           "copy_format": copy_format, "pg_types": pg_types}
+
+    def delete_benchmark_rows(tables):
+        with engine.begin() as conn:
+            for target_schema, target_table in tables:
+                conn.execute(text(f'DELETE FROM "{target_schema}"."{target_table}" WHERE process_id = :pid'),
+                             {"pid": args.process_id})
+
+    staging = [(schema, table)]
+    staging_and_target = staging + [(inc_entry['target_schema'], inc_entry['target_table'])]
+
+    def stage_chunk(chunk):
+        load_with_copy(chunk, engine, table, schema=schema, process_id=args.process_id,
+                       copy_format=copy_format, pg_types=pg_types)
+        # Month partitions of a partitioned target are created untimed, as main.py does before merging
+        ensure_partitions_for_rows(engine, inc_entry['target_schema'], inc_entry['target_table'], schema, table,
+                                   args.process_id)
+
+    def encrypt(chunk):
+        encrypt_dataframe(chunk, encryption_config, encryption_key)
+        return len(chunk)
+
+    def row_merge(chunk):
+        return incremental_insert(engine, schema, table, inc_entry['target_schema'], inc_entry['target_table'],
+                                  inc_entry['unique_keys'], args.process_id)['inserted']
+
+    def set_merge(chunk):
+        return merge_insert(engine, schema, table, inc_entry['target_schema'], inc_entry['target_table'],
+                            inc_entry['unique_keys'], args.process_id)['inserted']
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "settings": {"rows": num_rows, "seed": args.seed, "chunk_size": chunk_size, "sink": args.sink,
+                     "copy_format": copy_format, "typed_read": typed_read, "parse_engine": parse_engine,
+                     "max_workers": csv_config.get("max_workers", 1), "encryption_mode": encryption_config.get("mode", "fernet")},
+        "stages": {},
+    }
+
+    uses_db = args.sink == 'postgres' and bool(set(stages) & set(DB_STAGES))
+    if uses_db:
+        # A staging table partitioned by process_id needs the benchmark process partition before any COPY
+        ensure_partition(engine, schema, table, args.process_id)
+
+    try:
+        for stage in stages:
+            if stage == 'csv_parse':
+                # The reader itself is the stage: time each chunk's parse
+                latencies = []
+                reset_peak_rss()
+                rows = sum(len(chunk) for chunk in timed_reads(dataset, chunk_size, read_options, parse_engine, latencies))
+                results["stages"][stage] = summarize(latencies, rows, get_peak_rss_bytes())
+            elif stage == 'encryption':
+                if encryption_key is None:
+                    logging.info("Encryption is disabled; skipping the encryption stage")
+                    continue
+                results["stages"][stage] = run_stage(stage, chunks(stage), encrypt)
+            elif stage == 'validation':
+                results["stages"][stage] = run_stage(stage, chunks(stage),
+                                                     lambda chunk: len(validate_chunk(chunk, 0, table, config, rules)[0]))
+            elif stage == 'load_with_copy':
+                results["stages"][stage] = run_stage(stage, chunks(stage), lambda chunk: SINKS[args.sink](ctx, chunk))
+                if args.sink == 'postgres':
+                    delete_benchmark_rows(staging)
+            else:
+                # Each chunk is staged untimed, merged (timed) and removed from the staging table again
+                work, max_chunks = (row_merge, args.incremental_chunks) if stage == 'incremental_insert' else (set_merge, None)
+                results["stages"][stage] = run_stage(stage, chunks(stage), work, max_chunks=max_chunks,
+                                                     before=stage_chunk, after=lambda chunk: delete_benchmark_rows(staging))
+                delete_benchmark_rows(staging_and_target)
+    finally:
+        if uses_db:
+            delete_benchmark_rows(staging_and_target)
+            finish_partition(engine, schema, table, args.process_id, 'drop')
+
+    if args.compare_formats:
+        target_schema, target_table = inc_entry['target_schema'], inc_entry['target_table']
+        df = align_types_df_to_db_schema(pd.read_csv(dataset), engine, target_schema, target_table)
+        results["formats"] = {
+            "parse_seconds_per_million": benchmark_csv_parse(dataset, engine, target_schema, target_table, chunk_size),
+            "copy": benchmark_copy_formats(df, engine, target_table, schema=target_schema, repeats=args.repeats),
+        }
+
+    output = args.output or os.path.join("benchmarks", f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'stage':<20}{'rows/s':>14}{'p50 ms':>10}{'p99 ms':>10}{'peak MB':>10}")
+    for stage, result in results["stages"].items():
+        rate = f"{result['rows_per_sec']:,.0f}" if result['rows_per_sec'] else "-"
+        print(f"{stage:<20}{rate:>14}{result['p50_ms'] or 0:>10.2f}{result['p99_ms'] or 0:>10.2f}{result['peak_rss_mb'] or 0:>10.1f}")
+    print(f"Results saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+            logging.warning(f"Benchmark regression against {args.baseline}: {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
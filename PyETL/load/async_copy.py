@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import threading
+import time
+from load.checkpoints import insert_checkpoint_async
+from load.partitions import is_missing_partition_error
+
+# Loaders selectable with csv.loader
+LOADERS = ('thread', 'async')
+
+
+def require_asyncpg():
+    """
+    Import asyncpg, raising an ImportError that names the setting needing it when it is not installed.
+    """
+    try:
+        import asyncpg
+    except ImportError as e:
+        raise ImportError("csv.loader 'async' requires the asyncpg package (pip install asyncpg)") from e
+    return asyncpg
+
+
+class AsyncCopyPool:
+    """
+    Pool of asyncpg connections driven by an asyncio event loop on one background thread.
+
+    Every COPY is a coroutine on that loop, so N concurrent COPY streams need N connections but no
+    thread per stream: while one stream waits on the network the loop sends the others. Coroutines are
+    handed in from any thread with submit(), which returns a concurrent.futures.Future, so the caller can
+    wait on COPYs and on CPU pool futures alike. Use as a context manager, or call close().
+    """
+
+    def __init__(self, db_config, size):
+        asyncpg = require_asyncpg()
+        self.size = max(1, size)
+        self._acquire_times = []
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='etl-async-copy', daemon=True)
+        self._thread.start()
+        start = time.perf_counter()
+        try:
+            self._pool = self.run(self._create_pool(asyncpg, db_config))
+        except Exception:
+            self._stop_loop()
+            raise
+        logging.info(f"Opened {self.size} async COPY connections in {time.perf_counter() - start:.3f}s")
+
+    async def _create_pool(self, asyncpg, db_config):
+        # Created on the loop thread, which the pool binds to; empty host or port fall back to the
+        # libpq environment (PGHOST, PGPORT), as with psycopg2
+        return await asyncpg.create_pool(
+            host=db_config.get('host') or None, port=db_config.get('port') or None, user=db_config.get('user'),
+            password=db_config.get('password'), database=db_config.get('database'),
+            min_size=self.size, max_size=self.size)
+
+    def submit(self, coro):
+        """
+        Schedule a coroutine on the pool's event loop from any thread.
+
+        Returns:
+            concurrent.futures.Future: Result of the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro):
+        """
+        Run a coroutine on the pool's event loop and wait for its result.
+        """
+        return self.submit(coro).result()
+
+    async def _copy(self, conn, payload, table_name, schema):
+        data = payload["data"]
+        if payload["format"] != 'binary':
+            data = data.encode('utf-8')
+        # A memoryview, since asyncpg would take bytes for a file path
+        await conn.copy_to_table(table_name, source=memoryview(data), columns=payload["columns"], schema_name=schema,
+                                 format=payload["format"])
+
+    async def copy_payload(self, payload, table_name, schema=None, process_id=None, checkpoint=None, extra_copies=None):
+        """
+        Send a payload built by serialize_for_copy with COPY on a pooled connection and commit it.
+
+        Same contract as load.load.copy_payload: the checkpoint (if given), the COPY and the extra copies
+        (e.g. rejected rows) commit in one transaction, integrity errors reject the chunk and other errors,
+        including rows with no partition to go to, are raised.
+
+        Returns:
+            int: Number of rows loaded (0 if rejected by an integrity error or already committed).
+        """
+        asyncpg = require_asyncpg()
+        table_fullname = f'{schema}.{table_name}' if schema else table_name
+        start = time.perf_counter()
+        async with self._pool.acquire() as conn:
+            self._acquire_times.append(time.perf_counter() - start)
+            try:
+                async with conn.transaction():
+                    if checkpoint is not None and not await insert_checkpoint_async(conn, checkpoint, payload['rows']):
+                        logging.info(f"[Chunk-{checkpoint['chunk_idx']}] already committed to {table_fullname}, COPY skipped (process_id={process_id})")
+                        return 0
+                    await self._copy(conn, payload, table_name, schema)
+                    for extra_payload, extra_table, extra_schema in extra_copies or []:
+                        await self._copy(conn, extra_payload, extra_table, extra_schema)
+            except asyncpg.UniqueViolationError as e:
+                logging.warning(f"Duplicate records detected (process_id={process_id}): {e.detail or e}")
+                return 0
+            except asyncpg.CheckViolationError as e:
+                if is_missing_partition_error(e.message):
+                    logging.error(f"No partition of {table_fullname} accepts the rows (process_id={process_id}): {e}")
+                    raise
+                logging.warning(f"Constraint violation (e.g., quantity >= 1) detected (process_id={process_id}): {e.detail or e}")
+                return 0
+            except asyncpg.IntegrityConstraintViolationError as e:
+                logging.error(f"Database integrity error (process_id={process_id}): {e}")
+                return 0
+
+        logging.info(f"Loaded {payload['rows']} records into {table_fullname} using async {payload['format']} COPY (process_id={process_id})")
+        return payload['rows']
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def close(self):
+        """
+        Close the connections and stop the event loop, logging the connection acquire latency.
+        """
+        try:
+            self.run(self._pool.close())
+        finally:
+            self._stop_loop()
+        if self._acquire_times:
+            logging.info(f"Closed {self.size} async COPY connections after {len(self._acquire_times)} COPYs (acquire wait avg "
+                         f"{sum(self._acquire_times) / len(self._acquire_times) * 1000:.1f}ms, max {max(self._acquire_times) * 1000:.1f}ms)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,260 @@
+import struct
+import threading
+import numpy as np
+import pandas as pd
+
+# PostgreSQL binary COPY framing: signature, flags field and header extension length
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('>h', -1)
+
+# Microseconds between the Unix epoch and the PostgreSQL epoch (2000-01-01)
+PG_EPOCH_OFFSET_US = 946684800000000
+PG_EPOCH_OFFSET_DAYS = 10957
+
+# Binary wire type for each supported PostgreSQL type: (kind, numpy big-endian dtype)
+PG_BINARY_TYPES = {
+    'int2': ('int', '>i2'),
+    'int4': ('int', '>i4'),
+    'int8': ('int', '>i8'),
+    'float4': ('float', '>f4'),
+    'float8': ('float', '>f8'),
+    'bool': ('bool', 'u1'),
+    'date': ('date', '>i4'),
+    'timestamp': ('timestamp', '>i8'),
+    'timestamptz': ('timestamp', '>i8'),
+    'text': ('text', None),
+}
+
+_local = threading.local()
+
+
+def pg_binary_type(db_type_str):
+    """
+    Map a PostgreSQL column type name (as rendered by SQLAlchemy) to its binary COPY wire type.
+
+    Parameters:
+        db_type_str (str): Column type, e.g. 'INTEGER', 'VARCHAR(100)', 'TIMESTAMP WITHOUT TIME ZONE'.
+
+    Returns:
+        str or None: Key of PG_BINARY_TYPES, or None if the type has no binary encoder.
+    """
+    type_str = db_type_str.upper()
+    if type_str.startswith('SMALLINT'):
+        return 'int2'
+    if type_str.startswith('BIGINT'):
+        return 'int8'
+    if type_str.startswith('INTEGER') or type_str == 'INT':
+        return 'int4'
+    if type_str.startswith('REAL'):
+        return 'float4'
+    if type_str.startswith('DOUBLE') or type_str.startswith('FLOAT'):
+        return 'float8'
+    if type_str.startswith('BOOLEAN'):
+        return 'bool'
+    if type_str.startswith('TIMESTAMP'):
+        return 'timestamptz' if 'WITH TIME ZONE' in type_str and 'WITHOUT' not in type_str else 'timestamp'
+    if type_str == 'DATE':
+        return 'date'
+    if type_str.startswith('VARCHAR') or type_str.startswith('CHAR') or type_str == 'TEXT':
+        return 'text'
+    return None
+
+
+def _get_buffer(size):
+    """
+    Return a thread-local uint8 buffer of at least `size` bytes, growing it only when needed
+    so consecutive chunks on the same worker reuse the same allocation.
+    """
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or buffer.size < size:
+        buffer = np.empty(max(size, 2 * (buffer.size if buffer is not None else 0)), dtype=np.uint8)
+        _local.buffer = buffer
+    return buffer
+
+
+def _fixed_width_values(series, kind, wire_dtype):
+    """
+    Convert a column to a (values, null_mask) pair of big-endian fixed-width values. Values that do not
+    convert to the column type are NULL.
+    """
+    null_mask = series.isna().to_numpy()
+    if kind == 'int':
+        numbers = pd.to_numeric(series, errors='coerce')
+        if pd.api.types.is_integer_dtype(numbers.dtype):
+            null_mask = numbers.isna().to_numpy()
+            values = numbers.to_numpy(dtype='int64', na_value=0)
+        else:
+            # Like unparsable values, non-integral ones (e.g. '1.5') are sent as NULL rather than rounded
+            floats = numbers.to_numpy(dtype='float64', na_value=np.nan)
+            null_mask = ~np.isfinite(floats) | (floats != np.trunc(floats))
+            values = np.where(null_mask, 0, floats).astype('int64')
+    elif kind == 'float':
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        null_mask = null_mask | np.isnan(values)
+    elif kind == 'bool':
+        values = series.astype('boolean').to_numpy(dtype='bool', na_value=False)
+    else:
+        timestamps = pd.to_datetime(series, errors='coerce')
+        if getattr(timestamps.dt, 'tz', None) is not None:
+            timestamps = timestamps.dt.tz_convert('UTC').dt.tz_localize(None)
+        null_mask = timestamps.isna().to_numpy()
+        if kind == 'date':
+            values = timestamps.to_numpy(dtype='datetime64[D]').astype('int64') - PG_EPOCH_OFFSET_DAYS
+        else:
+            values = timestamps.to_numpy(dtype='datetime64[us]').astype('int64') - PG_EPOCH_OFFSET_US
+        # NaT becomes the int64 minimum; zero it so the (unwritten) null slots cannot overflow
+        values = np.where(null_mask, 0, values)
+    return values.astype(wire_dtype), null_mask
+
+
+def _arrow_text_values(series):
+    """
+    Read the UTF-8 bytes and offsets of a pyarrow-backed string column straight from its Arrow buffers,
+    without creating a Python string per value. Returns None if the column is not a plain Arrow string array.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    array = pa.array(series.array)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    if pa.types.is_string(array.type):
+        offset_dtype = np.int32
+    elif pa.types.is_large_string(array.type):
+        offset_dtype = np.int64
+    else:
+        return None
+
+    null_mask = array.is_null().to_numpy(zero_copy_only=False)
+    # Compact the non-null values so their bytes are contiguous in the data buffer
+    present = pc.drop_null(array) if null_mask.any() else array
+    _, offsets_buffer, data_buffer = present.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=offset_dtype)[present.offset:present.offset + len(present) + 1].astype(np.int64)
+    if data_buffer is None or not len(present):
+        flat = np.empty(0, dtype=np.uint8)
+    else:
+        flat = np.frombuffer(data_buffer, dtype=np.uint8)[offsets[0]:offsets[-1]]
+    row_lengths = np.zeros(len(series), dtype=np.int64)
+    row_lengths[~null_mask] = np.diff(offsets)
+    return flat, row_lengths, null_mask
+
+
+def _text_values(series):
+    """
+    Encode a column as UTF-8 with a single encode call over the joined values. Pyarrow-backed string
+    columns (e.g. from Parquet or Arrow IPC sources) are read from their Arrow buffers instead.
+
+    Returns:
+        tuple: (flat uint8 array with the concatenated non-null values, per-row byte lengths, null mask)
+    """
+    if getattr(series.dtype, 'storage', None) == 'pyarrow':
+        encoded = _arrow_text_values(series)
+        if encoded is not None:
+            return encoded
+    null_mask = series.isna().to_numpy()
+    values = series[~null_mask].astype(str).tolist()
+    joined = ''.join(values).encode('utf-8')
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    if len(joined) != lengths.sum():
+        # Multi-byte characters present: character counts differ from byte counts
+        lengths = np.fromiter((len(value.encode('utf-8')) for value in values), dtype=np.int64, count=len(values))
+    row_lengths = np.zeros(len(series), dtype=np.int64)
+    row_lengths[~null_mask] = lengths
+    return np.frombuffer(joined, dtype=np.uint8), row_lengths, null_mask
+
+
+def encode_binary_copy(columns, pg_types):
+    """
+    Encode a set of columns in PostgreSQL binary COPY format.
+
+    Columns are encoded as whole arrays: fixed-width values are converted to big-endian NumPy arrays,
+    text columns are UTF-8 encoded in bulk, and every field is scattered into a reusable
+    thread-local byte buffer (text values with one slice copy per value), so no intermediate CSV
+    text is produced.
+
+    Parameters:
+        columns (dict): Ordered mapping of column name to pandas Series of equal length
+                        (e.g. dict(df.items())); the order defines the COPY column list.
+        pg_types (dict): Mapping of column name to a PG_BINARY_TYPES key (see pg_binary_type).
+
+    Returns:
+        memoryview: View over the encoded payload. It is only valid until the next call on the same thread.
+
+    Raises:
+        ValueError: If a column has no binary type mapping.
+    """
+    n_cols = len(columns)
+    n_rows = len(next(iter(columns.values()))) if n_cols else 0
+
+    fields = []
+    field_lengths = np.zeros((n_rows, n_cols), dtype=np.int64)
+    for j, col in enumerate(columns):
+        wire_type = pg_types.get(col)
+        if wire_type not in PG_BINARY_TYPES:
+            raise ValueError(f"Column '{col}' has no binary COPY encoder (type={wire_type})")
+        kind, wire_dtype = PG_BINARY_TYPES[wire_type]
+        if kind == 'text':
+            flat, lengths, null_mask = _text_values(columns[col])
+            fields.append((kind, flat, lengths, null_mask))
+            field_lengths[:, j] = 4 + lengths
+        else:
+            values, null_mask = _fixed_width_values(columns[col], kind, wire_dtype)
+            width = values.dtype.itemsize
+            fields.append((kind, values, width, null_mask))
+            field_lengths[:, j] = np.where(null_mask, 4, 4 + width)
+
+    row_lengths = 2 + field_lengths.sum(axis=1)
+    row_starts = len(PGCOPY_HEADER) + np.concatenate(([0], np.cumsum(row_lengths)[:-1])) if n_rows else np.empty(0, dtype=np.int64)
+    total_size = len(PGCOPY_HEADER) + int(row_lengths.sum()) + len(PGCOPY_TRAILER)
+
+    out = _get_buffer(total_size)
+    out_view = memoryview(out)
+    out[:len(PGCOPY_HEADER)] = np.frombuffer(PGCOPY_HEADER, dtype=np.uint8)
+    out[total_size - len(PGCOPY_TRAILER):total_size] = np.frombuffer(PGCOPY_TRAILER, dtype=np.uint8)
+
+    if n_rows:
+        # Field count prefix of every tuple
+        field_count = np.full(n_rows, n_cols, dtype='>i2').view(np.uint8).reshape(n_rows, 2)
+        out[row_starts[:, None] + np.arange(2)] = field_count
+
+        field_starts = row_starts + 2
+        for j, (kind, values, size_info, null_mask) in enumerate(fields):
+            data_lengths = field_lengths[:, j] - 4
+            header = np.where(null_mask, -1, data_lengths).astype('>i4').view(np.uint8).reshape(n_rows, 4)
+            out[field_starts[:, None] + np.arange(4)] = header
+
+            present = ~null_mask
+            data_starts = field_starts[present] + 4
+            if kind == 'text':
+                # A per-byte index array would be 8x the text size; copy each value's bytes as a slice instead
+                lengths = size_info[present]
+                if values.size:
+                    flat_view = memoryview(values)
+                    flat_ends = np.cumsum(lengths)
+                    for start, flat_start, flat_end in zip(data_starts.tolist(), (flat_ends - lengths).tolist(), flat_ends.tolist()):
+                        out_view[start:start + flat_end - flat_start] = flat_view[flat_start:flat_end]
+            else:
+                width = size_info
+                data = values[present].view(np.uint8).reshape(-1, width)
+                out[data_starts[:, None] + np.arange(width)] = data
+            field_starts = field_starts + field_lengths[:, j]
+
+    return memoryview(out)[:total_size]
+
+
+class BinaryCopyReader:
+    """
+    Minimal file-like reader over an encoded payload, as expected by psycopg2's copy_expert,
+    that hands out slices of the buffer without copying it into a BytesIO first.
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.position = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self.payload) - self.position
+        chunk = self.payload[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk.tobytes()
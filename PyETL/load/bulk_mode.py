@@ -0,0 +1,295 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+
+# Order in which deferred objects are restored: sequence settings, then secondary indexes (built in
+# parallel), then constraints
+RESTORE_ORDER = ('sequence', 'index', 'constraint')
+
+# First key of the session advisory lock (BULK_LOCK_CLASS, process_id) a running process holds, so other
+# runs can tell its deferred objects from those of an aborted run
+BULK_LOCK_CLASS = 7301
+
+
+def bulk_state_table(config):
+    """
+    Full name of the table recording the objects dropped by bulk mode (load_process.bulk_state_table), or None.
+    """
+    load_proc = config.get('load_process', {})
+    table_name = load_proc.get('bulk_state_table')
+    if not table_name:
+        return None
+    return f"{load_proc['schema']}.{table_name}"
+
+
+def bulk_load_settings(config, table):
+    """
+    Bulk mode settings of a table (tables.<table>.bulk_load), or None if bulk mode is not enabled for it.
+    """
+    settings = config.get('tables', {}).get(table, {}).get('bulk_load')
+    if not settings or not settings.get('enabled', False):
+        return None
+    return settings
+
+
+def _record_and_run(conn, state_table, process_id, table_fullname, object_type, object_name, restore_sql, sql):
+    """
+    Save how to restore an object and change it on the same transaction, so a dropped object is never lost.
+    """
+    conn.execute(text(f"""
+        INSERT INTO {state_table} (process_id, table_name, object_type, object_name, restore_sql)
+        VALUES (:process_id, :table_name, :object_type, :object_name, :restore_sql)
+    """), {"process_id": process_id, "table_name": table_fullname, "object_type": object_type,
+           "object_name": object_name, "restore_sql": restore_sql})
+    conn.exec_driver_sql(sql)
+
+
+def enter_bulk_mode(engine, state_table, schema, table, settings, process_id):
+    """
+    Prepare a table for a large load by removing the per-row work done while rows are copied into it.
+
+    Depending on the settings, secondary indexes (indexes: true), the PRIMARY KEY (primary_key: true),
+    UNIQUE constraints (unique_constraints, default: as primary_key) and CHECK constraints
+    (check_constraints: true) are dropped, and the cache of the
+    sequences feeding column defaults is raised to sequence_cache values. The statement restoring each
+    object is stored in the state table in the same transaction as the change, so a run that aborts at
+    any point leaves everything needed to rebuild it with restore_bulk_objects.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        state_table (str): State table from bulk_state_table.
+        schema (str): Schema of the table.
+        table (str): Table name.
+        settings (dict): Result of bulk_load_settings.
+        process_id (int): Current ETL process ID.
+
+    Returns:
+        int: Number of objects changed.
+    """
+    table_fullname = f'"{schema}"."{table}"'
+    params = {"table": table_fullname}
+    changed = 0
+    with engine.begin() as conn:
+        if settings.get('indexes', True):
+            # Indexes not backing a constraint, on the table itself (a partitioned index covers its partitions)
+            indexes = conn.execute(text("""
+                SELECT ci.relname AS name, pg_get_indexdef(i.indexrelid) AS definition
+                FROM pg_index i
+                JOIN pg_class ci ON ci.oid = i.indexrelid
+                WHERE i.indrelid = CAST(:table AS regclass)
+                  AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+                ORDER BY ci.relname
+            """), params).fetchall()
+            for index in indexes:
+                # The definition of a partitioned index reads 'ON ONLY'; rebuilt that way it would cover no partition
+                _record_and_run(conn, state_table, process_id, table_fullname, 'index', index.name,
+                                index.definition.replace(' ON ONLY ', ' ON ', 1), f'DROP INDEX "{schema}"."{index.name}"')
+                changed += 1
+
+        # UNIQUE constraints follow primary_key unless unique_constraints is set
+        contypes = [contype for contype, option, default in (('p', 'primary_key', False),
+                                                             ('u', 'unique_constraints', settings.get('primary_key', False)),
+                                                             ('c', 'check_constraints', True))
+                    if settings.get(option, default)]
+        if contypes:
+            constraints = conn.execute(text("""
+                SELECT conname AS name, pg_get_constraintdef(oid) AS definition
+                FROM pg_constraint
+                WHERE conrelid = CAST(:table AS regclass) AND contype = ANY(:contypes) AND conislocal
+                ORDER BY contype, conname
+            """), {**params, "contypes": contypes}).fetchall()
+            for constraint in constraints:
+                _record_and_run(conn, state_table, process_id, table_fullname, 'constraint', constraint.name,
+                                f'ALTER TABLE {table_fullname} ADD CONSTRAINT "{constraint.name}" {constraint.definition}',
+                                f'ALTER TABLE {table_fullname} DROP CONSTRAINT "{constraint.name}"')
+                changed += 1
+
+        sequence_cache = settings.get('sequence_cache')
+        if sequence_cache:
+            # Sequences referenced by the column defaults, owned by the table or not (sales_tmp.id uses sales_id_seq)
+            sequences = conn.execute(text("""
+                SELECT DISTINCT CAST(CAST(s.oid AS regclass) AS text) AS name, ps.seqcache AS cache
+                FROM pg_attrdef d
+                JOIN pg_depend dep ON dep.classid = CAST('pg_attrdef' AS regclass) AND dep.objid = d.oid
+                                  AND dep.refclassid = CAST('pg_class' AS regclass)
+                JOIN pg_class s ON s.oid = dep.refobjid AND s.relkind = 'S'
+                JOIN pg_sequence ps ON ps.seqrelid = s.oid
+                WHERE d.adrelid = CAST(:table AS regclass)
+            """), params).fetchall()
+            for sequence in sequences:
+                if sequence.cache >= sequence_cache:
+                    continue
+                _record_and_run(conn, state_table, process_id, table_fullname, 'sequence', sequence.name,
+                                f"ALTER SEQUENCE {sequence.name} CACHE {sequence.cache}",
+                                f"ALTER SEQUENCE {sequence.name} CACHE {int(sequence_cache)}")
+                changed += 1
+
+    logging.info(f"Bulk mode on {schema}.{table} for process_id={process_id}: {changed} indexes, constraints "
+                 f"and sequences deferred until the load finishes")
+    return changed
+
+
+def hold_process_lock(engine, process_id):
+    """
+    Take the session advisory lock that marks a process as running for restore_abandoned_bulk_objects.
+
+    The lock lives as long as the returned connection, and PostgreSQL releases it when the process dies,
+    so an aborted run never leaves it behind.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        process_id (int): Current ETL process ID.
+
+    Returns:
+        sqlalchemy.Connection: Connection holding the lock; close it when the process ends.
+    """
+    conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        conn.execute(text("SELECT pg_advisory_lock(:lock_class, :process_id)"),
+                     {"lock_class": BULK_LOCK_CLASS, "process_id": process_id})
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def _restore_object(engine, state_table, row, maintenance_workers, maintenance_work_mem):
+    """
+    Run the restore statement of one object and delete its state row on the same transaction.
+    """
+    start_time = time.perf_counter()
+    with engine.begin() as conn:
+        if row.object_type in ('index', 'constraint'):
+            # Parallel workers of a single index build (also for PRIMARY KEY and UNIQUE); several indexes are built at once
+            conn.execute(text(f"SET LOCAL max_parallel_maintenance_workers = {int(maintenance_workers)}"))
+            if maintenance_work_mem:
+                conn.execute(text(f"SET LOCAL maintenance_work_mem = '{maintenance_work_mem}'"))
+        # Catalog definitions are run verbatim, without bind parameter parsing
+        conn.exec_driver_sql(row.restore_sql)
+        conn.execute(text(f"DELETE FROM {state_table} WHERE id = :id"), {"id": row.id})
+    logging.info(f"Restored {row.object_type} {row.object_name} on {row.table_name} in {time.perf_counter() - start_time:.2f}s")
+
+
+def restore_bulk_objects(engine, state_table, tables=None, settings=None, process_ids=None):
+    """
+    Restore the indexes, constraints and sequence settings recorded by enter_bulk_mode.
+
+    Sequences are restored first, then the indexes are rebuilt rebuild_workers at a time, each with up to
+    maintenance_workers parallel workers, and finally the constraints are added back (validating the
+    rows). An object that cannot be restored (e.g. a UNIQUE constraint violated by the loaded rows) keeps
+    its state row, so it is retried on the next run, and the error is raised once the others are done.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        state_table (str): State table from bulk_state_table.
+        tables (iterable of str, optional): Restore only these tables ('"schema"."table"'); all if None.
+        settings (dict, optional): Bulk mode settings with 'rebuild_workers', 'maintenance_workers' and
+                                   'maintenance_work_mem'.
+        process_ids (iterable of int, optional): Restore only the objects deferred by these processes; all if None.
+
+    Returns:
+        int: Number of objects restored.
+
+    Raises:
+        RuntimeError: If some objects could not be restored.
+    """
+    settings = settings or {}
+    query = f"SELECT id, process_id, table_name, object_type, object_name, restore_sql FROM {state_table}"
+    filters = []
+    params = {}
+    if tables is not None:
+        filters.append("table_name = ANY(:tables)")
+        params["tables"] = list(tables)
+    if process_ids is not None:
+        filters.append("process_id = ANY(:process_ids)")
+        params["process_ids"] = list(process_ids)
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    with engine.connect() as conn:
+        rows = conn.execute(text(query + " ORDER BY id"), params).fetchall()
+    if not rows:
+        return 0
+
+    restore = lambda row: _restore_object(engine, state_table, row, settings.get('maintenance_workers', 2),
+                                          settings.get('maintenance_work_mem'))
+    restored = 0
+    errors = []
+    for object_type in RESTORE_ORDER:
+        batch = [row for row in rows if row.object_type == object_type]
+        workers = max(1, settings.get('rebuild_workers', 2)) if object_type == 'index' else 1
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='etl-rebuild') as pool:
+            for row, future in [(row, pool.submit(restore, row)) for row in batch]:
+                try:
+                    future.result()
+                    restored += 1
+                except Exception as e:
+                    logging.error(f"Could not restore {row.object_type} {row.object_name} on {row.table_name}: {e}")
+                    errors.append(row.object_name)
+
+    if errors:
+        raise RuntimeError(f"Bulk mode objects not restored (kept in {state_table} for the next run): {', '.join(errors)}")
+    return restored
+
+
+def restore_abandoned_bulk_objects(engine, state_table, process_id, settings=None):
+    """
+    Rebuild what aborted runs left deferred, without touching the objects of runs still loading.
+
+    The objects of a process are abandoned when it is the current process (a resumed run) or when its
+    lock from hold_process_lock can be taken, i.e. no live session holds it any more. The lock is kept
+    while its objects are restored, so a run resuming that process waits for the rebuild.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        state_table (str): State table from bulk_state_table.
+        process_id (int): Current ETL process ID.
+        settings (dict, optional): Bulk mode settings, as for restore_bulk_objects.
+
+    Returns:
+        int: Number of objects restored.
+    """
+    with engine.connect() as conn:
+        owners = conn.execute(text(f"SELECT DISTINCT process_id FROM {state_table} ORDER BY process_id")).scalars().all()
+    restored = 0
+    for owner in owners:
+        if owner == process_id:
+            restored += restore_bulk_objects(engine, state_table, settings=settings, process_ids=[owner])
+            continue
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            params = {"lock_class": BULK_LOCK_CLASS, "process_id": owner}
+            if not conn.execute(text("SELECT pg_try_advisory_lock(:lock_class, :process_id)"), params).scalar():
+                logging.info(f"Bulk mode objects of process_id={owner} left alone: the process is still running")
+                continue
+            try:
+                restored += restore_bulk_objects(engine, state_table, settings=settings, process_ids=[owner])
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:lock_class, :process_id)"), params)
+    return restored
+
+
+def analyze_table(engine, schema, table):
+    """
+    Refresh the planner statistics of a table after a bulk load.
+    """
+    start_time = time.perf_counter()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f'ANALYZE "{schema}"."{table}"'))
+    logging.info(f"Analyzed {schema}.{table} in {time.perf_counter() - start_time:.2f}s")
+
+
+def leave_bulk_mode(engine, state_table, schema, table, settings, analyze=True):
+    """
+    Restore what enter_bulk_mode deferred on a table and, unless disabled (analyze: false), run ANALYZE.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        state_table (str): State table from bulk_state_table.
+        schema (str): Schema of the table.
+        table (str): Table name.
+        settings (dict): Result of bulk_load_settings.
+        analyze (bool): Analyze the table once restored (skipped after a failed load).
+    """
+    restore_bulk_objects(engine, state_table, [f'"{schema}"."{table}"'], settings)
+    if analyze and settings.get('analyze', True):
+        analyze_table(engine, schema, table)
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import os
+from sqlalchemy import text
+
+# Bytes hashed from each end of a file for its fingerprint
+FINGERPRINT_BYTES = 1 << 20
+
+CHECKPOINT_COLUMNS = ('process_id', 'file_path', 'file_fingerprint', 'target_table', 'chunk_idx', 'row_offset',
+                      'byte_offset', 'rows_committed')
+
+
+def checkpoint_table(config):
+    """
+    Full name of the chunk checkpoint table (load_process.checkpoint_table), or None if checkpoints are disabled.
+    """
+    load_proc = config.get('load_process', {})
+    table_name = load_proc.get('checkpoint_table')
+    if not table_name:
+        return None
+    return f"{load_proc['schema']}.{table_name}"
+
+
+def file_fingerprint(file_path):
+    """
+    Content fingerprint of a file: SHA-256 of its size and of its first and last megabyte.
+
+    It identifies the file a checkpoint belongs to without reading the whole file, and changes when the
+    file is regenerated or re-encrypted (Fernet tokens differ on every run).
+
+    Parameters:
+        file_path (str): Path to the file.
+
+    Returns:
+        str: Hex digest.
+    """
+    size = os.path.getsize(file_path)
+    digest = hashlib.sha256(str(size).encode('ascii'))
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            f.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_committed_chunks(engine, table_fullname, process_id, file_path, fingerprint, target_table):
+    """
+    Read the chunks of a file already committed into a target table by a process.
+
+    Checkpoints recorded for the same file path under a different fingerprint are reported, since the file
+    changed since they were written and its chunks cannot be skipped.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        table_fullname (str): Checkpoint table from checkpoint_table.
+        process_id (int): ETL process ID.
+        file_path (str): Source file path.
+        fingerprint (str): Fingerprint of the file from file_fingerprint.
+        target_table (str): Table the chunks are copied into ('schema.table').
+
+    Returns:
+        dict: Chunk index to {'row_offset', 'byte_offset', 'rows_committed'}.
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"""
+            SELECT file_fingerprint, chunk_idx, row_offset, byte_offset, rows_committed
+            FROM {table_fullname}
+            WHERE process_id = :process_id AND file_path = :file_path AND target_table = :target_table
+        """), {"process_id": process_id, "file_path": file_path, "target_table": target_table}).fetchall()
+
+    stale = sum(1 for row in rows if row.file_fingerprint != fingerprint)
+    if stale:
+        logging.warning(f"{stale} checkpoints of {file_path} (process_id={process_id}) were written for a different "
+                        f"version of the file and are ignored; rows they committed to {target_table} remain")
+    return {row.chunk_idx: {"row_offset": row.row_offset, "byte_offset": row.byte_offset, "rows_committed": row.rows_committed}
+            for row in rows if row.file_fingerprint == fingerprint}
+
+
+def insert_checkpoint(cursor, checkpoint, rows_committed):
+    """
+    Insert a chunk checkpoint on the cursor's open transaction, before the chunk's COPY.
+
+    The insert uses ON CONFLICT DO NOTHING, so when the chunk is already committed no row is inserted and
+    the caller can roll back instead of copying it twice. Committed together with the COPY, the checkpoint
+    exists if and only if the chunk's rows do.
+
+    Parameters:
+        cursor: psycopg2 cursor of the COPY connection.
+        checkpoint (dict): 'table' (from checkpoint_table) plus the values of CHECKPOINT_COLUMNS except rows_committed.
+        rows_committed (int): Rows the COPY will load.
+
+    Returns:
+        bool: True if the checkpoint was inserted, False if the chunk was already committed.
+    """
+    values = {**checkpoint, "rows_committed": rows_committed}
+    cursor.execute(
+        f"INSERT INTO {checkpoint['table']} ({', '.join(CHECKPOINT_COLUMNS)}) "
+        f"VALUES ({', '.join(f'%({col})s' for col in CHECKPOINT_COLUMNS)}) ON CONFLICT DO NOTHING",
+        values)
+    return cursor.rowcount == 1
+
+
+async def insert_checkpoint_async(conn, checkpoint, rows_committed):
+    """
+    insert_checkpoint for an asyncpg connection (csv.loader: async), on its open transaction.
+
+    Returns:
+        bool: True if the checkpoint was inserted, False if the chunk was already committed.
+    """
+    values = {**checkpoint, "rows_committed": rows_committed}
+    status = await conn.execute(
+        f"INSERT INTO {checkpoint['table']} ({', '.join(CHECKPOINT_COLUMNS)}) "
+        f"VALUES ({', '.join(f'${position}' for position in range(1, len(CHECKPOINT_COLUMNS) + 1))}) ON CONFLICT DO NOTHING",
+        *(values[col] for col in CHECKPOINT_COLUMNS))
+    return status == "INSERT 0 1"
+
+
+def discard_orphaned_checkpoints(engine, table_fullname, process_id, target_table):
+    """
+    Delete the checkpoints of a process for a target table that holds none of the process rows.
+
+    Before resuming, this catches staging rows lost after their checkpoints were written (e.g. an UNLOGGED
+    staging table truncated by crash recovery), so their chunks are copied again instead of being skipped.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        table_fullname (str): Checkpoint table from checkpoint_table.
+        process_id (int): ETL process ID being resumed.
+        target_table (str): Table the chunks were copied into ('schema.table').
+
+    Returns:
+        int: Number of checkpoints deleted.
+    """
+    with engine.begin() as conn:
+        deleted = conn.execute(text(f"""
+            DELETE FROM {table_fullname}
+            WHERE process_id = :process_id AND target_table = :target_table
+              AND NOT EXISTS (SELECT 1 FROM {target_table} WHERE process_id = :process_id)
+        """), {"process_id": process_id, "target_table": target_table}).rowcount
+    if deleted:
+        logging.warning(f"{target_table} has no rows of process_id={process_id}; discarded {deleted} checkpoints so its chunks are loaded again")
+    return deleted
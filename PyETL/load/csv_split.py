@@ -0,0 +1,190 @@
+import io
+import logging
+import mmap
+import os
+import time
+import pandas as pd
+from load.readers import TYPED_READ_ERRORS, untyped_numeric_options, coerce_numeric_columns
+
+# Bytes read from the start of the data to estimate the average row length
+SAMPLE_BYTES = 1 << 20
+
+# Window used when counting quote characters, so the mapped file is never copied whole
+SCAN_WINDOW = 64 << 20
+
+
+def _count_quotes(mm, start, end, quote):
+    """
+    Count the quote characters in mm[start:end], a window at a time.
+    """
+    count = 0
+    for window_start in range(start, end, SCAN_WINDOW):
+        count += mm[window_start:min(window_start + SCAN_WINDOW, end)].count(quote)
+    return count
+
+
+def _record_end(mm, position, size, quote, quotes_before=0):
+    """
+    Offset just after the first newline at or after `position` that is outside a quoted field.
+
+    Quote parity decides whether a newline ends a record: with an even number of quote characters since the
+    start of the record the newline is a row separator, with an odd number it is inside a quoted value.
+    Escaped quotes ("") count twice and keep the parity, as in RFC 4180 CSV.
+
+    Parameters:
+        mm (mmap.mmap): Mapped file.
+        position (int): Offset to search from.
+        size (int): File size.
+        quote (bytes): Quote character.
+        quotes_before (int): Quote characters between the start of the record and `position`.
+
+    Returns:
+        int: Offset of the next record, or size if the file ends first.
+    """
+    quotes = quotes_before
+    while position < size:
+        newline = mm.find(b'\n', position)
+        if newline == -1:
+            return size
+        quotes += _count_quotes(mm, position, newline, quote)
+        position = newline + 1
+        if quotes % 2 == 0:
+            return position
+    return size
+
+
+def split_csv_ranges(file_path, rows_per_range=None, range_bytes=None, quotechar='"'):
+    """
+    Memory-map a CSV file and cut its data into byte ranges that start and end on record boundaries.
+
+    The header line is split off and shared by every range. Range boundaries are placed at the first newline
+    after each target offset that is not inside a quoted field (quote-parity counting), so quoted values with
+    embedded newlines are never cut. Each range can then be parsed independently with read_csv_range.
+
+    Parameters:
+        file_path (str): Path to the CSV file.
+        rows_per_range (int, optional): Approximate rows per range; the byte size is estimated from the
+                                        average row length of the first megabyte.
+        range_bytes (int, optional): Byte size of each range; takes precedence over rows_per_range.
+        quotechar (str): Quote character of the file.
+
+    Returns:
+        dict: 'columns' (header column names), 'header_bytes' (header length) and 'ranges'
+              (list of (start, end) byte offsets covering the data).
+    """
+    quote = quotechar.encode('utf-8')
+    start_time = time.perf_counter()
+    if os.path.getsize(file_path) == 0:
+        return {"columns": [], "header_bytes": 0, "ranges": []}
+
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        header_end = _record_end(mm, 0, size, quote)
+        columns = pd.read_csv(io.BytesIO(mm[:header_end]), nrows=0, quotechar=quotechar).columns.tolist()
+
+        if range_bytes is None:
+            sample = mm[header_end:header_end + SAMPLE_BYTES]
+            row_bytes = len(sample) / max(sample.count(b'\n'), 1)
+            range_bytes = int(row_bytes * (rows_per_range or 100_000))
+        range_bytes = max(1, range_bytes)
+
+        ranges = []
+        start = header_end
+        while start < size:
+            target = start + range_bytes
+            if target >= size:
+                ranges.append((start, size))
+                break
+            # Ranges start on a record boundary, so the parity is counted from the range start
+            end = _record_end(mm, target, size, quote, _count_quotes(mm, start, target, quote))
+            ranges.append((start, end))
+            start = end
+
+    logging.info(f"Split {file_path} ({size} bytes) into {len(ranges)} ranges of ~{range_bytes} bytes "
+                 f"in {time.perf_counter() - start_time:.3f}s")
+    return {"columns": columns, "header_bytes": header_end, "ranges": ranges}
+
+
+class _ByteRangeFile(io.RawIOBase):
+    """
+    Read-only file object over the byte range [start, end) of a memory-mapped file.
+    """
+
+    def __init__(self, file_path, start, end):
+        self._file = open(file_path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._position = start
+        self._end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._end - self._position)
+        if size <= 0:
+            return 0
+        buffer[:size] = self._mm[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._mm.close()
+            self._file.close()
+        super().close()
+
+
+def read_csv_range(file_path, start, end, columns, read_options=None, quotechar='"'):
+    """
+    Parse one byte range of a CSV file, as produced by split_csv_ranges, into a DataFrame.
+
+    Parameters:
+        file_path (str): Path to the CSV file.
+        start (int): Offset of the first record of the range.
+        end (int): Offset after the last record of the range.
+        columns (list of str): Header column names shared by all ranges.
+        read_options (dict, optional): Typed read arguments from compile_csv_read_options.
+        quotechar (str): Quote character of the file.
+
+    Returns:
+        pandas.DataFrame: Rows of the range. If a numeric column of a typed read has a malformed value, the
+                          range is parsed again with malformed numbers as NULL (see coerce_numeric_columns).
+    """
+    read_options = read_options or {}
+    try:
+        with io.BufferedReader(_ByteRangeFile(file_path, start, end)) as f:
+            return pd.read_csv(f, header=None, names=columns, quotechar=quotechar, **read_options)
+    except TYPED_READ_ERRORS as e:
+        if not read_options.get("dtype"):
+            raise
+        logging.warning(f"Typed read of bytes {start}-{end} of {file_path} failed ({e}); reading them with malformed numbers as NULL")
+    fallback_options, numeric = untyped_numeric_options(read_options)
+    with io.BufferedReader(_ByteRangeFile(file_path, start, end)) as f:
+        chunk = pd.read_csv(f, header=None, names=columns, quotechar=quotechar, **fallback_options)
+    return coerce_numeric_columns(chunk, numeric)
+
+
+def write_csv_tail(file_path, start, output_path, quotechar='"'):
+    """
+    Write the header of a CSV file followed by its records from byte offset start on, as a CSV file of its own.
+
+    Used to load only the rows an append-only feed added since a previous version of start bytes.
+
+    Parameters:
+        file_path (str): Path to the CSV file.
+        start (int): Offset of the first record to keep (a record boundary).
+        output_path (str): Path of the CSV file to write.
+        quotechar (str): Quote character of the file.
+
+    Returns:
+        int: Bytes of records written (without the header).
+    """
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, open(output_path, 'wb') as out:
+        size = len(mm)
+        header_end = _record_end(mm, 0, size, quotechar.encode('utf-8'))
+        out.write(mm[:header_end])
+        for window_start in range(max(start, header_end), size, SCAN_WINDOW):
+            out.write(mm[window_start:min(window_start + SCAN_WINDOW, size)])
+    written = size - max(start, header_end)
+    logging.info(f"Wrote the last {written} bytes of {file_path} to {output_path}")
+    return written
@@ -1,87 +1,252 @@
+import asyncio
 import io
 import logging
+import threading
 import time
 import traceback
 from datetime import datetime
 from textwrap import dedent
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait, FIRST_COMPLETED
+import numpy as np
 import pandas as pd
 import psycopg2
 import sqlalchemy
 from sqlalchemy import create_engine, text
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from utils.utils import sync_dataframe_with_table_schema, align_types_df_to_db_schema
+from sqlalchemy.exc import IntegrityError, DataError, SQLAlchemyError
+from utils.utils import forward_worker_logs, setup_worker_logging, sync_dataframe_with_table_schema, align_types_df_to_db_schema
+from utils.scheduler import process_pool
+from utils.schema_cache import get_table_metadata
+from transform.transform import get_encryption_key, encrypt_dataframe
+from transform.rules import compile_table_rules, evaluate_rules, merge_rule_stats, format_rule_stats
+from load.readers import compile_csv_read_options, compile_columnar_read_options, iter_source_chunks
+from load.csv_split import split_csv_ranges, read_csv_range
+from load.checkpoints import checkpoint_table, file_fingerprint, load_committed_chunks, insert_checkpoint
+from utils.file_formats import file_format, ChunkFileWriter
+from utils.etl_monitor import record_metric
+from utils.metrics_exporter import ROWS_PARSED, ROWS_LOADED, ROWS_REJECTED, COPY_BYTES, COPY_LATENCY, CHUNKS_IN_FLIGHT, \
+    ENCRYPTED_CELLS, ENCRYPTION_SECONDS
+from load.rejects import build_reject_frame, write_rejects_parquet
+from load.binary_copy import encode_binary_copy, pg_binary_type, BinaryCopyReader
+from load.async_copy import LOADERS, AsyncCopyPool
+from load.partitions import is_missing_partition_error
 
-def get_engine(db_config):
+# Bytes handed to the server per read while streaming a binary COPY payload
+COPY_READ_SIZE = 1 << 20
+
+# How validate_and_load_csv_file_in_chunks runs the per-chunk work
+EXECUTOR_MODES = ('thread', 'process', 'inline')
+
+def get_engine(db_config, workers=None):
     """
     Create and return a SQLAlchemy engine based on the provided database configuration.
 
+    The connection pool is sized for the loader: by default one connection per COPY worker plus
+    two for the main thread (monitoring, schema checks, merges), unless pool_size is configured.
+
     Parameters:
-        db_config (dict): Dictionary with keys 'dialect', 'user', 'password', 'host', 'port', 'database'.
+        db_config (dict): Dictionary with keys 'dialect', 'user', 'password', 'host', 'port', 'database' and
+                          optionally 'pool_size', 'max_overflow', 'pool_pre_ping', 'pool_recycle' (seconds).
+        workers (int, optional): Number of threads that will COPY concurrently (e.g. csv.max_workers).
 
     Returns:
         sqlalchemy.engine.Engine: SQLAlchemy engine instance connected to the database.
     """
     url = f"{db_config['dialect']}://{db_config['user']}:{db_config['password']}@" \
           f"{db_config['host']}:{db_config['port']}/{db_config['database']}"
-    return create_engine(url)
+    pool_size = db_config.get('pool_size') or (workers or 3) + 2
+    max_overflow = db_config.get('max_overflow', 2)
+    pre_ping = db_config.get('pool_pre_ping', True)
+    logging.info(f"Connection pool: pool_size={pool_size}, max_overflow={max_overflow}, pre_ping={pre_ping}")
+    return create_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=pre_ping,
+                         pool_recycle=db_config.get('pool_recycle', -1))
+
+
+def copy_worker_count(csv_config):
+    """
+    Number of connections that COPY concurrently for the given csv settings, used to size the connection
+    pool and the scheduler's connection budget (async COPY streams for csv.loader 'async').
+    """
+    max_workers = csv_config.get('max_workers', 1)
+    if csv_config.get('loader', 'thread') == 'async':
+        return csv_config.get('async_streams', max_workers)
+    if csv_config.get('executor', 'thread') == 'process':
+        return csv_config.get('copy_workers', max_workers)
+    return max_workers
+
+
+def acquire_raw_connection(engine):
+    """
+    Check a raw DBAPI (psycopg2) connection out of the engine pool and log how long it took.
+
+    Returns:
+        tuple: (connection, seconds spent acquiring it)
+    """
+    start = time.perf_counter()
+    raw_conn = engine.raw_connection()
+    elapsed = time.perf_counter() - start
+    logging.debug(f"Acquired raw connection in {elapsed * 1000:.1f}ms on {threading.current_thread().name}")
+    return raw_conn, elapsed
+
+
+def release_copy_connections(connections):
+    """
+    Return the persistent COPY connections of a file to the pool and log their acquire latency.
+
+    Parameters:
+        connections (dict): Per-thread connection cache passed to copy_payload; emptied in place.
+    """
+    acquire_times = [elapsed for _, elapsed in connections.values()]
+    for raw_conn, _ in list(connections.values()):
+        try:
+            raw_conn.close()
+        except Exception as e:
+            logging.debug(f"Error returning COPY connection to the pool: {e}")
+    connections.clear()
+    if acquire_times:
+        logging.info(f"Released {len(acquire_times)} COPY connections (acquire latency avg "
+                     f"{sum(acquire_times) / len(acquire_times) * 1000:.1f}ms, max {max(acquire_times) * 1000:.1f}ms)")
 
     
-def load_with_copy(df, engine, table_name, schema=None, process_id=None):
+def get_binary_copy_types(engine, table_name, schema=None):
     """
-    Load a pandas DataFrame into a PostgreSQL table using the COPY command for performance.
+    Reflect a table and resolve the binary COPY wire type of each of its columns.
 
     Parameters:
-        df (pandas.DataFrame): DataFrame to be inserted into the database.
         engine (sqlalchemy.engine.Engine): SQLAlchemy engine for DB connection.
         table_name (str): Target table name.
         schema (str, optional): Database schema name.
-        process_id (int, optional): Identifier for the current ETL process; added as a column.
 
-    Behavior:
-        - Resets DataFrame index.
-        - Drops 'index' column if present.
-        - Adds 'process_id' column if provided.
-        - Loads data into the target table using PostgreSQL COPY FROM for performance.
-        - Handles and logs common integrity errors.
+    Returns:
+        dict: Mapping of column name to a binary wire type, or None for types without a binary encoder.
     """
-    try:
-        #logging.info(f"Index name load: {df.index.name}")
-        df.reset_index(drop=True, inplace=True)
-        df = df.copy()
+    type_strings = get_table_metadata(engine, schema, table_name)["type_strings"]
+    return {col: pg_binary_type(type_str) for col, type_str in type_strings.items()}
+
 
-        if 'index' in df.columns:
-            df.drop(columns=['index'], inplace=True)
+def serialize_for_copy(df, process_id=None, copy_format='csv', pg_types=None, detach=False):
+    """
+    Serialize a DataFrame into a COPY payload, without touching the database.
+
+    This is the CPU-bound half of load_with_copy and can run in a worker process; the payload
+    is then sent by copy_payload on an I/O thread.
+
+    Parameters:
+        df (pandas.DataFrame): Data to serialize.
+        process_id (int, optional): Identifier for the current ETL process; added as a column.
+        copy_format (str): 'csv' or 'binary'.
+        pg_types (dict, optional): Column binary wire types, required for the binary format.
+        detach (bool): Return the binary data as independent bytes instead of a view over the
+                       thread-local encode buffer (needed when the payload leaves the thread or process).
 
+    Returns:
+        dict: Payload with keys 'format', 'columns', 'data' and 'rows'.
+    """
+    if copy_format == 'binary':
+        # Reference the existing column arrays instead of copying the DataFrame
+        columns = {col: series for col, series in df.items() if col != 'index'}
         if process_id is not None:
-            df['process_id'] = int(process_id)
-            logging.info(f"Added process_id={process_id} to DataFrame before load.")
+            columns['process_id'] = pd.Series(int(process_id), index=df.index, dtype='Int64')
+        data = encode_binary_copy(columns, pg_types)
+        if detach:
+            data = data.tobytes()
+        return {"format": copy_format, "columns": list(columns), "data": data, "rows": len(df)}
 
-        # Convert DataFrame to CSV format in-memory
-        buffer = io.StringIO()
-        df.to_csv(buffer, index=False, header=False)
-        buffer.seek(0)
+    #logging.info(f"Index name load: {df.index.name}")
+    df = df.reset_index(drop=True)
 
-        # Build target table full name
-        table_fullname = f'{schema}.{table_name}' if schema else table_name
+    if 'index' in df.columns:
+        df = df.drop(columns=['index'])
 
-        # Use raw connection for COPY
-        raw_conn = engine.raw_connection()
-        cursor = raw_conn.cursor()
+    if process_id is not None:
+        df['process_id'] = int(process_id)
 
-        columns = ', '.join(df.columns)
-        copy_sql = f"COPY {table_fullname} ({columns}) FROM STDIN WITH CSV"
+    # Convert DataFrame to CSV format in-memory
+    data = df.to_csv(index=False, header=False)
+    return {"format": copy_format, "columns": df.columns.tolist(), "data": data, "rows": len(df)}
 
-        cursor.copy_expert(sql=copy_sql, file=buffer)
+
+def _copy_serialized(cursor, payload, table_fullname):
+    """
+    Stream a serialized payload into a table with COPY FROM STDIN.
+
+    Returns:
+        int: Number of bytes sent.
+    """
+    column_list = ', '.join(payload["columns"])
+    if payload["format"] == 'binary':
+        data = memoryview(payload["data"])
+        cursor.copy_expert(sql=f"COPY {table_fullname} ({column_list}) FROM STDIN (FORMAT binary)",
+                           file=BinaryCopyReader(data), size=COPY_READ_SIZE)
+        return len(data)
+    cursor.copy_expert(sql=f"COPY {table_fullname} ({column_list}) FROM STDIN WITH CSV", file=io.StringIO(payload["data"]))
+    return len(payload["data"])
+
+
+def copy_payload(engine, payload, table_name, schema=None, process_id=None, connections=None, checkpoint=None,
+                 extra_copies=None):
+    """
+    Send a payload built by serialize_for_copy to PostgreSQL with COPY and commit it.
+
+    With a checkpoint the chunk's checkpoint row is inserted in the same transaction as the COPY (see
+    load.checkpoints.insert_checkpoint); if it already exists the chunk was committed before and nothing
+    is copied, which makes the COPY idempotent.
+
+    Parameters:
+        engine (sqlalchemy.engine.Engine): SQLAlchemy engine for DB connection.
+        payload (dict): Payload from serialize_for_copy.
+        table_name (str): Target table name.
+        schema (str, optional): Database schema name.
+        process_id (int, optional): Identifier for the current ETL process, used in log messages.
+        connections (dict, optional): Per-thread connection cache. When given, each thread keeps one raw
+                                      connection across calls instead of checking one out per payload;
+                                      the owner returns them with release_copy_connections.
+        checkpoint (dict, optional): Chunk checkpoint for insert_checkpoint.
+        extra_copies (list, optional): (payload, table_name, schema) tuples copied in the same transaction,
+                                       e.g. the chunk's rejected rows.
+
+    Returns:
+        int: Number of rows loaded (0 if the COPY was rejected by an integrity error or the chunk was
+             already committed).
+
+    Raises:
+        psycopg2.errors.CheckViolation: If no partition of a partitioned table accepts the rows.
+    """
+    # Build target table full name
+    table_fullname = f'{schema}.{table_name}' if schema else table_name
+    thread_id = threading.get_ident()
+    try:
+        # Use raw connection for COPY, reusing this thread's connection when a cache is given
+        if connections is None:
+            raw_conn, _ = acquire_raw_connection(engine)
+        elif thread_id in connections:
+            raw_conn = connections[thread_id][0]
+        else:
+            connections[thread_id] = acquire_raw_connection(engine)
+            raw_conn = connections[thread_id][0]
+        cursor = raw_conn.cursor()
+
+        if checkpoint is not None and not insert_checkpoint(cursor, checkpoint, payload['rows']):
+            raw_conn.rollback()
+            logging.info(f"[Chunk-{checkpoint['chunk_idx']}] already committed to {table_fullname}, COPY skipped (process_id={process_id})")
+            return 0
+        _copy_serialized(cursor, payload, table_fullname)
+        for extra_payload, extra_table, extra_schema in extra_copies or []:
+            _copy_serialized(cursor, extra_payload, f'{extra_schema}.{extra_table}' if extra_schema else extra_table)
         raw_conn.commit()
         cursor.close()
 
-        logging.info(f"Loaded {len(df)} records into {table_fullname} using COPY (process_id={process_id})")
+        logging.info(f"Loaded {payload['rows']} records into {table_fullname} using {payload['format']} COPY (process_id={process_id})")
+        return payload['rows']
 
     except psycopg2.IntegrityError as e:
         raw_conn.rollback()
         orig = getattr(e, 'diag', None)
+        if is_missing_partition_error(orig.message_primary if orig else str(e)):
+            # Not bad data: the partition for the rows is missing, so the load must fail instead of skipping them
+            logging.error(f"No partition of {table_fullname} accepts the rows (process_id={process_id}): {str(e).strip()}")
+            raise
         if isinstance(e, psycopg2.errors.UniqueViolation):
             detail = orig.message_detail if orig and orig.message_detail else str(e)
             logging.warning(f"Duplicate records detected (process_id={process_id}): {detail}")
@@ -90,22 +255,130 @@ def load_with_copy(df, engine, table_name, schema=None, process_id=None):
             logging.warning(f"Constraint violation (e.g., quantity >= 1) detected (process_id={process_id}): {detail}")
         else:
             logging.error(f"Database integrity error (process_id={process_id}): {str(e)}")
+        return 0
     except Exception as e:
         logging.error(f"Unexpected error (process_id={process_id}): {e.__class__.__name__} - {str(e)}")
         logging.debug(traceback.format_exc())
+        if connections is not None and thread_id in connections:
+            # Do not hand a possibly broken connection to the next chunk
+            connections.pop(thread_id)
+            raw_conn.invalidate()
         raise
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'raw_conn' in locals():
+        if 'raw_conn' in locals() and connections is None:
             raw_conn.close()
 
-        
+
+def resolve_copy_format(engine, table_name, schema=None, copy_format='csv', pg_types=None, columns=None):
+    """
+    Resolve the binary wire types for a binary COPY, falling back to CSV when a column type is unsupported.
+
+    Parameters:
+        engine (sqlalchemy.engine.Engine): SQLAlchemy engine for DB connection.
+        table_name (str): Target table name.
+        schema (str, optional): Database schema name.
+        copy_format (str): Requested format, 'csv' or 'binary'.
+        pg_types (dict, optional): Already resolved wire types; reflected if not given.
+        columns (list of str, optional): Columns that will be copied; defaults to all table columns.
+
+    Returns:
+        tuple: (copy_format, pg_types) to use.
+    """
+    if copy_format != 'binary':
+        return 'csv', None
+    if pg_types is None:
+        pg_types = get_binary_copy_types(engine, table_name, schema=schema)
+    columns = columns if columns is not None else [col for col in pg_types if col != 'id']
+    unsupported = [col for col in columns if col != 'index' and pg_types.get(col) is None]
+    if unsupported:
+        logging.warning(f"Columns {unsupported} of {schema}.{table_name} have no binary COPY encoder. Falling back to CSV.")
+        return 'csv', None
+    return 'binary', pg_types
+
+
+def load_with_copy(df, engine, table_name, schema=None, process_id=None, copy_format='csv', pg_types=None):
+    """
+    Load a pandas DataFrame into a PostgreSQL table using the COPY command for performance.
+
+    Parameters:
+        df (pandas.DataFrame): DataFrame to be inserted into the database.
+        engine (sqlalchemy.engine.Engine): SQLAlchemy engine for DB connection.
+        table_name (str): Target table name.
+        schema (str, optional): Database schema name.
+        process_id (int, optional): Identifier for the current ETL process; added as a column.
+        copy_format (str): 'csv' (text COPY) or 'binary' (COPY ... FORMAT binary, no CSV round-trip).
+        pg_types (dict, optional): Column binary wire types from get_binary_copy_types; reflected if not given.
+
+    Behavior:
+        - Drops 'index' column if present.
+        - Adds 'process_id' column if provided.
+        - Loads data into the target table using PostgreSQL COPY FROM for performance.
+        - Falls back to CSV when a column type has no binary encoder.
+        - Handles and logs common integrity errors.
+
+    Returns:
+        int: Number of rows loaded.
+    """
+    copy_format, pg_types = resolve_copy_format(engine, table_name, schema, copy_format, pg_types, columns=list(df.columns))
+    payload = serialize_for_copy(df, process_id=process_id, copy_format=copy_format, pg_types=pg_types)
+    return copy_payload(engine, payload, table_name, schema=schema, process_id=process_id)
+
+
+def benchmark_copy_formats(df, engine, table_name, schema=None, process_id=0, repeats=3):
+    """
+    Compare the CSV and binary COPY paths on the same DataFrame.
+
+    Each repetition serializes and copies the data inside a transaction that is rolled back afterwards,
+    so the target table is left untouched.
+
+    Parameters:
+        df (pandas.DataFrame): Type-aligned data to load (see align_types_df_to_db_schema).
+        engine (sqlalchemy.engine.Engine): SQLAlchemy engine for DB connection.
+        table_name (str): Target table name.
+        schema (str, optional): Database schema name.
+        process_id (int): Value written to the process_id column.
+        repeats (int): Number of timed repetitions per format; the best one is reported.
+
+    Returns:
+        dict: Per format, the best 'seconds', 'rows_per_sec' and 'bytes' sent.
+    """
+    table_fullname = f'{schema}.{table_name}' if schema else table_name
+    pg_types = get_binary_copy_types(engine, table_name, schema=schema)
+
+    results = {}
+    raw_conn = engine.raw_connection()
+    try:
+        for copy_format in ('csv', 'binary'):
+            timings = []
+            sent = 0
+            for _ in range(repeats):
+                cursor = raw_conn.cursor()
+                start = time.perf_counter()
+                payload = serialize_for_copy(df, process_id=process_id, copy_format=copy_format, pg_types=pg_types)
+                sent = _copy_serialized(cursor, payload, table_fullname)
+                timings.append(time.perf_counter() - start)
+                cursor.close()
+                raw_conn.rollback()
+            best = min(timings)
+            results[copy_format] = {"seconds": best, "rows_per_sec": len(df) / best if best else None, "bytes": sent}
+            logging.info(f"COPY benchmark {copy_format} into {table_fullname}: {len(df)} rows in {best:.3f}s ({sent} bytes)")
+    finally:
+        raw_conn.close()
+    return results
+
+
 def incremental_insert(engine, tmp_schema, tmp_table, target_schema, target_table, unique_keys, process_id):
     """
     Perform an incremental insert row-by-row from a temporary table to the target table,
     skipping rows that violate constraints and logging errors.
 
+    This is the slow diagnostic path; regular loads use merge_insert, which falls back to
+    this function only when a batch contains rows the set-based insert cannot handle. As in
+    merge_insert, rows whose unique key is already in the target or has a NULL value are skipped,
+    and the same advisory lock on the target is held while the rows are inserted.
+
     Parameters:
         engine (sqlalchemy.engine.Engine): Database connection engine.
         tmp_schema (str): Schema name of the temporary staging table.
@@ -116,10 +389,14 @@ def incremental_insert(engine, tmp_schema, tmp_table, target_schema, target_tabl
         process_id (int): Current process ID to filter rows to insert.
 
     Returns:
-        int: Number of rows inserted into the target table.
+        dict: Counts with keys 'inserted', 'skipped' (duplicates) and 'rejected' (rows with a NULL key value or
+              that failed to insert).
+
+    Raises:
+        Exception: Errors other than a failing row (e.g. a lost connection) are logged and raised.
     """
     import pandas as pd
-    inserted_rows = 0
+    counts = {"inserted": 0, "skipped": 0, "rejected": 0}
     try:
         with engine.connect() as conn:
             query = f'SELECT * FROM "{tmp_schema}"."{tmp_table}" WHERE process_id = :pid'
@@ -127,128 +404,694 @@ def incremental_insert(engine, tmp_schema, tmp_table, target_schema, target_tabl
 
         if df.empty:
             logging.info("No rows found in temp table for this process_id.")
-            return 0
+            return counts
+
+        key_match = ' AND '.join([f's."{key}" = :{key}' for key in unique_keys])
+
+        # Same rule as merge_insert: a NULL key value cannot be checked for duplicates
+        null_keys = df[unique_keys].isna().any(axis=1)
+        if null_keys.any():
+            counts["rejected"] = int(null_keys.sum())
+            logging.warning(f"{counts['rejected']} rows of {tmp_schema}.{tmp_table} with a NULL value in the unique keys "
+                            f"{unique_keys} were not inserted into {target_schema}.{target_table} (process_id={process_id})")
+            df = df[~null_keys]
 
         with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:target))"),
+                         {"target": f"{target_schema}.{target_table}"})
             for i, row in df.iterrows():
                 try:
                     cols = row.index.tolist()
-                    values = [row[col] for col in cols]
                     placeholders = ', '.join([f":{col}" for col in cols])
                     col_names = ', '.join([f'"{col}"' for col in cols])
-                    insert_stmt = f'INSERT INTO "{target_schema}"."{target_table}" ({col_names}) VALUES ({placeholders})'
-                    conn.execute(text(insert_stmt), row.to_dict())
-                    inserted_rows += 1
-                except Exception as row_e:
+                    # Rows whose key is already in the target are skipped, as in merge_insert
+                    insert_stmt = (f'INSERT INTO "{target_schema}"."{target_table}" ({col_names}) SELECT {placeholders} '
+                                   f'WHERE NOT EXISTS (SELECT 1 FROM "{target_schema}"."{target_table}" s WHERE {key_match})')
+                    # Savepoint per row so a failing row does not abort the rest of the transaction
+                    with conn.begin_nested():
+                        result = conn.execute(text(insert_stmt), row.to_dict())
+                    counts["inserted" if result.rowcount else "skipped"] += 1
+                except (IntegrityError, DataError) as row_e:
+                    counts["rejected"] += 1
                     logging.warning(f"Failed to insert row {i}: {row.to_dict()} => {row_e}")
 
-        logging.info(f"Inserted {inserted_rows} new records into {target_schema}.{target_table}")
-        return inserted_rows
+        logging.info(f"Inserted {counts['inserted']} new records into {target_schema}.{target_table} "
+                     f"(skipped_duplicates={counts['skipped']}, rejected={counts['rejected']})")
+        return counts
 
     except Exception as e:
         logging.error(f"Fatal error during incremental insert (process_id={process_id}): {e}")
         logging.error(traceback.format_exc())
-        return 0
-    
-def validate_and_load_csv_file_in_chunks(file_path, engine, schema, table, process_id, chunk_size, config):
+        raise
+
+
+def merge_insert(engine, tmp_schema, tmp_table, target_schema, target_table, unique_keys, process_id, fallback_to_rows=True):
+    """
+    Move the rows of a process_id from the temporary table into the target table with a single
+    set-based INSERT ... SELECT, skipping rows whose unique key already exists in the target.
+
+    Duplicates are detected server-side with an anti-join (NOT EXISTS) on the configured unique keys,
+    and duplicates inside the same batch are collapsed with DISTINCT ON, so no data leaves the database.
+    Keys are compared with plain equality so PostgreSQL can use a hash anti-join. Equality never matches
+    a NULL key value while DISTINCT ON groups NULLs together, so the two would disagree on such rows
+    (and the anti-join would insert them again on every run): rows with a NULL key value are left out
+    of the batch and counted as rejected. Merges into the same target
+    are serialized with a transaction-level advisory lock on the target name, so two concurrent merges
+    (other tasks or ETL processes) cannot both insert a key that neither saw in the target.
+
+    If the set-based statement fails because of bad data (integrity or data errors), the transaction is
+    rolled back and, when fallback_to_rows is True, the batch is replayed with the row-by-row
+    incremental_insert to identify and skip the offending rows.
+
+    Parameters:
+        engine (sqlalchemy.engine.Engine): Database connection engine.
+        tmp_schema (str): Schema name of the temporary staging table.
+        tmp_table (str): Name of the temporary staging table.
+        target_schema (str): Schema name of the target table.
+        target_table (str): Name of the target table.
+        unique_keys (list of str): List of column names representing the unique key.
+        process_id (int): Current process ID to filter rows to insert.
+        fallback_to_rows (bool): Replay the batch row by row if the set-based insert fails.
+
+    Returns:
+        dict: Counts with keys 'inserted', 'skipped' (duplicates) and 'rejected' (rows with a NULL key value or
+              that could not be inserted).
+    """
+    counts = {"inserted": 0, "skipped": 0, "rejected": 0}
+
+    tmp_columns = set(get_table_metadata(engine, tmp_schema, tmp_table)["columns"])
+    target_types = get_table_metadata(engine, target_schema, target_table)["type_strings"]
+
+    # Columns managed by the database (auto-increment id) are left to the target defaults
+    ignored_columns = {'id'}
+    columns = [col for col in target_types if col in tmp_columns and col not in ignored_columns]
+    missing_keys = [key for key in unique_keys if key not in columns]
+    if missing_keys:
+        raise ValueError(f"Unique keys {missing_keys} not present in both {tmp_schema}.{tmp_table} and {target_schema}.{target_table}")
+
+    # Cast staging columns to the target types so the comparison and insert are type-consistent
+    select_exprs = [
+        f'CAST(t."{col}" AS {target_types[col]}) AS "{col}"'
+        for col in columns
+    ]
+    col_names = ', '.join([f'"{col}"' for col in columns])
+    key_names = ', '.join([f'"{key}"' for key in unique_keys])
+    key_match = ' AND '.join([f's."{key}" = b."{key}"' for key in unique_keys])
+    null_key = ' OR '.join([f't."{key}" IS NULL' for key in unique_keys])
+
+    merge_sql = dedent(f"""
+        WITH batch AS (
+            SELECT DISTINCT ON ({key_names}) {', '.join(select_exprs)}
+            FROM "{tmp_schema}"."{tmp_table}" t
+            WHERE t.process_id = :pid AND NOT ({null_key})
+            ORDER BY {key_names}
+        )
+        INSERT INTO "{target_schema}"."{target_table}" ({col_names})
+        SELECT {col_names} FROM batch b
+        WHERE NOT EXISTS (
+            SELECT 1 FROM "{target_schema}"."{target_table}" s
+            WHERE {key_match}
+        )
+    """)
+    count_sql = f'SELECT COUNT(*) FROM "{tmp_schema}"."{tmp_table}" WHERE process_id = :pid'
+    null_count_sql = f'SELECT COUNT(*) FROM "{tmp_schema}"."{tmp_table}" t WHERE t.process_id = :pid AND ({null_key})'
+
+    try:
+        with engine.begin() as conn:
+            total_rows = conn.execute(text(count_sql), {"pid": process_id}).scalar()
+            if not total_rows:
+                logging.info("No rows found in temp table for this process_id.")
+                return counts
+            # Held until commit, so the next merge into the target sees the rows inserted here
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:target))"),
+                         {"target": f"{target_schema}.{target_table}"})
+            result = conn.execute(text(merge_sql), {"pid": process_id})
+            counts["inserted"] = result.rowcount
+            counts["rejected"] = conn.execute(text(null_count_sql), {"pid": process_id}).scalar()
+            counts["skipped"] = total_rows - counts["inserted"] - counts["rejected"]
+        if counts["rejected"]:
+            logging.warning(f"{counts['rejected']} rows of {tmp_schema}.{tmp_table} with a NULL value in the unique keys "
+                            f"{unique_keys} were not merged into {target_schema}.{target_table} (process_id={process_id})")
+
+    except (IntegrityError, DataError) as e:
+        logging.error(f"Set-based merge into {target_schema}.{target_table} failed (process_id={process_id}): {e}")
+        if not fallback_to_rows:
+            raise
+        logging.warning(f"Falling back to row-by-row incremental insert to diagnose the batch (process_id={process_id})")
+        counts = incremental_insert(engine, tmp_schema, tmp_table, target_schema, target_table, unique_keys, process_id)
+
+    logging.info(
+        f"Merged {tmp_schema}.{tmp_table} into {target_schema}.{target_table} (process_id={process_id}): "
+        f"inserted={counts['inserted']}, skipped_duplicates={counts['skipped']}, rejected={counts['rejected']}"
+    )
+    return counts
+
+
+def validate_chunk(chunk, idx, table, config, rules=None):
+    """
+    Apply the validation rules configured for a table to a single chunk.
+
+    The rules from the 'tables' config section are evaluated with evaluate_rules as one vectorized mask per
+    rule; a row is rejected if any rule flags it, and its reason codes list every rule it failed. Only
+    per-chunk counts are logged. Runs without database access so it can be executed in a worker process.
+
+    Parameters:
+        chunk (pandas.DataFrame): Chunk to validate.
+        idx (int): Chunk index, used in log messages.
+        table (str): Target table whose rules from the 'tables' config section apply.
+        config (dict): Configuration dictionary.
+        rules (dict, optional): Rule plan from compile_table_rules; compiled from config if not given.
+
+    Returns:
+        tuple: (valid rows, rejected rows with a 'reject_reason' column, per-rule stats from evaluate_rules)
+    """
+    if rules is None:
+        rules = compile_table_rules(config, table)
+    masks, stats = evaluate_rules(chunk, rules)
+    rejected_mask = np.logical_or.reduce(list(masks.values())) if masks else np.zeros(len(chunk), dtype=bool)
+
+    rejected = chunk[rejected_mask]
+    if len(rejected):
+        # Comma-separated codes of every rule each rejected row failed
+        reasons = np.full(len(rejected), '', dtype=object)
+        for rule, mask in masks.items():
+            reasons = np.where(mask[rejected_mask], reasons + rule + ',', reasons)
+        rejected = rejected.assign(reject_reason=pd.Series(reasons, index=rejected.index).str.rstrip(','))
+        logging.warning(f"[Chunk-{idx}] Rejected {len(rejected)} of {len(chunk)} rows: "
+                        + ', '.join(f"{rule}={int(mask.sum())}" for rule, mask in masks.items() if mask.any()))
+
+    return chunk[~rejected_mask], rejected, stats
+
+
+def prepare_chunk(chunk, idx, table, config, process_id, copy_format='csv', pg_types=None, detach=False, rules=None):
+    """
+    Validate a chunk and serialize it into a COPY payload (the CPU-bound part of loading a chunk).
+
+    Rejected rows are routed to the sink configured in tables.<table>.rejects: a 'path' writes them to a
+    Parquet file right away, a 'table' (and optional 'schema') serializes them for a bulk COPY into a reject
+    table alongside the chunk. Without a sink they are only counted.
+
+    Parameters:
+        chunk (pandas.DataFrame): Chunk to prepare.
+        idx (int): Chunk index.
+        table (str): Target table name, used to look up validation rules.
+        config (dict): Configuration dictionary.
+        process_id (int): Current ETL process ID, added as a column.
+        copy_format (str): 'csv' or 'binary'.
+        pg_types (dict, optional): Column binary wire types for the binary format.
+        detach (bool): Return payload data that is safe to send to another thread or process.
+        rules (dict, optional): Compiled rule plan from compile_table_rules.
+
+    Returns:
+        dict: Payload from serialize_for_copy, plus the chunk index under 'idx', the rejected count under
+              'rejected', the per-rule stats under 'rule_stats', the preparation time under 'prepare_seconds'
+              and, for a reject table sink, the reject COPY payload under 'rejects'.
+    """
+    logging.info(f"[Chunk-{idx}] STARTED with {len(chunk)} rows")
+    start = time.perf_counter()
+    chunk, rejected, rule_stats = validate_chunk(chunk, idx, table, config, rules)
+    payload = serialize_for_copy(chunk, process_id=process_id, copy_format=copy_format, pg_types=pg_types, detach=detach)
+    payload["idx"] = idx
+    payload["rejected"] = len(rejected)
+    payload["rule_stats"] = rule_stats
+    payload["rejects"] = None
+
+    reject_config = config.get('tables', {}).get(table, {}).get('rejects') or {}
+    if len(rejected) and reject_config.get('path'):
+        write_rejects_parquet(rejected, table, process_id, idx, reject_config['path'])
+    elif len(rejected) and reject_config.get('table'):
+        payload["rejects"] = serialize_for_copy(build_reject_frame(rejected, table, process_id, idx))
+        payload["rejects_target"] = reject_config
+    payload["prepare_seconds"] = time.perf_counter() - start
+    return payload
+
+
+def _load_prepared(engine, prepared, table, schema, process_id, connections=None, checkpoint=None):
+    """
+    COPY a prepared chunk, waiting for it first if it is still being prepared in a worker process.
+    The preparation and COPY of the chunk are recorded as 'validate_serialize' and 'copy' stage metrics.
+    The chunk, its rejected rows and its checkpoint (if given) are committed in one transaction.
+
+    Returns:
+        dict: 'loaded', 'rejected' and 'bytes' counts and the per-rule stats of the chunk under 'rule_stats'.
+    """
+    payload = prepared.result() if isinstance(prepared, Future) else prepared
+    target = _record_prepared(payload, table, schema)
+    start = time.perf_counter()
+    loaded = copy_payload(engine, payload, table, schema=schema, process_id=process_id, connections=connections,
+                          checkpoint=checkpoint, extra_copies=_reject_copies(payload))
+    return _record_copied(payload, target, loaded, time.perf_counter() - start)
+
+
+async def _load_prepared_async(copy_pool, prepared, table, schema, process_id, checkpoint=None):
+    """
+    _load_prepared for csv.loader 'async': a coroutine on the AsyncCopyPool event loop that waits for the
+    chunk's preparation in the CPU pool without blocking the loop, then COPYs it on a pooled connection.
+    """
+    payload = await asyncio.wrap_future(prepared) if isinstance(prepared, Future) else prepared
+    target = _record_prepared(payload, table, schema)
+    start = time.perf_counter()
+    loaded = await copy_pool.copy_payload(payload, table, schema=schema, process_id=process_id, checkpoint=checkpoint,
+                                          extra_copies=_reject_copies(payload))
+    return _record_copied(payload, target, loaded, time.perf_counter() - start)
+
+
+def _record_prepared(payload, table, schema):
+    """
+    Record the 'validate_serialize' stage metric of a prepared chunk and return the target table name.
+    """
+    target = f"{schema}.{table}" if schema else table
+    record_metric('validate_serialize', target, payload['idx'], duration=payload['prepare_seconds'],
+                  rows_in=payload['rows'] + payload['rejected'], rows_out=payload['rows'], rows_rejected=payload['rejected'])
+    return target
+
+
+def _reject_copies(payload):
+    """
+    Extra COPYs committed with a prepared chunk: its rejected rows, when they go to a reject table.
+    """
+    if payload.get("rejects") is None:
+        return []
+    reject_config = payload["rejects_target"]
+    return [(payload["rejects"], reject_config['table'], reject_config.get('schema'))]
+
+
+def _record_copied(payload, target, loaded, copy_seconds):
+    """
+    Record the 'copy' stage metric and live metrics of a loaded chunk and build its load result.
+    """
+    idx = payload['idx']
+    copied_bytes = len(payload['data'])
+    record_metric('copy', target, idx, duration=copy_seconds, rows_in=payload['rows'], rows_out=loaded,
+                  bytes_copied=copied_bytes)
+    COPY_LATENCY.observe(copy_seconds)
+    ROWS_LOADED.inc(loaded)
+    ROWS_REJECTED.inc(payload['rejected'])
+    COPY_BYTES.inc(copied_bytes)
+
+    logging.info(f"[Chunk-{idx}] FINISHED loading {loaded} records ({payload['rejected']} rejected)")
+    return {"loaded": loaded, "rejected": payload['rejected'], "bytes": copied_bytes, "rule_stats": payload["rule_stats"],
+            "parsed": payload.get("parsed"), "encrypted": payload.get("encrypted")}
+
+
+def _prepare_and_load(prepare, args, engine, table, schema, process_id, connections=None, checkpoint=None):
+    """
+    Prepare a chunk with prepare(*args) (prepare_chunk, prepare_source_chunk or prepare_range) and COPY it
+    on the same thread (thread and inline executor modes).
+    """
+    return _load_prepared(engine, prepare(*args), table, schema, process_id, connections, checkpoint)
+
+
+def _encrypt_chunk(chunk, idx, context):
+    """
+    Encrypt a chunk with the 'encryption_config' and 'encryption_key' of context, where it is prepared.
+    The encrypted cells are returned rather than counted, since a worker process' live metrics never
+    reach the exporter; the reader records them when it collects the chunk.
+
+    Returns:
+        tuple: (chunk, dict with the chunk's 'idx', 'rows', 'encrypt_seconds', 'cells' and 'cell_seconds'
+                for the 'encrypted' payload entry, or None without a key)
+    """
+    if context['encryption_key'] is None:
+        return chunk, None
+    start = time.perf_counter()
+    stats = {}
+    chunk = encrypt_dataframe(chunk, context['encryption_config'], context['encryption_key'], stats=stats)
+    return chunk, {"idx": idx, "rows": len(chunk), "encrypt_seconds": time.perf_counter() - start,
+                   "cells": stats.get("cells", 0), "cell_seconds": stats.get("seconds", 0.0)}
+
+
+def prepare_source_chunk(chunk, idx, source_context, table, config, process_id, copy_format='csv', pg_types=None,
+                         detach=False, rules=None):
+    """
+    Encrypt a chunk handed out by the reader and prepare it like prepare_chunk, so encryption runs in the
+    worker instead of the reader.
+
+    Parameters:
+        chunk (pandas.DataFrame): Chunk as read from the source.
+        idx (int): Chunk index.
+        source_context (dict): 'encryption_config', 'encryption_key' (None if the chunk is not encrypted here)
+                               and 'reference_columns' (column order of the first chunk).
+        table (str): Table whose validation rules apply.
+        config (dict): Configuration dictionary.
+        process_id (int): Current ETL process ID, added as a column.
+        copy_format (str): 'csv' or 'binary'.
+        pg_types (dict, optional): Column binary wire types for the binary format.
+        detach (bool): Return payload data that is safe to send to another thread or process.
+        rules (dict, optional): Compiled rule plan from compile_table_rules.
+
+    Returns:
+        dict: Payload from prepare_chunk, with the encryption timing under 'encrypted'.
+    """
+    chunk, encrypted = _encrypt_chunk(chunk, idx, source_context)
+    chunk = chunk.reindex(columns=source_context['reference_columns'])
+    payload = prepare_chunk(chunk, idx, table, config, process_id, copy_format, pg_types, detach, rules)
+    payload["encrypted"] = encrypted
+    return payload
+
+
+def prepare_range(byte_range, idx, range_context, table, config, process_id, copy_format='csv', pg_types=None,
+                  detach=False, rules=None):
+    """
+    Parse one byte range of a CSV file (see load.csv_split), encrypt it and prepare it like prepare_chunk.
+    Runs without database access so the parse itself happens in the worker.
+
+    Parameters:
+        byte_range (tuple): (start, end) offsets from split_csv_ranges.
+        idx (int): Chunk index of the range.
+        range_context (dict): 'file_path', 'columns' (shared header), 'read_options' and the entries of
+                              prepare_source_chunk's source_context.
+        table (str): Table whose validation rules apply.
+        config (dict): Configuration dictionary.
+        process_id (int): Current ETL process ID, added as a column.
+        copy_format (str): 'csv' or 'binary'.
+        pg_types (dict, optional): Column binary wire types for the binary format.
+        detach (bool): Return payload data that is safe to send to another thread or process.
+        rules (dict, optional): Compiled rule plan from compile_table_rules.
+
+    Returns:
+        dict: Payload from prepare_source_chunk, with the parse timing of the range under 'parsed'.
+    """
+    start = time.perf_counter()
+    chunk = read_csv_range(range_context['file_path'], *byte_range, range_context['columns'], range_context['read_options'])
+    parsed = {"idx": idx, "rows": len(chunk), "parse_seconds": time.perf_counter() - start}
+    payload = prepare_source_chunk(chunk, idx, range_context, table, config, process_id, copy_format, pg_types, detach, rules)
+    payload["parsed"] = parsed
+    return payload
+
+
+def validate_and_load_csv_file_in_chunks(file_path, engine, schema, table, process_id, chunk_size, config,
+                                         encryption_config=None, encrypted_output_path=None, config_table=None,
+                                         source_format=None, columns=None):
     """
     Reads a CSV file in chunks, applies validation rules to each chunk, and loads valid data into the database.
 
+    Parquet and Arrow IPC sources are read the same way: row groups / record batches are streamed, only the
+    projected columns are read, and values reach the COPY encoder in Arrow or NumPy memory.
+
+    With csv.parallel_parse the CSV file is memory-mapped and cut into newline-aligned byte ranges of about
+    chunk_size rows (quote-aware, see load.csv_split); each range is parsed by the worker that prepares it,
+    so parsing scales with the workers instead of running in the single reader.
+
+    When encryption_config is given the file is processed as a single streaming pass: each chunk is read once,
+    encrypted, validated and handed to the COPY loader, so no encrypted copy of the file is needed on disk.
+
+    At most csv.max_inflight_chunks chunks (default max_workers) are in flight at any time: the reader blocks
+    until a worker finishes a chunk, and results are consumed as they complete. Memory is therefore bounded
+    by chunk_size * max_inflight_chunks rows regardless of the file size.
+
+    The csv.executor setting selects how chunks are processed:
+        - 'thread': validation, serialization and COPY run on a thread pool (default).
+        - 'process': validation and serialization run in a process pool, free of the GIL, and the
+          COPY runs on a separate pool of I/O threads (csv.copy_workers, default max_workers).
+        - 'inline': everything runs sequentially in the calling thread (useful for debugging).
+
     Args:
-        file_path (str): Path to the CSV file.
+        file_path (str): Path to the CSV, Parquet or Arrow IPC file.
         engine (sqlalchemy.Engine): SQLAlchemy engine for database connection.
         schema (str): Target schema in the database.
         table (str): Target table in the database.
         process_id (int): Unique process ID to track this ETL execution.
         chunk_size (int): Number of rows per chunk.
         config (dict): Configuration dictionary containing validation rules, DB settings, and concurrency options.
+        encryption_config (dict, optional): Encryption settings; when enabled, columns are encrypted chunk by chunk.
+        encrypted_output_path (str, optional): If given, the encrypted chunks are also written to this file,
+                                               as Parquet if it ends in '.parquet' and as CSV otherwise.
+        config_table (str, optional): Name the table's validation rules and reject settings are configured under
+                                      in the 'tables' section, when loading into a staging copy of it (default: table).
+        source_format (str, optional): 'csv', 'parquet' or 'arrow'; resolved from the file extension if not given.
+        columns (list of str, optional): Source columns to read (column projection); all columns if not given.
 
     Returns:
-        None
+        dict: File totals 'rows_in' (rows parsed), 'rows_out' (rows loaded), 'rows_rejected' and 'bytes_copied'.
     """
-    import pandas as pd
-    import time
-    import logging
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-
     total_loaded = 0
+    max_workers = config['csv'].get('max_workers', 1)
+    executor_mode = config['csv'].get('executor', 'thread')
+    copy_workers = config['csv'].get('copy_workers', max_workers)
+    loader = config['csv'].get('loader', 'thread')
+    async_streams = config['csv'].get('async_streams', max_workers)
+    # The async loader keeps every COPY stream busy while the CPU pool prepares the next chunks
+    max_inflight = max(1, config['csv'].get('max_inflight_chunks', max_workers + async_streams if loader == 'async' else max_workers))
+    if executor_mode not in EXECUTOR_MODES:
+        raise ValueError(f"Unsupported csv.executor '{executor_mode}'. Expected one of {EXECUTOR_MODES}")
+    if loader not in LOADERS:
+        raise ValueError(f"Unsupported csv.loader '{loader}'. Expected one of {LOADERS}")
 
-    logging.info(f"Reading file {file_path} in chunks of {chunk_size} with max_workers={config['csv']['max_workers']}")
+    logging.info(f"Reading file {file_path} in chunks of {chunk_size} with max_workers={max_workers}")
     logging.info("=== ETL Configuration ===")
     logging.info(f"File path: {file_path}")
+    source_format = file_format(file_path, source_format)
+    logging.info(f"Source format: {source_format}")
     logging.info(f"Chunk size: {chunk_size}")
-    logging.info(f"Max workers: {config['csv'].get('max_workers', 1)}")
+    logging.info(f"Max workers: {max_workers}")
+    logging.info(f"Executor: {executor_mode}")
+    logging.info(f"Loader: {loader}" + (f" ({async_streams} COPY streams)" if loader == 'async' else ""))
+    logging.info(f"Max in-flight chunks: {max_inflight}")
+    logging.info(f"Streaming encryption: {bool(encryption_config and encryption_config.get('enabled', False))}")
     logging.info(f"Target schema: {schema}")
     logging.info(f"Target table: {table}")
     logging.info("==========================")
 
-    def process_and_load_chunk(chunk, idx):
-        logging.info(f"[Chunk-{idx}] STARTED with {len(chunk)} rows")
-        time.sleep(2)
-
-        original_len = len(chunk)
-
-        # Convert timestamps and filter out rows with future dates
-        if 'timestamp' in chunk.columns:
-            chunk['timestamp'] = pd.to_datetime(chunk['timestamp'], utc=True, errors='coerce')
-
-        max_ts_str = config.get('validation', {}).get('max_timestamp')
-        max_timestamp = pd.to_datetime(max_ts_str, utc=True) if max_ts_str else pd.Timestamp.utcnow()
-        chunk = chunk[chunk['timestamp'] <= max_timestamp]
-        removed_future_dates = original_len - len(chunk)
-        if removed_future_dates > 0:
-            logging.info(f"[Chunk-{idx}] Removed {removed_future_dates} rows with timestamp in the future")
-
-        # Filter based on 'quantity' range
-        filters = config.get('tables', {}).get(table, {}).get('filters', {})
-        quantity_filter = filters.get('quantity', {})
-        min_qty = quantity_filter.get('min')
-        max_qty = quantity_filter.get('max')
-        before_qty = len(chunk)
-        if min_qty is not None and max_qty is not None and 'quantity' in chunk.columns:
-            invalid_rows = chunk[(chunk['quantity'] < min_qty) | (chunk['quantity'] > max_qty)]
-            for _, row in invalid_rows.iterrows():
-                logging.warning(f"[Chunk-{idx}] Dropped row due to quantity out of range: {row.to_dict()}")
-            chunk = chunk[(chunk['quantity'] >= min_qty) & (chunk['quantity'] <= max_qty)]
-
-        # Drop rows missing required columns
-        required_columns = config.get('tables', {}).get(table, {}).get('required_columns', [])
-        if required_columns:
-            missing_required = chunk[chunk[required_columns].isnull().any(axis=1)]
-            if not missing_required.empty:
-                logging.warning(f"[Chunk-{idx}] Contains {len(missing_required)} rows with missing required columns.")
-
-
-        # Add process_id column
-        chunk["process_id"] = pd.Series([process_id] * len(chunk), dtype="Int64")
-
-        # Load chunk into the database using COPY
-        load_with_copy(chunk, engine, table, schema=schema, process_id=process_id)
-
-        logging.info(f"[Chunk-{idx}] FINISHED loading {len(chunk)} records")
-        return len(chunk)
-
-    reader = pd.read_csv(file_path, chunksize=chunk_size)
-    try:
-        first_chunk = next(reader)
-    except StopIteration:
-        logging.warning("CSV file is empty. No data to process.")
-        return
+    encryption_key = get_encryption_key(encryption_config) if encryption_config else None
+    intermediate = ChunkFileWriter(encrypted_output_path) if encrypted_output_path and encryption_key is not None else None
+
+    def encrypt_chunk(chunk, idx):
+        # Only the first chunk, and every chunk while the intermediate file is written (to keep the source
+        # row order), is encrypted in the reader; the workers encrypt the others
+        if encryption_key is None:
+            return chunk
+        start = time.perf_counter()
+        chunk = encrypt_dataframe(chunk, encryption_config, encryption_key)
+        if intermediate is not None:
+            intermediate.write(chunk)
+        record_metric('encrypt', file_path, idx, duration=time.perf_counter() - start, rows_in=len(chunk), rows_out=len(chunk))
+        return chunk
+
+    # Typed reading: parse straight into the target dtypes and read only the columns the table needs
+    typed_read = config['csv'].get('typed_read', False)
+    parse_engine = config['csv'].get('parse_engine', 'c')
+    read_options = None
+    if typed_read and source_format == 'csv':
+        read_options = compile_csv_read_options(engine, schema, table, file_path)
+    elif typed_read:
+        read_options = compile_columnar_read_options(engine, schema, table, file_path, source_format)
+    if columns:
+        # Explicit projection, narrowed to the table columns when reading typed
+        read_options = dict(read_options or {})
+        read_options["usecols"] = [col for col in columns if col in read_options.get("usecols", columns)]
+        if "dtype" in read_options:
+            read_options["dtype"] = {col: dtype for col, dtype in read_options["dtype"].items() if col in read_options["usecols"]}
+            read_options["parse_dates"] = [col for col in read_options["parse_dates"] if col in read_options["usecols"]]
+    parse_stats = {}
+
+    # Parallel parse: the reader only hands out byte ranges and the workers parse them
+    parallel_parse = config['csv'].get('parallel_parse', False) and source_format == 'csv'
+    if parallel_parse and intermediate is not None:
+        logging.warning("csv.parallel_parse is not used while the encrypted intermediate file is written, as it needs the source row order")
+        parallel_parse = False
+
+    if parallel_parse:
+        split = split_csv_ranges(file_path, rows_per_range=chunk_size, range_bytes=config['csv'].get('split_bytes'))
+        if not split['ranges']:
+            logging.warning(f"{source_format} file is empty. No data to process.")
+            return {"rows_in": 0, "rows_out": 0, "rows_rejected": 0, "bytes_copied": 0}
+        start = time.perf_counter()
+        first_chunk = read_csv_range(file_path, *split['ranges'][0], split['columns'], read_options)
+        parse_stats = {"rows": len(first_chunk), "parse_seconds": time.perf_counter() - start}
+        reader = iter(split['ranges'][1:])
+    else:
+        reader = iter_source_chunks(file_path, chunk_size, source_format, read_options, parse_engine=parse_engine, stats=parse_stats)
+        try:
+            first_chunk = next(reader)
+        except StopIteration:
+            logging.warning(f"{source_format} file is empty. No data to process.")
+            return {"rows_in": 0, "rows_out": 0, "rows_rejected": 0, "bytes_copied": 0}
 
     # Sync once: sync column and align types
+    first_chunk = encrypt_chunk(first_chunk, 0)
     first_chunk = sync_dataframe_with_table_schema(first_chunk, engine, schema, table)
     first_chunk = align_types_df_to_db_schema(first_chunk, engine, schema, table)
     reference_columns = first_chunk.columns.tolist()
 
-    with ThreadPoolExecutor(max_workers=config['csv']['max_workers']) as executor:
-        futures = []
-        futures.append(executor.submit(process_and_load_chunk, first_chunk, 0))
+    # Resolve the COPY format and binary wire types once per file instead of once per chunk
+    copy_format, pg_types = resolve_copy_format(engine, table, schema, config['csv'].get('copy_format', 'csv'),
+                                                columns=reference_columns + ['process_id'])
+    logging.info(f"COPY format: {copy_format}")
+
+    # Compile the validation rules once per file; chunks only evaluate the plan
+    config_table = config_table or table
+    rules = compile_table_rules(config, config_table)
+    rule_stats = {}
+    totals = {"rows_rejected": 0, "bytes_copied": 0}
+
+    source_context = {"encryption_config": encryption_config, "reference_columns": reference_columns,
+                      "encryption_key": encryption_key if intermediate is None else None}
+    if parallel_parse:
+        range_context = {**source_context, "file_path": file_path, "columns": split['columns'], "read_options": read_options}
+
+    # Chunk checkpoints: chunks this process committed in an earlier attempt are not copied again
+    checkpoints_table = checkpoint_table(config)
+    committed = {}
+    skipped = {"chunks": 0, "rows": 0}
+    if checkpoints_table:
+        fingerprint = file_fingerprint(file_path)
+        target = f"{schema}.{table}" if schema else table
+        committed = load_committed_chunks(engine, checkpoints_table, process_id, file_path, fingerprint, target)
+        if committed:
+            logging.info(f"Resuming {file_path}: {len(committed)} chunks already committed to {target} (process_id={process_id})")
+
+    def make_checkpoint(idx, row_offset, byte_offset):
+        if not checkpoints_table:
+            return None
+        return {"table": checkpoints_table, "process_id": process_id, "file_path": file_path, "file_fingerprint": fingerprint,
+                "target_table": target, "chunk_idx": idx, "row_offset": row_offset, "byte_offset": byte_offset}
+
+    def is_committed(idx, row_offset, byte_offset):
+        entry = committed.get(idx)
+        if entry is None:
+            return False
+        if (entry["row_offset"], entry["byte_offset"]) != (row_offset, byte_offset):
+            raise ValueError(f"Chunk {idx} of {file_path} starts at row {row_offset} / byte {byte_offset} but was checkpointed "
+                             f"at row {entry['row_offset']} / byte {entry['byte_offset']}; resume with the same "
+                             f"csv.chunk_size and csv.parallel_parse settings")
+        skipped["chunks"] += 1
+        skipped["rows"] += entry["rows_committed"]
+        return True
+
+    def collect(result):
+        parsed = result.get("parsed")
+        if parsed:
+            # Ranges are parsed by the workers; parse time is the sum over workers
+            parse_stats["rows"] += parsed["rows"]
+            parse_stats["parse_seconds"] += parsed["parse_seconds"]
+            ROWS_PARSED.inc(parsed["rows"])
+        encrypted = result.get("encrypted")
+        if encrypted:
+            # Chunks encrypted by the workers
+            record_metric('encrypt', file_path, encrypted["idx"], duration=encrypted["encrypt_seconds"],
+                          rows_in=encrypted["rows"], rows_out=encrypted["rows"])
+            ENCRYPTED_CELLS.inc(encrypted["cells"])
+            ENCRYPTION_SECONDS.inc(encrypted["cell_seconds"])
+        merge_rule_stats(rule_stats, result["rule_stats"])
+        totals["rows_rejected"] += result["rejected"]
+        totals["bytes_copied"] += result["bytes"]
+        return result["loaded"]
+
+    # One persistent COPY connection per worker thread for the life of the file
+    connections = {}
+
+    with ExitStack() as stack:
+        stack.callback(release_copy_connections, connections)
+        if intermediate is not None:
+            stack.callback(intermediate.close)
+        if loader == 'async':
+            # COPY streams on one event loop; the executor only prepares chunks (inline: in the reader)
+            copy_pool = stack.enter_context(AsyncCopyPool(config['database'], async_streams))
+            cpu_pool = None
+            if executor_mode == 'process':
+                log_queue = stack.enter_context(forward_worker_logs())
+                cpu_pool = stack.enter_context(process_pool(max_workers, setup_worker_logging, (log_queue, config)))
+            elif executor_mode == 'thread':
+                cpu_pool = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+        elif executor_mode == 'process':
+            log_queue = stack.enter_context(forward_worker_logs())
+            cpu_pool = stack.enter_context(process_pool(max_workers, setup_worker_logging, (log_queue, config)))
+            io_pool = stack.enter_context(ThreadPoolExecutor(max_workers=copy_workers))
+        elif executor_mode == 'thread':
+            io_pool = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+
+        def preparation(chunk, idx, detach):
+            # The first chunk was encrypted and aligned by the reader; later chunks and byte ranges are
+            # encrypted (and ranges parsed) by the worker preparing them
+            if parallel_parse and idx > 0:
+                prepare, context = prepare_range, (range_context,)
+            elif idx > 0:
+                prepare, context = prepare_source_chunk, (source_context,)
+            else:
+                prepare, context = prepare_chunk, ()
+            return prepare, (chunk, idx, *context, config_table, config, process_id, copy_format, pg_types, detach, rules)
+
+        def submit(chunk, idx, checkpoint):
+            if loader == 'async':
+                # Payloads are detached: the COPY runs later on the event loop thread
+                prepare, args = preparation(chunk, idx, True)
+                prepared = prepare(*args) if cpu_pool is None else cpu_pool.submit(prepare, *args)
+                return copy_pool.submit(_load_prepared_async(copy_pool, prepared, table, schema, process_id, checkpoint))
+            if executor_mode == 'process':
+                prepare, args = preparation(chunk, idx, True)
+                prepared = cpu_pool.submit(prepare, *args)
+                return io_pool.submit(_load_prepared, engine, prepared, table, schema, process_id, connections, checkpoint)
+            return io_pool.submit(_prepare_and_load, *preparation(chunk, idx, False), engine, table, schema, process_id,
+                                  connections, checkpoint)
+
+        def chunks():
+            ROWS_PARSED.inc(len(first_chunk))
+            first_byte = split['ranges'][0][0] if parallel_parse else None
+            if not is_committed(0, 0, first_byte):
+                yield first_chunk, 0, make_checkpoint(0, 0, first_byte)
+            row_offset = len(first_chunk)
+            for idx, chunk in enumerate(reader, start=1):
+                if parallel_parse:
+                    # A byte range, parsed and encrypted by the worker; committed ranges are not even parsed
+                    if not is_committed(idx, None, chunk[0]):
+                        yield chunk, idx, make_checkpoint(idx, None, chunk[0])
+                    continue
+                ROWS_PARSED.inc(len(chunk))
+                chunk_offset = row_offset
+                row_offset += len(chunk)
+                if is_committed(idx, chunk_offset, None):
+                    if intermediate is not None:
+                        # Keep the encrypted intermediate file complete
+                        encrypt_chunk(chunk, idx)
+                    continue
+                if intermediate is not None:
+                    chunk = encrypt_chunk(chunk, idx)
+                yield chunk, idx, make_checkpoint(idx, chunk_offset, None)
+
+        if executor_mode == 'inline' and loader == 'thread':
+            for chunk, idx, checkpoint in chunks():
+                total_loaded += collect(_prepare_and_load(*preparation(chunk, idx, False), engine, table, schema, process_id,
+                                                          connections, checkpoint))
+        else:
+            pending = set()
+            peak_inflight = 0
+            reader_waits = 0
+            reader_wait_seconds = 0.0
+            for chunk, idx, checkpoint in chunks():
+                # Block the reader until a worker frees a slot so only max_inflight chunks are held in memory
+                if len(pending) >= max_inflight:
+                    wait_start = time.perf_counter()
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    reader_wait_seconds += time.perf_counter() - wait_start
+                    reader_waits += 1
+                    total_loaded += sum(collect(future.result()) for future in done)
+                pending.add(submit(chunk, idx, checkpoint))
+                CHUNKS_IN_FLIGHT.set(len(pending))
+                peak_inflight = max(peak_inflight, len(pending))
+                logging.debug(f"[Chunk-{idx}] submitted, queue depth {len(pending)}/{max_inflight}")
+
+            for future in as_completed(pending):
+                total_loaded += collect(future.result())
+            CHUNKS_IN_FLIGHT.set(0)
+
+            logging.info(f"In-flight window for {file_path}: {max_inflight} chunks, peak queue depth {peak_inflight}, "
+                         f"reader blocked {reader_waits} times for {reader_wait_seconds:.2f}s")
+
+    if intermediate is not None:
+        logging.info(f"Encrypted {intermediate.format} written to '{encrypted_output_path}'")
+
+    if skipped["chunks"]:
+        logging.info(f"Skipped {skipped['chunks']} chunks ({skipped['rows']} rows) of {file_path} committed by an earlier attempt")
 
-        for idx, chunk in enumerate(reader, start=1):
-            chunk = chunk.reindex(columns=reference_columns)
-            futures.append(executor.submit(process_and_load_chunk, chunk, idx))
+    if parse_stats.get("rows"):
+        record_metric('parse', file_path, duration=parse_stats["parse_seconds"], rows_out=parse_stats["rows"])
+        per_million = parse_stats["parse_seconds"] * 1_000_000 / parse_stats["rows"]
+        logging.info(f"Parsed {parse_stats['rows']} rows in {parse_stats['parse_seconds']:.3f}s "
+                     f"({per_million:.3f}s per million rows, format={source_format}, typed_read={typed_read}, parse_engine={parse_engine})")
 
-        for future in as_completed(futures):
-            total_loaded += future.result()
+    if rule_stats:
+        logging.info(f"Validation rules for {config_table} (hits, time): {format_rule_stats(rule_stats)}")
 
-    logging.info(f"Finished loading file {file_path}. Total rows loaded: {total_loaded} (process_id={process_id})")
\ No newline at end of file
+    logging.info(f"Finished loading file {file_path}. Total rows loaded: {total_loaded} (process_id={process_id})")
+    return {"rows_in": parse_stats.get("rows", 0), "rows_out": total_loaded, **totals}
@@ -0,0 +1,180 @@
+import logging
+from datetime import date
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, ProgrammingError
+
+# What happens to the process partition of a partitioned staging table after a successful merge
+FINISHED_PARTITION_ACTIONS = ('keep', 'detach', 'drop')
+
+# Partition key types that are partitioned by calendar month
+_TIME_KEY_TYPES = ('date', 'timestamp without time zone', 'timestamp with time zone')
+
+
+def is_missing_partition_error(message):
+    """
+    True if a database error message reports rows that no partition accepts.
+
+    PostgreSQL raises it as a check violation (SQLSTATE 23514), but unlike a CHECK failing on bad data it
+    means a partition was not created, so callers raise it instead of rejecting the rows.
+    """
+    return 'no partition of relation' in (message or '')
+
+
+def partition_info(engine, schema, table):
+    """
+    Describe how a table is partitioned.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Schema of the table.
+        table (str): Table name.
+
+    Returns:
+        dict or None: 'strategy' ('list' or 'range'), 'column' (partition key column), 'type' (its
+                      PostgreSQL type) and 'default' (name of the DEFAULT partition or None), or None if
+                      the table is not partitioned by a single column.
+    """
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT p.partstrat, a.attname, format_type(a.atttypid, a.atttypmod) AS key_type,
+                   CAST(NULLIF(p.partdefid, 0) AS regclass)::text AS default_partition
+            FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = p.partattrs[0]
+            WHERE n.nspname = :schema AND c.relname = :table AND p.partnatts = 1
+        """), {"schema": schema, "table": table}).first()
+    if row is None or row.partstrat not in ('l', 'r'):
+        return None
+    return {"strategy": "list" if row.partstrat == 'l' else "range", "column": row.attname, "type": row.key_type,
+            "default": row.default_partition}
+
+
+def _partition_bounds(info, table, value):
+    """
+    Name and FOR VALUES clause of the partition holding value: one value per LIST partition or integer
+    RANGE partition (e.g. 'sales_tmp_pid42'), one calendar month per date or timestamp RANGE partition
+    (e.g. 'sales_202501').
+    """
+    if info['type'] in _TIME_KEY_TYPES:
+        if info['strategy'] != 'range':
+            raise ValueError(f"Time partition key {info['column']} of {table} must use RANGE partitioning")
+        start = date(value.year, value.month, 1)
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        return f"{table}_{start:%Y%m}", f"FROM ('{start}') TO ('{end}')"
+    value = int(value)
+    # Negative ids (e.g. benchmark rows) get a name that needs no quoting: sales_tmp_pid_neg1
+    name = f"{table}_pid{value}" if value >= 0 else f"{table}_pid_neg{-value}"
+    if info['strategy'] == 'list':
+        return name, f"IN ({value})"
+    return name, f"FROM ({value}) TO ({value + 1})"
+
+
+def ensure_partition(engine, schema, table, value, info=None):
+    """
+    Create the partition of a partitioned table that holds value, if it does not exist yet.
+
+    Rows can only be copied or inserted into a partitioned table when a partition accepts them, so this
+    runs before the COPY into a staging table and before the merge into a target table.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Schema of the partitioned table.
+        table (str): Partitioned table name.
+        value: Partition key value (a process_id, or a date/timestamp for monthly partitions).
+        info (dict, optional): Result of partition_info, if already known.
+
+    Returns:
+        str or None: Name of the partition, or None if the table is not partitioned.
+    """
+    info = info or partition_info(engine, schema, table)
+    if info is None:
+        return None
+    name, bounds = _partition_bounds(info, table, value)
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": f'"{schema}"."{name}"'}).scalar()
+            if exists is None:
+                conn.execute(text(f'CREATE TABLE "{schema}"."{name}" PARTITION OF "{schema}"."{table}" FOR VALUES {bounds}'))
+                logging.info(f"Created partition {schema}.{name} of {schema}.{table} FOR VALUES {bounds}")
+    except ProgrammingError as e:
+        # Another process created it between the check and the CREATE
+        if getattr(e.orig, 'pgcode', None) != '42P07':
+            raise
+    return name
+
+
+def ensure_partitions_for_rows(engine, schema, table, source_schema, source_table, process_id):
+    """
+    Create the partitions of a month-partitioned target table needed by the rows a process staged.
+
+    The distinct months of the partition key are read from the staging table, cast as the merge casts
+    them, so the set-based INSERT never finds a row without a partition. Rows with no key value get no
+    partition: a partition key in the primary key is NOT NULL, so the merge rejects them.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Schema of the target table.
+        table (str): Target table name.
+        source_schema (str): Schema of the staging table.
+        source_table (str): Staging table name.
+        process_id (int): Process whose staged rows are merged.
+
+    Returns:
+        list of str: Partitions the rows need; empty if the target is not partitioned.
+    """
+    info = partition_info(engine, schema, table)
+    if info is None:
+        return []
+    if info['type'] not in _TIME_KEY_TYPES:
+        return [ensure_partition(engine, schema, table, process_id, info)] if info['column'] == 'process_id' else []
+
+    try:
+        with engine.connect() as conn:
+            months = conn.execute(text(f"""
+                SELECT DISTINCT date_trunc('month', CAST(t."{info['column']}" AS {info['type']}))
+                FROM "{source_schema}"."{source_table}" t
+                WHERE t.process_id = :pid AND t."{info['column']}" IS NOT NULL
+            """), {"pid": process_id}).scalars().all()
+    except DataError as e:
+        # The merge reports the offending rows; partitions are created for what can be read
+        logging.warning(f"Could not read the months of {source_schema}.{source_table} for process_id={process_id}: {e}")
+        return []
+    return [ensure_partition(engine, schema, table, month, info) for month in sorted(months)]
+
+
+def finish_partition(engine, schema, table, process_id, action):
+    """
+    Detach or drop the partition of a process once its rows have been merged.
+
+    Removing a partition is a catalog operation that takes the same time for any number of rows,
+    unlike a DELETE, and leaves no dead tuples for VACUUM. Rows of the process that a writer put in the
+    DEFAULT partition (without creating the process partition first) are deleted from it, unless the
+    action is 'keep'. Only call it once the process rows were merged.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Schema of the partitioned staging table.
+        table (str): Partitioned staging table name.
+        process_id (int): Process whose partition is finished.
+        action (str): One of FINISHED_PARTITION_ACTIONS; 'detach' keeps the rows as a standalone table.
+    """
+    if action not in FINISHED_PARTITION_ACTIONS:
+        raise ValueError(f"Unsupported staging.finished_partitions '{action}'. Expected one of {FINISHED_PARTITION_ACTIONS}")
+    info = partition_info(engine, schema, table)
+    if action == 'keep' or info is None or info['type'] in _TIME_KEY_TYPES:
+        return
+    name, _ = _partition_bounds(info, table, process_id)
+    with engine.begin() as conn:
+        if info['default'] is not None:
+            deleted = conn.execute(text(f'DELETE FROM {info["default"]} WHERE "{info["column"]}" = :pid'),
+                                   {"pid": process_id}).rowcount
+            if deleted:
+                logging.info(f"Deleted {deleted} rows of process_id={process_id} from {info['default']}")
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": f'"{schema}"."{name}"'}).scalar() is None:
+            return
+        if action == 'detach':
+            conn.execute(text(f'ALTER TABLE "{schema}"."{table}" DETACH PARTITION "{schema}"."{name}"'))
+        else:
+            conn.execute(text(f'DROP TABLE "{schema}"."{name}"'))
+    logging.info(f"{'Detached' if action == 'detach' else 'Dropped'} partition {schema}.{name} of process_id={process_id}")
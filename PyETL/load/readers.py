@@ -0,0 +1,341 @@
+import logging
+import time
+import pandas as pd
+from utils.schema_cache import get_table_metadata
+from utils.utils import align_types_df_to_db_schema
+from utils.file_formats import file_format, read_columns, require_pyarrow, open_arrow_ipc, arrow_to_pandas
+
+# Parsers supported by iter_csv_chunks
+CSV_PARSE_ENGINES = ('c', 'pyarrow')
+
+# pandas dtype requested from the CSV reader for each cast kind (datetimes go through parse_dates)
+READ_DTYPES = {
+    'int': 'Int64',
+    'float': 'float64',
+    'bool': 'boolean',
+    'str': str,
+}
+
+# Read dtypes that the fallback of a failed typed read parses as text and converts with pd.to_numeric
+NUMERIC_READ_DTYPES = ('Int64', 'float64')
+
+# Errors a typed read raises on a value that does not parse as its column dtype (pyarrow.ArrowInvalid is a ValueError)
+TYPED_READ_ERRORS = (ValueError, TypeError)
+
+
+def compile_csv_read_options(engine, schema, table_name, file_path):
+    """
+    Compile the cached cast plan of a table into typed read_csv arguments for a source file.
+
+    Only the file columns that exist in the target table are read (usecols), numeric and text columns are
+    parsed directly into their target dtypes (dtype) and datetime columns are parsed by the reader
+    (parse_dates), so chunks arrive already typed and do not need a second conversion pass.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Schema of the target table.
+        table_name (str): Target table name.
+        file_path (str): Path to the CSV file; only its header is read.
+
+    Returns:
+        dict: Keyword arguments with 'usecols', 'dtype' and 'parse_dates'.
+    """
+    cast_plan = get_table_metadata(engine, schema, table_name)["cast_plan"]
+    header = pd.read_csv(file_path, nrows=0).columns.tolist()
+
+    usecols = [col for col in header if col in cast_plan]
+    skipped = [col for col in header if col not in cast_plan]
+    if skipped:
+        logging.info(f"Columns {skipped} of {file_path} are not in {schema}.{table_name} and will not be read.")
+
+    return {
+        "usecols": usecols,
+        "dtype": {col: READ_DTYPES[cast_plan[col]] for col in usecols if cast_plan[col] in READ_DTYPES},
+        "parse_dates": [col for col in usecols if cast_plan[col] == 'datetime'],
+    }
+
+
+def compile_columnar_read_options(engine, schema, table_name, file_path, fmt):
+    """
+    Compile the column projection of a Parquet or Arrow IPC source: only the file columns that exist in the
+    target table are read. Column types come from the file schema, so no dtype arguments are needed.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Schema of the target table.
+        table_name (str): Target table name.
+        file_path (str): Path to the source file; only its schema is read.
+        fmt (str): 'parquet' or 'arrow'.
+
+    Returns:
+        dict: Keyword arguments with 'usecols'.
+    """
+    cast_plan = get_table_metadata(engine, schema, table_name)["cast_plan"]
+    file_columns = read_columns(file_path, fmt)
+    skipped = [col for col in file_columns if col not in cast_plan]
+    if skipped:
+        logging.info(f"Columns {skipped} of {file_path} are not in {schema}.{table_name} and will not be read.")
+    return {"usecols": [col for col in file_columns if col in cast_plan]}
+
+
+def untyped_numeric_options(read_options):
+    """
+    Read arguments of the fallback for a typed read that failed on a malformed value: the numeric columns
+    are read as text, to be converted with coerce_numeric_columns.
+
+    Returns:
+        tuple: (read arguments, mapping of the numeric columns to their target dtype)
+    """
+    dtype = dict(read_options.get("dtype", {}))
+    numeric = {col: dtype[col] for col in dtype if dtype[col] in NUMERIC_READ_DTYPES}
+    dtype.update({col: str for col in numeric})
+    return {**read_options, "dtype": dtype}, numeric
+
+
+def coerce_numeric_columns(chunk, numeric):
+    """
+    Convert the text columns of a fallback read to their numeric dtypes. Values that are not numbers, and
+    non-integral values of integer columns, become NULL.
+    """
+    for col, dtype in numeric.items():
+        values = pd.to_numeric(chunk[col], errors='coerce')
+        if dtype == 'Int64':
+            values = values.where(values % 1 == 0)
+        chunk[col] = values.astype(dtype)
+    return chunk
+
+
+def _rechunk_batches(batches, chunk_size):
+    """
+    Re-slice a stream of Arrow record batches into Arrow tables of exactly chunk_size rows (the last may be
+    shorter). Slicing is zero-copy; batches are only concatenated when a chunk spans several of them.
+    """
+    import pyarrow as pa
+
+    pending = []
+    pending_rows = 0
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunk_size:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_size)
+            rest = table.slice(chunk_size)
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending)
+
+
+def _iter_parquet_batches(file_path, chunk_size, columns):
+    """
+    Stream a Parquet file row group by row group, reading only the projected column chunks.
+    """
+    require_pyarrow('parquet')
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(file_path, memory_map=True)
+    logging.info(f"Reading {file_path}: {parquet_file.metadata.num_rows} rows in {parquet_file.num_row_groups} row groups")
+    yield from parquet_file.iter_batches(batch_size=chunk_size, columns=columns)
+
+
+def _iter_arrow_ipc_batches(file_path, columns):
+    """
+    Stream the record batches of a memory-mapped Arrow IPC file or stream, projected to the given columns.
+    """
+    reader = open_arrow_ipc(file_path)
+    if hasattr(reader, 'num_record_batches'):
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    else:
+        batches = iter(reader)
+    for batch in batches:
+        yield batch.select(columns) if columns else batch
+
+
+def iter_columnar_chunks(file_path, chunk_size, fmt, read_options=None, stats=None):
+    """
+    Iterate over a Parquet or Arrow IPC file in DataFrame chunks of chunk_size rows.
+
+    Batches are streamed (Parquet row groups, Arrow record batches), re-sliced to chunk_size and converted
+    with arrow_to_pandas, so values go from Arrow memory to NumPy / Arrow-backed columns without
+    per-value Python objects.
+
+    Parameters:
+        file_path (str): Path to the source file.
+        chunk_size (int): Number of rows per chunk.
+        fmt (str): 'parquet' or 'arrow'.
+        read_options (dict, optional): Column projection under 'usecols' (see compile_columnar_read_options).
+        stats (dict, optional): If given, 'rows' and 'parse_seconds' are accumulated into it.
+
+    Yields:
+        pandas.DataFrame: Consecutive chunks of the file.
+    """
+    columns = (read_options or {}).get("usecols") or None
+    if fmt == 'parquet':
+        batches = _iter_parquet_batches(file_path, chunk_size, columns)
+    else:
+        batches = _iter_arrow_ipc_batches(file_path, columns)
+    reader = (arrow_to_pandas(table) for table in _rechunk_batches(batches, chunk_size))
+    yield from _timed_chunks(reader, stats)
+
+
+def iter_source_chunks(file_path, chunk_size, fmt=None, read_options=None, parse_engine='c', stats=None):
+    """
+    Iterate over a CSV, Parquet or Arrow IPC source in DataFrame chunks of chunk_size rows.
+
+    Parameters:
+        file_path (str): Path to the source file.
+        chunk_size (int): Number of rows per chunk.
+        fmt (str, optional): Source format; resolved from the file extension if not given.
+        read_options (dict, optional): Read arguments from compile_csv_read_options or compile_columnar_read_options.
+        parse_engine (str): CSV parser, 'c' or 'pyarrow'.
+        stats (dict, optional): If given, 'rows' and 'parse_seconds' are accumulated into it.
+
+    Yields:
+        pandas.DataFrame: Consecutive chunks of the file.
+    """
+    fmt = file_format(file_path, fmt)
+    if fmt == 'csv':
+        return iter_csv_chunks(file_path, chunk_size, read_options, parse_engine=parse_engine, stats=stats)
+    return iter_columnar_chunks(file_path, chunk_size, fmt, read_options, stats=stats)
+
+
+def _arrow_type(dtype):
+    """
+    Map a pandas read dtype to the pyarrow type used by the pyarrow CSV parser.
+    """
+    import pyarrow as pa
+    return {'Int64': pa.int64(), 'float64': pa.float64(), 'boolean': pa.bool_(), str: pa.string()}[dtype]
+
+
+def _iter_arrow_csv_chunks(file_path, chunk_size, read_options):
+    """
+    Stream a CSV file with the multi-threaded pyarrow parser and re-slice its batches into chunk_size rows.
+    """
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError as e:
+        raise ImportError("csv.parse_engine 'pyarrow' requires the pyarrow package (pip install pyarrow)") from e
+
+    column_types = {col: _arrow_type(dtype) for col, dtype in read_options.get("dtype", {}).items()}
+    column_types.update({col: pa.timestamp('us') for col in read_options.get("parse_dates", [])})
+    convert_options = pa_csv.ConvertOptions(column_types=column_types,
+                                            include_columns=read_options.get("usecols") or None)
+    # Nullable integer and boolean columns keep their pandas extension dtypes
+    types_mapper = {pa.int64(): pd.Int64Dtype(), pa.bool_(): pd.BooleanDtype()}.get
+
+    with pa_csv.open_csv(file_path, convert_options=convert_options) as reader:
+        for table in _rechunk_batches(reader, chunk_size):
+            yield table.to_pandas(types_mapper=types_mapper)
+
+
+def iter_csv_chunks(file_path, chunk_size, read_options=None, parse_engine='c', stats=None):
+    """
+    Iterate over a CSV file in DataFrame chunks of chunk_size rows.
+
+    Parameters:
+        file_path (str): Path to the CSV file.
+        chunk_size (int): Number of rows per chunk.
+        read_options (dict, optional): Typed read arguments from compile_csv_read_options.
+        parse_engine (str): 'c' (pandas parser) or 'pyarrow' (multi-threaded Arrow parser).
+        stats (dict, optional): If given, 'rows' and 'parse_seconds' are accumulated into it.
+
+    Yields:
+        pandas.DataFrame: Consecutive chunks of the file.
+    """
+    if parse_engine not in CSV_PARSE_ENGINES:
+        raise ValueError(f"Unsupported csv.parse_engine '{parse_engine}'. Expected one of {CSV_PARSE_ENGINES}")
+
+    read_options = read_options or {}
+    if parse_engine == 'pyarrow':
+        reader = _iter_arrow_csv_chunks(file_path, chunk_size, read_options)
+    else:
+        reader = iter(pd.read_csv(file_path, chunksize=chunk_size, **read_options))
+    yield from _timed_chunks(_with_untyped_fallback(reader, file_path, chunk_size, read_options), stats)
+
+
+def _with_untyped_fallback(reader, file_path, chunk_size, read_options):
+    """
+    Pass the chunks of a typed CSV read through. A single malformed value in a numeric column fails the
+    whole chunk it is in; the file is then read again from that chunk on with the numeric columns as text
+    (untyped_numeric_options), and the malformed values become NULL instead of failing the file.
+    """
+    rows = 0
+    try:
+        for chunk in reader:
+            rows += len(chunk)
+            yield chunk
+        return
+    except TYPED_READ_ERRORS as e:
+        if not read_options.get("dtype"):
+            raise
+        logging.warning(f"Typed read of {file_path} failed after {rows} rows ({e}); "
+                        f"reading the rest with malformed numbers as NULL")
+
+    fallback_options, numeric = untyped_numeric_options(read_options)
+    header = pd.read_csv(file_path, nrows=0).columns.tolist()
+    with pd.read_csv(file_path, chunksize=chunk_size, skiprows=rows + 1, header=None, names=header,
+                     **fallback_options) as fallback:
+        for chunk in fallback:
+            yield coerce_numeric_columns(chunk, numeric)
+
+
+def _timed_chunks(reader, stats):
+    """
+    Pass chunks through, accumulating the rows read and the time spent producing them into stats.
+    """
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = next(reader)
+        except StopIteration:
+            return
+        if stats is not None:
+            stats["parse_seconds"] = stats.get("parse_seconds", 0.0) + time.perf_counter() - start
+            stats["rows"] = stats.get("rows", 0) + len(chunk)
+        yield chunk
+
+
+def benchmark_csv_parse(file_path, engine, schema, table_name, chunk_size):
+    """
+    Measure the parse cost of a CSV file per million rows, untyped versus typed.
+
+    The untyped measurement reads with inferred dtypes and then aligns every chunk to the table types
+    (the two-pass parse); the typed measurements use compile_csv_read_options with each available parser.
+
+    Parameters:
+        file_path (str): Path to the CSV file.
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Schema of the target table.
+        table_name (str): Target table name.
+        chunk_size (int): Number of rows per chunk.
+
+    Returns:
+        dict: Seconds per million rows for 'untyped', 'typed_c' and, if pyarrow is installed, 'typed_pyarrow'.
+    """
+    results = {}
+
+    start = time.perf_counter()
+    rows = 0
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size):
+        chunk = align_types_df_to_db_schema(chunk, engine, schema, table_name)
+        rows += len(chunk)
+    results["untyped"] = (time.perf_counter() - start) * 1_000_000 / max(rows, 1)
+
+    read_options = compile_csv_read_options(engine, schema, table_name, file_path)
+    for parse_engine in CSV_PARSE_ENGINES:
+        stats = {}
+        try:
+            for _ in iter_csv_chunks(file_path, chunk_size, read_options, parse_engine=parse_engine, stats=stats):
+                pass
+        except ImportError as e:
+            logging.warning(f"Skipping {parse_engine} parse benchmark: {e}")
+            continue
+        results[f"typed_{parse_engine}"] = stats.get("parse_seconds", 0.0) * 1_000_000 / max(stats.get("rows", 0), 1)
+
+    for mode, seconds in results.items():
+        logging.info(f"CSV parse benchmark {mode} for {file_path}: {seconds:.3f}s per million rows")
+    return results
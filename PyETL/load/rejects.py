@@ -0,0 +1,47 @@
+import logging
+import os
+import pandas as pd
+
+
+def build_reject_frame(rejected, table, process_id, idx):
+    """
+    Shape rejected rows for the reject table: one row per rejected record with its reason codes
+    and the original values serialized as JSON.
+
+    Parameters:
+        rejected (pandas.DataFrame): Rejected rows, with a 'reject_reason' column.
+        table (str): Name of the table the rows were meant for.
+        process_id (int): Current ETL process ID.
+        idx (int): Chunk index the rows came from.
+
+    Returns:
+        pandas.DataFrame: Columns process_id, source_table, chunk_idx, reason and row_data.
+    """
+    row_data = rejected.drop(columns=['reject_reason']).to_json(orient='records', lines=True, date_format='iso')
+    return pd.DataFrame({
+        "process_id": int(process_id),
+        "source_table": table,
+        "chunk_idx": idx,
+        "reason": rejected['reject_reason'].to_numpy(),
+        "row_data": row_data.splitlines(),
+    })
+
+
+def write_rejects_parquet(rejected, table, process_id, idx, path):
+    """
+    Write the rejected rows of a chunk to their own Parquet file under path.
+
+    Parameters:
+        rejected (pandas.DataFrame): Rejected rows, with a 'reject_reason' column.
+        table (str): Name of the table the rows were meant for.
+        process_id (int): Current ETL process ID.
+        idx (int): Chunk index the rows came from.
+        path (str): Directory receiving one file per chunk.
+
+    Returns:
+        str: Path of the written file.
+    """
+    os.makedirs(path, exist_ok=True)
+    file_path = os.path.join(path, f"{table}_rejects_{process_id}_chunk{idx:06d}.parquet")
+    rejected.assign(process_id=int(process_id), chunk_idx=idx).to_parquet(file_path, index=False)
+    return file_path
@@ -0,0 +1,57 @@
+import logging
+from sqlalchemy import text
+from utils.schema_cache import invalidate_table_metadata
+
+# Staging strategies selectable with staging.mode
+STAGING_MODES = ('shared', 'unlogged')
+
+
+def staging_table_name(table, process_id):
+    """
+    Name of the per-process staging copy of a table, e.g. 'sales_tmp_p42'.
+    """
+    return f"{table}_p{int(process_id)}"
+
+
+def create_staging_table(engine, schema, table, process_id, reuse=False):
+    """
+    Create an UNLOGGED per-process copy of a staging table for one run.
+
+    The copy has the columns, types and defaults of the table but none of its indexes or constraints
+    (other than NOT NULL), and being UNLOGGED its rows are not written to the WAL. A TEMP table is not
+    used because the COPY workers load through several pooled connections and a temporary table is
+    only visible to the session that created it.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Schema of the shared staging table; the copy is created next to it.
+        table (str): Shared staging table used as the template (e.g. 'sales_tmp').
+        process_id (int): Current ETL process ID.
+        reuse (bool): Keep the table if it already exists (resuming a process) instead of recreating it empty.
+
+    Returns:
+        str: Name of the created table.
+    """
+    name = staging_table_name(table, process_id)
+    with engine.begin() as conn:
+        if not reuse:
+            conn.execute(text(f'DROP TABLE IF EXISTS "{schema}"."{name}"'))
+        conn.execute(text(f'CREATE UNLOGGED TABLE IF NOT EXISTS "{schema}"."{name}" (LIKE "{schema}"."{table}" INCLUDING DEFAULTS)'))
+    invalidate_table_metadata(engine, schema, name)
+    logging.info(f"{'Using' if reuse else 'Created'} UNLOGGED staging table {schema}.{name} for process_id={process_id}")
+    return name
+
+
+def drop_staging_table(engine, schema, name):
+    """
+    Drop a per-process staging table once its rows have been merged.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Schema of the staging table.
+        name (str): Staging table name from create_staging_table.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS "{schema}"."{name}"'))
+    invalidate_table_metadata(engine, schema, name)
+    logging.info(f"Dropped staging table {schema}.{name}")
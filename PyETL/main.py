@@ -1,107 +1,330 @@
-from utils.utils import setup_logging, load_config, create_mock_data, archive_data_files, get_path_with_process_id, sync_dataframe_with_table_schema, align_types_df_to_db_schema,assert_table_exists
-from utils.etl_monitor import start_etl_process, end_etl_process
-from load.load import get_engine, validate_and_load_csv_file_in_chunks, incremental_insert
+from utils.utils import setup_logging, load_config, create_mock_data, archive_data_files, get_path_with_process_id, sync_table_columns, assert_table_exists
+from utils.etl_monitor import start_etl_process, resume_etl_process, end_etl_process, stage_timer, flush_stage_metrics
+from utils.metrics_exporter import start_metrics_exporter
+from load.load import get_engine, copy_worker_count, validate_and_load_csv_file_in_chunks, incremental_insert, merge_insert
+from load.staging import STAGING_MODES, create_staging_table, drop_staging_table
+from load.checkpoints import checkpoint_table, discard_orphaned_checkpoints
+from load.bulk_mode import bulk_state_table, bulk_load_settings, enter_bulk_mode, leave_bulk_mode, hold_process_lock, \
+    restore_abandoned_bulk_objects
+from load.partitions import FINISHED_PARTITION_ACTIONS, ensure_partition, ensure_partitions_for_rows, finish_partition
 from sqlalchemy import text, inspect
 from datetime import datetime
 from transform.transform import data_encryptation
+from utils.scheduler import add_task, run_task_graph, connection_budget
+from utils.file_formats import INTERMEDIATE_FORMATS, file_format
+from utils.file_manifest import manifest_table, detect_file_change
+from load.csv_split import write_csv_tail
+from functools import partial
+import argparse
 import logging
 import os
-import pandas as pd
 
 
 
-def main():
+
+def encrypt_file(original_file, encrypted_file, config, source_format=None, resume=False):
+    """
+    Task: encrypt a source file into its '_encrypted' intermediate (non-streaming mode).
+    When resuming, an existing intermediate is reused: re-encrypting would change its content and
+    invalidate the checkpoints of the chunks already loaded from it.
+    """
+    if resume and os.path.exists(encrypted_file):
+        logging.info(f"Reusing encrypted file {encrypted_file} of the resumed process")
+        return
+    with stage_timer('encrypt', original_file):
+        data_encryptation(original_file, encrypted_file, config['encryption'], source_format)
+
+
+def load_file(engine, config, file_entry, process_id, staging_tables):
+    """
+    Task: validate and COPY one file into its staging table in chunks.
+
+    Returns:
+        dict: Load counters from validate_and_load_csv_file_in_chunks.
+    """
+    streaming = config.get("csv", {}).get("streaming", False)
+    chunk_size = config.get("csv", {}).get("chunk_size", 10000)
+    load_table = staging_tables.get((file_entry['schema'], file_entry['table']), file_entry['table'])
+
+    logging.info(f"Processing file {file_entry['file_path']} into {file_entry['schema']}.{load_table} using chunks of size {chunk_size}")
+    with stage_timer('load', file_entry['file_path']) as counters:
+        counters.update(validate_and_load_csv_file_in_chunks(
+            file_path=file_entry['file_path'],
+            engine=engine,
+            schema=file_entry['schema'],
+            table=load_table,
+            process_id=process_id,
+            chunk_size=chunk_size,
+            config=config,
+            encryption_config=config['encryption'] if streaming else None,
+            encrypted_output_path=file_entry.get('encrypted_output_path'),
+            config_table=file_entry['table'],
+            source_format=file_entry.get('format'),
+            columns=file_entry.get('columns')
+        ))
+    return counters
+
+
+def merge_entry(engine, inc_entry, process_id, staging_tables):
+    """
+    Task: align the target table with its tmp table and merge the process rows into it.
+
+    Returns:
+        int: Rows inserted into the target table.
+    """
+    tmp_table = staging_tables.get((inc_entry['tmp_schema'], inc_entry['tmp_table']), inc_entry['tmp_table'])
+
+    # New staging columns are added to the target in SQL; the rows never leave the database
+    logging.info(f"Performing alignment of temp table {inc_entry['tmp_schema']}.{tmp_table} to match target table {inc_entry['target_schema']}.{inc_entry['target_table']}")
+    sync_table_columns(engine, inc_entry['tmp_schema'], tmp_table, inc_entry['target_schema'], inc_entry['target_table'])
+
+    # Month (or process) partitions of a partitioned target are created before the rows are inserted
+    ensure_partitions_for_rows(engine, inc_entry['target_schema'], inc_entry['target_table'], inc_entry['tmp_schema'], tmp_table, process_id)
+
+    merge_mode = inc_entry.get('merge_mode', 'set')
+    logging.info(f"Performing incremental load ({merge_mode} mode) from {inc_entry['tmp_schema']}.{tmp_table} to {inc_entry['target_schema']}.{inc_entry['target_table']} for process_id {process_id}")
+    with stage_timer('merge', f"{inc_entry['target_schema']}.{inc_entry['target_table']}") as counters:
+        if merge_mode == 'row':
+            merge_counts = incremental_insert(
+                engine,
+                inc_entry['tmp_schema'],
+                tmp_table,
+                inc_entry['target_schema'],
+                inc_entry['target_table'],
+                inc_entry['unique_keys'],
+                process_id
+            )
+        else:
+            merge_counts = merge_insert(
+                engine,
+                inc_entry['tmp_schema'],
+                tmp_table,
+                inc_entry['target_schema'],
+                inc_entry['target_table'],
+                inc_entry['unique_keys'],
+                process_id
+            )
+        inserted = merge_counts['inserted']
+        counters['rows_in'] = sum(merge_counts.values())
+        counters['rows_rejected'] = merge_counts['rejected']
+        counters['rows_out'] = inserted
+    return inserted
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line options of the ETL.
+    """
+    parser = argparse.ArgumentParser(description="Run the ETL process.")
+    parser.add_argument("--resume", type=int, metavar="PROCESS_ID",
+                        help="Resume a failed process: reuse its process_id and input files and skip the chunks "
+                             "its checkpoints record as committed (requires load_process.checkpoint_table).")
+    return parser.parse_args(argv)
+
+
+def main(resume_process_id=None):
     process_id = None
     total_loaded = 0
     error_message = None
+    stop_metrics_exporter = None
+    staging_tables = {}
+    task_results = {}
+    manifest_entries = []
+    bulk_tables = []
+    bulk_lock = None
 
     try:
         config = load_config() 
         setup_logging(config)   
+        stop_metrics_exporter = start_metrics_exporter(config.get('metrics'))
         logging.info("Starting ETL process...")
 
-        engine = get_engine(config['database'])  
-        process_id = start_etl_process(engine, config)
-        logging.info(f"ETL process started with process_id={process_id}")
+        # The pool is sized to the connection budget shared by the concurrently running tasks
+        copy_workers = copy_worker_count(config['csv'])
+        engine = get_engine(config['database'], workers=connection_budget(config, copy_workers))
+        resume = resume_process_id is not None
+        if resume:
+            # The input files of a failed process were not archived; mock data is not generated again
+            process_id = resume_etl_process(engine, config, resume_process_id)
+            if checkpoint_table(config) is None:
+                logging.warning("load_process.checkpoint_table is not set; every chunk is loaded again")
+        else:
+            process_id = start_etl_process(engine, config)
+            logging.info(f"ETL process started with process_id={process_id}")
+
+            with stage_timer('mock_data'):
+                create_mock_data(config, process_id)
+
+        # Indexes and constraints left dropped by an aborted bulk load are rebuilt before anything else;
+        # those of processes still running (holding their lock) are left to them
+        if bulk_state_table(config):
+            bulk_lock = hold_process_lock(engine, process_id)
+            restored = restore_abandoned_bulk_objects(engine, bulk_state_table(config), process_id)
+            if restored:
+                logging.warning(f"Rebuilt {restored} indexes, constraints and sequences left by an aborted bulk load")
 
-        create_mock_data(config, process_id)
+        streaming = config.get("csv", {}).get("streaming", False)
+        write_encrypted_file = config['encryption'].get('write_encrypted_file', False)
 
+        # Graph of encrypt -> load -> merge tasks; independent files and tables run concurrently
+        tasks = {}
+        loads_by_table = {}
+        skipped_tables = set()
         for file_entry in config.get('files_to_tables_tmp', []):
             base_file = file_entry['file_path']  
             original_file = get_path_with_process_id(base_file, process_id)  
             #logging.info(f"original file in call to encrypted  {original_file}")
-            encrypted_file = original_file.replace('.csv', '_encrypted.csv')  
 
-            data_encryptation(original_file, encrypted_file, config['encryption'])
-            file_entry['file_path'] = encrypted_file
+            # Change detection: unchanged files are skipped and append-only CSV feeds load only their new tail
+            if manifest_table(config):
+                append_only = file_entry.get('append_only', False)
+                if append_only and file_format(original_file, file_entry.get('format')) != 'csv':
+                    logging.warning(f"append_only is only supported for CSV feeds; {original_file} is compared as a whole")
+                    append_only = False
+                change = detect_file_change(engine, config, base_file, original_file, append_only)
+                manifest_entries.append(change)
+                if change['change_type'] == 'unchanged':
+                    logging.info(f"Skipping unchanged file {original_file}")
+                    skipped_tables.add((file_entry['schema'], file_entry['table']))
+                    continue
+                if change['change_type'] == 'appended':
+                    tail_file = f"{os.path.splitext(original_file)[0]}_tail.csv"
+                    write_csv_tail(original_file, change['loaded_from_byte'], tail_file)
+                    original_file = tail_file
+
+            # The encrypted intermediate is CSV unless encryption.intermediate_format is parquet
+            intermediate_format = config['encryption'].get('intermediate_format', 'csv')
+            if intermediate_format not in INTERMEDIATE_FORMATS:
+                raise ValueError(f"Unsupported encryption.intermediate_format '{intermediate_format}'. Expected one of {list(INTERMEDIATE_FORMATS)}")
+            encrypted_file = f"{os.path.splitext(original_file)[0]}_encrypted{INTERMEDIATE_FORMATS[intermediate_format]}"
+
+            deps = []
+            if streaming:
+                # Encryption happens chunk by chunk inside the loader; the encrypted file is optional
+                file_entry['file_path'] = original_file
+                file_entry['encrypted_output_path'] = encrypted_file if write_encrypted_file else None
+            else:
+                add_task(tasks, f"encrypt:{original_file}", partial(encrypt_file, original_file, encrypted_file, config, file_entry.get('format'), resume))
+                deps.append(f"encrypt:{original_file}")
+                file_entry['file_path'] = encrypted_file
+                # The intermediate's format follows its extension, not the source format
+                file_entry.pop('format', None)
+
+            load_task = f"load:{file_entry['file_path']}"
+            add_task(tasks, load_task, partial(load_file, engine, config, file_entry, process_id, staging_tables),
+                     deps=deps, connections=copy_workers)
+            loads_by_table.setdefault((file_entry['schema'], file_entry['table']), []).append(load_task)
 
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
         logging.info("Connection to database OK and verified.")
 
-        chunk_size = config.get("csv", {}).get("chunk_size", 10000)
-
         for inc_entry in config.get('files_to_tables_inc', []):
             assert_table_exists(engine, inc_entry['target_schema'], inc_entry['target_table'])
             assert_table_exists(engine, inc_entry['tmp_schema'], inc_entry['tmp_table'])
 
-        for file_entry in config.get('files_to_tables_tmp', []):
-            file_path_with_pid = file_entry['file_path']
-            logging.info(f"Processing file {file_path_with_pid} into {file_entry['schema']}.{file_entry['table']} using chunks of size {chunk_size}")
-            validate_and_load_csv_file_in_chunks(
-                file_path=file_path_with_pid,
-                engine=engine,
-                schema=file_entry['schema'],
-                table=file_entry['table'],
-                process_id=process_id,
-                chunk_size=chunk_size,
-                config=config
-            )
+        # Staging: COPY into the configured tmp tables, or into per-process UNLOGGED copies of them
+        staging_mode = config.get('staging', {}).get('mode', 'shared')
+        if staging_mode not in STAGING_MODES:
+            raise ValueError(f"Unsupported staging.mode '{staging_mode}'. Expected one of {STAGING_MODES}")
+        finished_partitions = config.get('staging', {}).get('finished_partitions', 'keep')
+        if finished_partitions not in FINISHED_PARTITION_ACTIONS:
+            raise ValueError(f"Unsupported staging.finished_partitions '{finished_partitions}'. Expected one of {FINISHED_PARTITION_ACTIONS}")
+        if staging_mode == 'unlogged':
+            for staging_schema, staging_table in loads_by_table:
+                staging_tables[(staging_schema, staging_table)] = create_staging_table(engine, staging_schema, staging_table, process_id, reuse=resume)
+        else:
+            # A tmp table partitioned by process_id gets this process' partition before the first COPY
+            for staging_schema, staging_table in loads_by_table:
+                ensure_partition(engine, staging_schema, staging_table, process_id)
+
+        # Bulk mode (tables.<table>.bulk_load) on the tables rows are copied or merged into; per-process
+        # UNLOGGED staging copies have no indexes to defer
+        bulk_targets = [key for key in loads_by_table if key not in staging_tables]
+        bulk_targets += [(inc_entry['target_schema'], inc_entry['target_table']) for inc_entry in config.get('files_to_tables_inc', [])]
+        for bulk_schema, bulk_table in dict.fromkeys(bulk_targets):
+            settings = bulk_load_settings(config, bulk_table)
+            if settings is None:
+                continue
+            if bulk_state_table(config) is None:
+                raise ValueError(f"tables.{bulk_table}.bulk_load requires load_process.bulk_state_table to rebuild aborted loads")
+            bulk_tables.append((bulk_schema, bulk_table, settings))
+            enter_bulk_mode(engine, bulk_state_table(config), bulk_schema, bulk_table, settings, process_id)
+
+        if resume and checkpoint_table(config):
+            for staging_schema, staging_table in loads_by_table:
+                load_table = staging_tables.get((staging_schema, staging_table), staging_table)
+                discard_orphaned_checkpoints(engine, checkpoint_table(config), process_id, f"{staging_schema}.{load_table}")
 
+        # A merge waits for the loads into its own tmp table and for the previous merge into the same
+        # target, since two anti-joins running at once would not see each other's rows
+        last_merge_by_target = {}
+        merged_tmp_tables = set()
         for inc_entry in config.get('files_to_tables_inc', []):
-            logging.info(f"Performing alignment of temp table {inc_entry['tmp_schema']}.{inc_entry['tmp_table']} to match target table {inc_entry['target_schema']}.{inc_entry['target_table']}")
-
-            with engine.connect() as conn:
-                query = f"""
-                    SELECT * FROM \"{inc_entry['tmp_schema']}\".\"{inc_entry['tmp_table']}\"
-                    WHERE process_id = {process_id}
-                """
-                df_tmp = pd.read_sql(query, conn)
-                #Drop 'id' from the DataFrame before syncing if it exists to avoid ALTER TABLE conflict
-                if 'id' in df_tmp.columns:
-                    df_tmp.drop(columns=['id'], inplace=True)
-                    logging.info("Column 'id' dropped from temp DataFrame before schema sync.")
-
-            
-                df_tmp = sync_dataframe_with_table_schema(df_tmp, engine, inc_entry['target_schema'], inc_entry['target_table'])
-          
-                df_tmp = align_types_df_to_db_schema(df_tmp, engine, inc_entry['target_schema'], inc_entry['target_table'])
-                
-
-                logging.info(f"Aligned and replaced temp table {inc_entry['tmp_schema']}.{inc_entry['tmp_table']} before incremental insert.")
-
-                logging.info(f"Performing incremental load from {inc_entry['tmp_schema']}.{inc_entry['tmp_table']} to {inc_entry['target_schema']}.{inc_entry['target_table']} for process_id {process_id}")
-                inserted = incremental_insert(
-                    engine,
-                    inc_entry['tmp_schema'],
-                    inc_entry['tmp_table'],
-                    inc_entry['target_schema'],
-                    inc_entry['target_table'],
-                    inc_entry['unique_keys'],
-                    process_id
-                )
-                total_loaded += inserted
+            tmp_key = (inc_entry['tmp_schema'], inc_entry['tmp_table'])
+            target_key = (inc_entry['target_schema'], inc_entry['target_table'])
+            if tmp_key in skipped_tables and tmp_key not in loads_by_table:
+                logging.info(f"No changed input for {inc_entry['tmp_schema']}.{inc_entry['tmp_table']}; merge into {inc_entry['target_schema']}.{inc_entry['target_table']} skipped")
+                continue
+            merge_task = f"merge:{inc_entry['tmp_schema']}.{inc_entry['tmp_table']}->{inc_entry['target_schema']}.{inc_entry['target_table']}"
+            deps = loads_by_table.get(tmp_key, []) + ([last_merge_by_target[target_key]] if target_key in last_merge_by_target else [])
+            add_task(tasks, merge_task, partial(merge_entry, engine, inc_entry, process_id, staging_tables),
+                     deps=deps, connections=1)
+            last_merge_by_target[target_key] = merge_task
+            merged_tmp_tables.add(tmp_key)
+
+        run_task_graph(tasks, max_workers=config.get('scheduler', {}).get('max_parallel_tasks', 1),
+                       max_connections=connection_budget(config, copy_workers), results=task_results)
+        total_loaded = sum(inserted for name, inserted in task_results.items() if name.startswith('merge:'))
+
+        # Per-process staging tables are dropped once merged; after a failure they are kept for inspection
+        if not config.get('staging', {}).get('keep', False):
+            for (staging_schema, _), staging_table in staging_tables.items():
+                drop_staging_table(engine, staging_schema, staging_table)
+        # The merged process partition of a partitioned tmp table is detached or dropped instead of deleting its
+        # rows; tmp tables no merge reads from keep their rows
+        if staging_mode == 'shared':
+            for staging_schema, staging_table in loads_by_table:
+                if (staging_schema, staging_table) not in merged_tmp_tables:
+                    continue
+                finish_partition(engine, staging_schema, staging_table, process_id, finished_partitions)
+
+        # Deferred indexes and constraints are rebuilt once every load and merge is done
+        for bulk_schema, bulk_table, settings in bulk_tables:
+            leave_bulk_mode(engine, bulk_state_table(config), bulk_schema, bulk_table, settings)
 
         logging.info(f"ETL process completed successfully process_id={process_id}. Total records loaded: {total_loaded}")
 
     except Exception as e:
         error_message = str(e)
+        # Merges that finished before the failure still count
+        total_loaded = sum(inserted for name, inserted in task_results.items() if name.startswith('merge:'))
         logging.error(f"ETL failed (process_id={process_id}): {error_message}")
+        for (staging_schema, _), staging_table in staging_tables.items():
+            logging.info(f"Staging table {staging_schema}.{staging_table} kept for inspection after the failure")
+        for bulk_schema, bulk_table, settings in bulk_tables:
+            try:
+                leave_bulk_mode(engine, bulk_state_table(config), bulk_schema, bulk_table, settings, analyze=False)
+            except Exception as restore_error:
+                logging.warning(f"Bulk mode objects of {bulk_schema}.{bulk_table} are rebuilt on the next run: {restore_error}")
 
     finally:
         if process_id is not None:
-            end_etl_process(engine, config, process_id, total_loaded, error_message)
-            archive_data_files(config, process_id)
+            end_etl_process(engine, config, process_id, total_loaded, error_message, manifest_entries)
+            try:
+                flush_stage_metrics(engine, config, process_id)
+            except Exception as e:
+                # Metrics must never fail the run
+                logging.warning(f"Could not store stage metrics (process_id={process_id}): {e}")
+            if error_message is None:
+                archive_data_files(config, process_id)
+            else:
+                # Keep the inputs so the failed process can be resumed
+                logging.info(f"Input files of process_id={process_id} kept for --resume {process_id}")
+        if bulk_lock is not None:
+            bulk_lock.close()
+        if stop_metrics_exporter is not None:
+            stop_metrics_exporter()
 
 if __name__ == "__main__":
-    main()
+    main(parse_args().resume)
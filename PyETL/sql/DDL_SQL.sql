@@ -21,11 +21,19 @@ CREATE TABLE etl_assesment_data.sales (
 	customer_id varchar(100) NULL,
 	product_id varchar(100) NULL,
 	quantity int4 NULL,
-	"timestamp" timestamp NULL,
+	"timestamp" timestamp NOT NULL,
 	process_id int4 NULL,
-	CONSTRAINT sales_pkey PRIMARY KEY (id),
+	CONSTRAINT sales_pkey PRIMARY KEY (id, "timestamp"),
 	CONSTRAINT sales_quantity_check CHECK ((quantity > 0))
-);
+) PARTITION BY RANGE ("timestamp");
+
+-- Monthly partitions (e.g. etl_assesment_data.sales_202501) are created by the ETL before each merge.
+-- Unique constraints of a partitioned table must include the partition key, so the primary key is
+-- (id, "timestamp"): id alone is no longer unique, and every row needs a timestamp. The DEFAULT
+-- partition only catches rows of a month whose partition does not exist yet; that partition cannot be
+-- created while the DEFAULT partition holds rows of its month.
+
+CREATE TABLE etl_assesment_data.sales_default PARTITION OF etl_assesment_data.sales DEFAULT;
 
 -- etl_assesment_data.sales_tmp definition
 
@@ -40,10 +48,20 @@ CREATE TABLE etl_assesment_data.sales_tmp (
 	product_id varchar(100) NULL,
 	quantity int4 NULL,
 	"timestamp" timestamp NULL,
-	process_id int4 NULL,
-	CONSTRAINT sales_pkey_tmp PRIMARY KEY (id),
+	process_id int4 NOT NULL,
+	CONSTRAINT sales_pkey_tmp PRIMARY KEY (id, process_id),
 	CONSTRAINT sales_quantity_check_tmp CHECK ((quantity > 0))
-);
+) PARTITION BY LIST (process_id);
+
+-- One partition per process (e.g. etl_assesment_data.sales_tmp_pid42, or sales_tmp_pid_neg1 for a
+-- negative id) is created by the ETL before the first COPY and detached or dropped after the merge
+-- (staging.finished_partitions). The DEFAULT partition takes rows of writers that do not create their
+-- partition first; the ETL deletes a process' rows from it once they are merged.
+
+CREATE TABLE etl_assesment_data.sales_tmp_default PARTITION OF etl_assesment_data.sales_tmp DEFAULT;
+
+-- Existing deployments with the unpartitioned sales and sales_tmp tables are converted with
+-- sql/upgrade_partitioned_sales.sql.
 
 -- etl_assesment_data.sales_id_seq definition
 
@@ -71,4 +89,104 @@ CREATE TABLE loads.etl_load_log (
 	status varchar(20) NULL,
 	error_message text NULL,
 	CONSTRAINT etl_load_log_pkey PRIMARY KEY (process_id)
-);
\ No newline at end of file
+);
+
+-- loads.etl_rejected_rows definition
+
+-- Drop table
+
+-- DROP TABLE loads.etl_rejected_rows;
+
+CREATE TABLE loads.etl_rejected_rows (
+	id bigserial NOT NULL,
+	process_id int8 NOT NULL,
+	source_table varchar(100) NOT NULL,
+	chunk_idx int4 NULL,
+	reason varchar(200) NOT NULL,
+	row_data jsonb NULL,
+	rejected_at timestamp NOT NULL DEFAULT now(),
+	CONSTRAINT etl_rejected_rows_pkey PRIMARY KEY (id)
+);
+
+CREATE INDEX etl_rejected_rows_process_id_idx ON loads.etl_rejected_rows USING btree (process_id);
+
+-- loads.etl_stage_metrics definition
+
+-- Drop table
+
+-- DROP TABLE loads.etl_stage_metrics;
+
+CREATE TABLE loads.etl_stage_metrics (
+	id bigserial NOT NULL,
+	process_id int8 NOT NULL,
+	stage varchar(50) NOT NULL,
+	target varchar(300) NULL,
+	chunk_idx int4 NULL,
+	started_at timestamp NOT NULL,
+	duration_ms float8 NULL,
+	rows_in int8 NULL,
+	rows_out int8 NULL,
+	rows_rejected int8 NULL,
+	bytes_copied int8 NULL,
+	peak_rss_bytes int8 NULL,
+	CONSTRAINT etl_stage_metrics_pkey PRIMARY KEY (id)
+);
+
+CREATE INDEX etl_stage_metrics_process_id_idx ON loads.etl_stage_metrics USING btree (process_id, stage);
+
+-- loads.etl_chunk_checkpoints definition
+
+-- Drop table
+
+-- DROP TABLE loads.etl_chunk_checkpoints;
+
+CREATE TABLE loads.etl_chunk_checkpoints (
+	process_id int8 NOT NULL,
+	file_path varchar(500) NOT NULL,
+	file_fingerprint varchar(64) NOT NULL,
+	target_table varchar(300) NOT NULL,
+	chunk_idx int4 NOT NULL,
+	row_offset int8 NULL,
+	byte_offset int8 NULL,
+	rows_committed int8 NOT NULL,
+	committed_at timestamp NOT NULL DEFAULT now(),
+	CONSTRAINT etl_chunk_checkpoints_pkey PRIMARY KEY (process_id, file_fingerprint, target_table, chunk_idx)
+);
+
+-- loads.etl_file_manifest definition
+
+-- Drop table
+
+-- DROP TABLE loads.etl_file_manifest;
+
+CREATE TABLE loads.etl_file_manifest (
+	feed varchar(500) NOT NULL,
+	process_id int8 NOT NULL,
+	file_path varchar(500) NOT NULL,
+	file_size int8 NOT NULL,
+	file_mtime_ns int8 NOT NULL,
+	content_hash varchar(64) NOT NULL,
+	block_size int8 NULL,
+	block_hashes text[] NULL,
+	change_type varchar(20) NOT NULL,
+	loaded_from_byte int8 NULL,
+	updated_at timestamp NOT NULL DEFAULT now(),
+	CONSTRAINT etl_file_manifest_pkey PRIMARY KEY (feed)
+);
+
+-- loads.etl_bulk_load_state definition
+
+-- Drop table
+
+-- DROP TABLE loads.etl_bulk_load_state;
+
+CREATE TABLE loads.etl_bulk_load_state (
+	id bigserial NOT NULL,
+	process_id int8 NOT NULL,
+	table_name varchar(300) NOT NULL,
+	object_type varchar(20) NOT NULL,
+	object_name varchar(300) NOT NULL,
+	restore_sql text NOT NULL,
+	created_at timestamp NOT NULL DEFAULT now(),
+	CONSTRAINT etl_bulk_load_state_pkey PRIMARY KEY (id)
+);
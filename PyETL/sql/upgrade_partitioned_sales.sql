@@ -0,0 +1,92 @@
+-- Converts a deployment created with the unpartitioned etl_assesment_data.sales and sales_tmp tables to
+-- the partitioned tables of DDL_SQL.sql. Run it once, with no ETL process running:
+--
+--   psql -d <database> -v ON_ERROR_STOP=1 -f sql/upgrade_partitioned_sales.sql
+--
+-- The old tables are renamed to sales_unpartitioned and sales_tmp_unpartitioned and their rows copied
+-- into the new tables. Rows the new keys do not accept (sales rows without a timestamp, sales_tmp rows
+-- without a process_id) stay behind in the old tables; check them before dropping those tables.
+
+BEGIN;
+
+-- etl_assesment_data.sales_tmp
+
+ALTER TABLE etl_assesment_data.sales_tmp RENAME TO sales_tmp_unpartitioned;
+ALTER TABLE etl_assesment_data.sales_tmp_unpartitioned RENAME CONSTRAINT sales_pkey_tmp TO sales_pkey_tmp_unpartitioned;
+ALTER TABLE etl_assesment_data.sales_tmp_unpartitioned RENAME CONSTRAINT sales_quantity_check_tmp TO sales_quantity_check_tmp_unpartitioned;
+
+CREATE TABLE etl_assesment_data.sales_tmp (
+	id int4 NOT NULL DEFAULT nextval('etl_assesment_data.sales_id_seq'::regclass),
+	transaction_id varchar(100) NULL,
+	customer_id varchar(100) NULL,
+	product_id varchar(100) NULL,
+	quantity int4 NULL,
+	"timestamp" timestamp NULL,
+	process_id int4 NOT NULL,
+	CONSTRAINT sales_pkey_tmp PRIMARY KEY (id, process_id),
+	CONSTRAINT sales_quantity_check_tmp CHECK ((quantity > 0))
+) PARTITION BY LIST (process_id);
+
+CREATE TABLE etl_assesment_data.sales_tmp_default PARTITION OF etl_assesment_data.sales_tmp DEFAULT;
+
+-- Partitions named as the ETL names them (load/partitions.py), so later runs find them
+DO $$
+DECLARE
+	pid int4;
+BEGIN
+	FOR pid IN SELECT DISTINCT process_id FROM etl_assesment_data.sales_tmp_unpartitioned WHERE process_id IS NOT NULL LOOP
+		EXECUTE format('CREATE TABLE etl_assesment_data.%I PARTITION OF etl_assesment_data.sales_tmp FOR VALUES IN (%s)',
+			CASE WHEN pid < 0 THEN 'sales_tmp_pid_neg' || -pid ELSE 'sales_tmp_pid' || pid END, pid);
+	END LOOP;
+END $$;
+
+INSERT INTO etl_assesment_data.sales_tmp (id, transaction_id, customer_id, product_id, quantity, "timestamp", process_id)
+SELECT id, transaction_id, customer_id, product_id, quantity, "timestamp", process_id
+FROM etl_assesment_data.sales_tmp_unpartitioned
+WHERE process_id IS NOT NULL;
+
+-- etl_assesment_data.sales
+
+ALTER TABLE etl_assesment_data.sales RENAME TO sales_unpartitioned;
+ALTER TABLE etl_assesment_data.sales_unpartitioned RENAME CONSTRAINT sales_pkey TO sales_pkey_unpartitioned;
+ALTER TABLE etl_assesment_data.sales_unpartitioned RENAME CONSTRAINT sales_quantity_check TO sales_quantity_check_unpartitioned;
+
+-- Same columns as the serial4 id of DDL_SQL.sql, on the existing sequence
+CREATE TABLE etl_assesment_data.sales (
+	id int4 NOT NULL DEFAULT nextval('etl_assesment_data.sales_id_seq'::regclass),
+	transaction_id varchar(100) NULL,
+	customer_id varchar(100) NULL,
+	product_id varchar(100) NULL,
+	quantity int4 NULL,
+	"timestamp" timestamp NOT NULL,
+	process_id int4 NULL,
+	CONSTRAINT sales_pkey PRIMARY KEY (id, "timestamp"),
+	CONSTRAINT sales_quantity_check CHECK ((quantity > 0))
+) PARTITION BY RANGE ("timestamp");
+
+-- The old serial column owns the sequence; without this, dropping sales_unpartitioned would drop it
+ALTER SEQUENCE etl_assesment_data.sales_id_seq OWNED BY etl_assesment_data.sales.id;
+ALTER TABLE etl_assesment_data.sales_unpartitioned ALTER COLUMN id DROP DEFAULT;
+
+CREATE TABLE etl_assesment_data.sales_default PARTITION OF etl_assesment_data.sales DEFAULT;
+
+DO $$
+DECLARE
+	month_start timestamp;
+BEGIN
+	FOR month_start IN SELECT DISTINCT date_trunc('month', "timestamp") FROM etl_assesment_data.sales_unpartitioned WHERE "timestamp" IS NOT NULL LOOP
+		EXECUTE format('CREATE TABLE etl_assesment_data.%I PARTITION OF etl_assesment_data.sales FOR VALUES FROM (%L) TO (%L)',
+			'sales_' || to_char(month_start, 'YYYYMM'), month_start, month_start + interval '1 month');
+	END LOOP;
+END $$;
+
+INSERT INTO etl_assesment_data.sales (id, transaction_id, customer_id, product_id, quantity, "timestamp", process_id)
+SELECT id, transaction_id, customer_id, product_id, quantity, "timestamp", process_id
+FROM etl_assesment_data.sales_unpartitioned
+WHERE "timestamp" IS NOT NULL;
+
+COMMIT;
+
+-- Once the rows left behind were checked:
+-- DROP TABLE etl_assesment_data.sales_tmp_unpartitioned;
+-- DROP TABLE etl_assesment_data.sales_unpartitioned;
@@ -0,0 +1,31 @@
+import os
+import sys
+import pytest
+
+# The modules import each other from the PyETL directory (e.g. 'from load.load import ...'), as main.py runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Scratch schema of the database tests, dropped after each test
+TEST_SCHEMA = 'etl_test'
+
+
+@pytest.fixture
+def pg_engine():
+    """
+    SQLAlchemy engine on the PostgreSQL database in ETL_TEST_DATABASE_URL, with an empty TEST_SCHEMA.
+
+    Tests using it are skipped when the variable is not set, so the unit tests never touch a database
+    unless asked to (e.g. ETL_TEST_DATABASE_URL=postgresql://postgres@localhost/postgres).
+    """
+    url = os.environ.get('ETL_TEST_DATABASE_URL')
+    if not url:
+        pytest.skip("ETL_TEST_DATABASE_URL is not set")
+    from sqlalchemy import create_engine, text
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {TEST_SCHEMA}"))
+    yield engine
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE"))
+    engine.dispose()
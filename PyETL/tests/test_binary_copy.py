@@ -0,0 +1,86 @@
+import struct
+import numpy as np
+import pandas as pd
+import pytest
+from load.binary_copy import PGCOPY_HEADER, PGCOPY_TRAILER, encode_binary_copy, pg_binary_type
+
+
+def field(data):
+    return struct.pack('>i', len(data)) + data
+
+
+NULL = struct.pack('>i', -1)
+
+
+def payload(*rows):
+    return PGCOPY_HEADER + b''.join(struct.pack('>h', len(row)) + b''.join(row) for row in rows) + PGCOPY_TRAILER
+
+
+def test_nulls_and_nan_are_encoded_as_null_fields():
+    columns = {
+        'quantity': pd.Series([1.0, np.nan]),
+        'price': pd.Series([np.nan, 2.5]),
+        'timestamp': pd.Series([pd.NaT, pd.Timestamp('2000-01-01 00:00:01')]),
+    }
+    pg_types = {'quantity': 'int4', 'price': 'float8', 'timestamp': 'timestamp'}
+
+    encoded = bytes(encode_binary_copy(columns, pg_types))
+
+    assert encoded == payload(
+        [field(struct.pack('>i', 1)), NULL, NULL],
+        [NULL, field(struct.pack('>d', 2.5)), field(struct.pack('>q', 1_000_000))],
+    )
+
+
+def test_non_integral_and_unparsable_integers_are_null():
+    columns = {'quantity': pd.Series(['1.5', '2', 'x', '3.0'], dtype=object)}
+
+    encoded = bytes(encode_binary_copy(columns, {'quantity': 'int4'}))
+
+    assert encoded == payload([NULL], [field(struct.pack('>i', 2))], [NULL], [field(struct.pack('>i', 3))])
+
+
+def test_text_values_follow_fixed_width_fields():
+    columns = {
+        'quantity': pd.Series([7, None, 9], dtype='Int64'),
+        'customer_id': pd.Series(['a', 'bcd', None], dtype=object),
+        'product_id': pd.Series([None, 'xy', 'z'], dtype=object),
+    }
+    pg_types = {'quantity': 'int8', 'customer_id': 'text', 'product_id': 'text'}
+
+    encoded = bytes(encode_binary_copy(columns, pg_types))
+
+    assert encoded == payload(
+        [field(struct.pack('>q', 7)), field(b'a'), NULL],
+        [NULL, field(b'bcd'), field(b'xy')],
+        [field(struct.pack('>q', 9)), NULL, field(b'z')],
+    )
+
+
+def test_text_lengths_are_utf8_byte_lengths():
+    columns = {'customer_id': pd.Series(['ä€', None, 'abc'], dtype=object)}
+
+    encoded = bytes(encode_binary_copy(columns, {'customer_id': 'text'}))
+
+    assert encoded == payload([field('ä€'.encode('utf-8'))], [NULL], [field(b'abc')])
+
+
+def test_arrow_text_lengths_are_utf8_byte_lengths():
+    pytest.importorskip('pyarrow')
+    columns = {'customer_id': pd.Series(['ä€', None, 'abc'], dtype='string[pyarrow]')}
+
+    encoded = bytes(encode_binary_copy(columns, {'customer_id': 'text'}))
+
+    assert encoded == payload([field('ä€'.encode('utf-8'))], [NULL], [field(b'abc')])
+
+
+def test_empty_chunk_is_header_and_trailer():
+    assert bytes(encode_binary_copy({'quantity': pd.Series([], dtype='int64')}, {'quantity': 'int4'})) == \
+        PGCOPY_HEADER + PGCOPY_TRAILER
+
+
+def test_pg_binary_type():
+    assert pg_binary_type('VARCHAR(100)') == 'text'
+    assert pg_binary_type('TIMESTAMP WITHOUT TIME ZONE') == 'timestamp'
+    assert pg_binary_type('TIMESTAMP WITH TIME ZONE') == 'timestamptz'
+    assert pg_binary_type('NUMERIC(10, 2)') is None
@@ -0,0 +1,114 @@
+import logging
+import pytest
+from sqlalchemy import text
+from conftest import TEST_SCHEMA
+from load.bulk_mode import enter_bulk_mode, hold_process_lock, restore_abandoned_bulk_objects, restore_bulk_objects
+
+STATE_TABLE = f'{TEST_SCHEMA}.bulk_state'
+
+
+@pytest.fixture
+def engine(pg_engine):
+    with pg_engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE {STATE_TABLE} (
+                id bigserial PRIMARY KEY, process_id int8 NOT NULL, table_name varchar(300) NOT NULL,
+                object_type varchar(20) NOT NULL, object_name varchar(300) NOT NULL, restore_sql text NOT NULL,
+                created_at timestamp NOT NULL DEFAULT now());
+            CREATE SEQUENCE {TEST_SCHEMA}.shared_seq CACHE 1;
+            CREATE TABLE {TEST_SCHEMA}.events (
+                id int8 NOT NULL DEFAULT nextval('{TEST_SCHEMA}.shared_seq'),
+                day date NOT NULL,
+                code text,
+                qty int CHECK (qty > 0),
+                PRIMARY KEY (id, day)
+            ) PARTITION BY RANGE (day);
+            CREATE TABLE {TEST_SCHEMA}.events_2025 PARTITION OF {TEST_SCHEMA}.events FOR VALUES FROM ('2025-01-01') TO ('2026-01-01');
+            CREATE INDEX events_code_idx ON {TEST_SCHEMA}.events (code);
+        """))
+    return pg_engine
+
+
+def state_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT process_id, object_type, object_name, restore_sql FROM {STATE_TABLE} ORDER BY id")).fetchall()
+
+
+def catalog(engine):
+    with engine.connect() as conn:
+        indexes = conn.execute(text(f"SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = '{TEST_SCHEMA}.events'::regclass ORDER BY 1")).scalars().all()
+        constraints = conn.execute(text(f"SELECT conname FROM pg_constraint WHERE conrelid = '{TEST_SCHEMA}.events'::regclass ORDER BY 1")).scalars().all()
+        cache = conn.execute(text(f"SELECT seqcache FROM pg_sequence WHERE seqrelid = '{TEST_SCHEMA}.shared_seq'::regclass")).scalar()
+    return indexes, constraints, cache
+
+
+def test_enter_bulk_mode_records_restore_statements(engine):
+    before = catalog(engine)
+
+    changed = enter_bulk_mode(engine, STATE_TABLE, TEST_SCHEMA, 'events',
+                              {'primary_key': True, 'sequence_cache': 500}, process_id=1)
+
+    rows = {row.object_name: row for row in state_rows(engine)}
+    assert changed == 4
+    assert set(rows) == {'events_code_idx', 'events_pkey', 'events_qty_check', f'{TEST_SCHEMA}.shared_seq'}
+    # A partitioned index is rebuilt on the partitions too, not 'ON ONLY' the parent
+    assert rows['events_code_idx'].restore_sql == f'CREATE INDEX events_code_idx ON {TEST_SCHEMA}.events USING btree (code)'
+    assert rows['events_pkey'].restore_sql.endswith('ADD CONSTRAINT "events_pkey" PRIMARY KEY (id, day)')
+    # The sequence is found through the column default although the table does not own it
+    assert rows[f'{TEST_SCHEMA}.shared_seq'].restore_sql == f'ALTER SEQUENCE {TEST_SCHEMA}.shared_seq CACHE 1'
+    assert catalog(engine) == ([], [], 500)
+
+    assert restore_bulk_objects(engine, STATE_TABLE) == 4
+    assert catalog(engine) == before
+    assert state_rows(engine) == []
+
+
+def test_restore_runs_sequences_then_indexes_then_constraints(engine, caplog):
+    enter_bulk_mode(engine, STATE_TABLE, TEST_SCHEMA, 'events', {'primary_key': True, 'sequence_cache': 500}, process_id=1)
+
+    with caplog.at_level(logging.INFO):
+        restore_bulk_objects(engine, STATE_TABLE)
+
+    restored = [record.getMessage().split()[1] for record in caplog.records if record.getMessage().startswith('Restored ')]
+    assert restored == ['sequence', 'index', 'constraint', 'constraint']
+
+
+def test_failed_restore_keeps_its_state_row(engine):
+    enter_bulk_mode(engine, STATE_TABLE, TEST_SCHEMA, 'events', {'primary_key': True}, process_id=1)
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {TEST_SCHEMA}.events (id, day, qty) VALUES (1, '2025-03-01', 1), (1, '2025-03-01', 2)"))
+
+    with pytest.raises(RuntimeError, match='events_pkey'):
+        restore_bulk_objects(engine, STATE_TABLE)
+
+    # The others are restored and forgotten; the primary key stays recorded for the next run
+    assert [row.object_name for row in state_rows(engine)] == ['events_pkey']
+    indexes, constraints, _ = catalog(engine)
+    assert indexes == [f'{TEST_SCHEMA}.events_code_idx'] and constraints == ['events_qty_check']
+
+
+def test_objects_of_a_running_process_are_not_restored(engine):
+    lock = hold_process_lock(engine, 2)
+    enter_bulk_mode(engine, STATE_TABLE, TEST_SCHEMA, 'events', {}, process_id=2)
+
+    assert restore_abandoned_bulk_objects(engine, STATE_TABLE, process_id=3) == 0
+    assert len(state_rows(engine)) == 2
+
+    # Once its session is gone the process is abandoned
+    lock.close()
+    assert restore_abandoned_bulk_objects(engine, STATE_TABLE, process_id=3) == 2
+    assert state_rows(engine) == []
+
+
+def test_unique_constraints_follow_primary_key_unless_set(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {TEST_SCHEMA}.events ADD CONSTRAINT events_code_key UNIQUE (code, day)"))
+
+    enter_bulk_mode(engine, STATE_TABLE, TEST_SCHEMA, 'events',
+                    {'primary_key': True, 'unique_constraints': False, 'check_constraints': False, 'indexes': False}, 1)
+    assert [row.object_name for row in state_rows(engine)] == ['events_pkey']
+    restore_bulk_objects(engine, STATE_TABLE)
+
+    enter_bulk_mode(engine, STATE_TABLE, TEST_SCHEMA, 'events',
+                    {'unique_constraints': True, 'check_constraints': False, 'indexes': False}, 1)
+    assert [row.object_name for row in state_rows(engine)] == ['events_code_key']
@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+from load.csv_split import read_csv_range, split_csv_ranges
+
+QUOTED_NEWLINES = b'id,note\n1,"first\nline"\n2,plain\n3,"say ""hi""\nthen\nbye"\n4,last\n'
+
+
+def read_all_ranges(path, range_bytes):
+    split = split_csv_ranges(path, range_bytes=range_bytes)
+    frames = [read_csv_range(path, start, end, split['columns']) for start, end in split['ranges']]
+    return split, pd.concat(frames, ignore_index=True)
+
+
+def write(tmp_path, data):
+    path = tmp_path / 'data.csv'
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize('data', [
+    QUOTED_NEWLINES,
+    QUOTED_NEWLINES.replace(b'\n', b'\r\n'),
+    QUOTED_NEWLINES.rstrip(b'\n'),
+], ids=['quoted_newlines', 'crlf', 'no_final_newline'])
+def test_ranges_parse_to_the_whole_file_for_any_range_size(tmp_path, data):
+    path = write(tmp_path, data)
+    expected = pd.read_csv(path)
+
+    # Every range size puts a boundary target on every byte, including inside quoted fields
+    for range_bytes in range(1, len(data)):
+        split, parsed = read_all_ranges(path, range_bytes)
+        pd.testing.assert_frame_equal(parsed, expected)
+        assert split['ranges'][0][0] == split['header_bytes']
+        assert split['ranges'][-1][1] == len(data)
+        assert all(end == start for (_, end), (start, _) in zip(split['ranges'], split['ranges'][1:]))
+
+
+def test_boundary_inside_quoted_field_moves_past_its_newline(tmp_path):
+    path = write(tmp_path, QUOTED_NEWLINES)
+    inside = QUOTED_NEWLINES.index(b'first\n') + 2
+
+    split = split_csv_ranges(path, range_bytes=inside - len(b'id,note\n'))
+
+    assert split['ranges'][0] == (len(b'id,note\n'), QUOTED_NEWLINES.index(b'2,plain'))
+
+
+def test_crlf_values_have_no_carriage_return(tmp_path):
+    path = write(tmp_path, b'id,name\r\n1,a\r\n2,b\r\n')
+
+    split, parsed = read_all_ranges(path, 4)
+
+    assert split['columns'] == ['id', 'name']
+    assert parsed['name'].tolist() == ['a', 'b']
+
+
+def test_header_only_and_empty_files(tmp_path):
+    assert split_csv_ranges(write(tmp_path, b'id,name\n'))['ranges'] == []
+    assert split_csv_ranges(write(tmp_path, b''))['ranges'] == []
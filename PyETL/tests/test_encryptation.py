@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from cryptography.fernet import Fernet
+from transform.transform import get_encryption_key
+from utils.encryptation import derive_hmac_key, encrypt_array, tokenize_value
+
+KEY = Fernet.generate_key()
+
+
+def test_hmac_token_does_not_depend_on_chunk_dtype():
+    int_chunk = pd.Series([1047, 3], dtype='int64')
+    float_chunk = pd.Series([1047, np.nan, 2.5], dtype='float64')
+    str_chunk = pd.Series(['1047', None], dtype='str')
+
+    tokens = [encrypt_array(chunk, KEY, mode='hmac_sha256')[0] for chunk in (int_chunk, float_chunk, str_chunk)]
+
+    assert tokens == [tokenize_value('1047', KEY)] * 3
+
+
+def test_hmac_keeps_nulls_and_non_integral_floats():
+    encrypted = encrypt_array(pd.Series([2.5, np.nan, 1e300]), KEY, mode='hmac_sha256')
+
+    assert encrypted[0] == tokenize_value('2.5', KEY)
+    assert pd.isna(encrypted[1])
+    assert encrypted[2] == tokenize_value('1e+300', KEY)
+
+
+def test_hmac_key_is_derived_from_the_fernet_key(tmp_path):
+    key_path = tmp_path / 'secret.key'
+    key_path.write_bytes(KEY)
+    config = {'enabled': True, 'key_path': str(key_path), 'mode': 'hmac_sha256'}
+
+    hmac_key = get_encryption_key(config)
+
+    assert hmac_key == derive_hmac_key(KEY)
+    assert hmac_key != KEY
+    assert get_encryption_key({**config, 'mode': 'fernet'}) == KEY
+
+
+def test_dedicated_hmac_key_path(tmp_path):
+    (tmp_path / 'secret.key').write_bytes(KEY)
+    (tmp_path / 'hmac.key').write_bytes(b'dedicated secret')
+    config = {'enabled': True, 'key_path': str(tmp_path / 'secret.key'), 'mode': 'hmac_sha256',
+              'hmac_key_path': str(tmp_path / 'hmac.key')}
+
+    assert get_encryption_key(config) == b'dedicated secret'
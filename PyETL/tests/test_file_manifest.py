@@ -0,0 +1,70 @@
+import hashlib
+import os
+import pytest
+from sqlalchemy import text
+from conftest import TEST_SCHEMA
+import utils.file_manifest as file_manifest
+from utils.file_manifest import detect_file_change, fingerprint_file, record_manifest_entries
+
+DATA = b''.join(f'{i},row {i}\n'.encode() for i in range(500))
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize('read_bytes', [7, 64, 1 << 20])
+def test_fingerprint_hashes_content_blocks_and_prefix(tmp_path, monkeypatch, read_bytes):
+    # Small read buffers make the reads cross the block and prefix boundaries
+    monkeypatch.setattr(file_manifest, 'HASH_READ_BYTES', read_bytes)
+    path = tmp_path / 'sales.csv'
+    path.write_bytes(DATA)
+
+    fingerprint = fingerprint_file(str(path), block_size=1000, prefix_size=2500)
+
+    assert fingerprint['file_size'] == len(DATA)
+    assert fingerprint['content_hash'] == sha256(DATA)
+    assert fingerprint['block_hashes'] == [sha256(DATA[i:i + 1000]) for i in range(0, len(DATA), 1000)]
+    assert fingerprint['prefix_hash'] == sha256(DATA[:2500])
+
+
+def test_prefix_beyond_the_file_has_no_hash(tmp_path):
+    path = tmp_path / 'sales.csv'
+    path.write_bytes(DATA)
+
+    assert fingerprint_file(str(path), prefix_size=len(DATA) + 1)['prefix_hash'] is None
+    assert fingerprint_file(str(path))['block_hashes'] is None
+
+
+def test_change_detection_against_the_manifest(pg_engine, tmp_path):
+    table = f'{TEST_SCHEMA}.manifest'
+    with pg_engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE {table} (
+                feed varchar(500) PRIMARY KEY, process_id int8 NOT NULL, file_path varchar(500) NOT NULL,
+                file_size int8 NOT NULL, file_mtime_ns int8 NOT NULL, content_hash varchar(64) NOT NULL,
+                block_size int8, block_hashes text[], change_type varchar(20) NOT NULL, loaded_from_byte int8,
+                updated_at timestamp NOT NULL DEFAULT now())
+        """))
+    config = {'load_process': {'schema': TEST_SCHEMA, 'manifest_table': 'manifest', 'manifest_block_size': 1000}}
+    path = tmp_path / 'sales.csv'
+    path.write_bytes(DATA)
+
+    def detect_and_record(process_id, append_only=True):
+        change = detect_file_change(pg_engine, config, 'data/sales.csv', str(path), append_only)
+        with pg_engine.begin() as conn:
+            record_manifest_entries(conn, table, process_id, [change])
+        return change['change_type'], change['loaded_from_byte']
+
+    assert detect_and_record(1) == ('new', 0)
+    assert detect_and_record(2) == ('unchanged', None)
+
+    # Same content, new mtime: hashed, still unchanged
+    os.utime(path, ns=(0, 0))
+    assert detect_and_record(3) == ('unchanged', None)
+
+    path.write_bytes(DATA + b'500,row 500\n')
+    assert detect_and_record(4) == ('appended', len(DATA))
+
+    path.write_bytes(b'0,rewritten\n' + DATA)
+    assert detect_and_record(5) == ('changed', 0)
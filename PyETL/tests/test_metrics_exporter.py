@@ -0,0 +1,47 @@
+import threading
+from utils.metrics_exporter import Counter, Gauge, Histogram, render_metrics, write_textfile
+
+# Metrics register themselves process-wide, so every test metric has a name of its own
+JOBS = Counter('test_jobs', 'Jobs done.')
+QUEUE = Gauge('test_queue_depth', 'Jobs waiting.')
+LATENCY = Histogram('test_latency_seconds', 'Job latency.', buckets=(0.1, 1.0))
+
+
+def test_counter_sums_increments_of_every_thread():
+    before = JOBS.value()
+    threads = [threading.Thread(target=lambda: [JOBS.inc() for _ in range(1000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert JOBS.value() - before == 4000
+
+
+def test_histogram_buckets_are_cumulative():
+    for value in (0.05, 0.1, 0.5, 3.0):
+        LATENCY.observe(value)
+
+    lines = LATENCY.render()
+
+    assert lines[2:] == [
+        'test_latency_seconds_bucket{le="0.1"} 2',
+        'test_latency_seconds_bucket{le="1.0"} 3',
+        'test_latency_seconds_bucket{le="+Inf"} 4',
+        'test_latency_seconds_sum 3.65',
+        'test_latency_seconds_count 4',
+    ]
+
+
+def test_textfile_has_the_exposition_format(tmp_path):
+    QUEUE.set(3)
+    path = tmp_path / 'metrics' / 'etl.prom'
+
+    write_textfile(str(path))
+
+    text = path.read_text(encoding='utf-8')
+    assert text == render_metrics()
+    assert '# HELP test_queue_depth Jobs waiting.\n# TYPE test_queue_depth gauge\ntest_queue_depth 3\n' in text
+    assert '# TYPE test_jobs_total counter\n' in text
+    assert '# TYPE etl_rows_loaded_total counter\n' in text
+    assert list(path.parent.iterdir()) == [path]
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+from utils.mock_data import generate_mock_dataset
+
+COLUMNS = {
+    'transaction_id': 'random_unique_int_1_9999999',
+    'quantity': 'random_int_1_10',
+    'timestamp': 'datetime_now_minus_random_minutes_0_100000',
+}
+
+
+def test_zero_rows_writes_header_only_csv(tmp_path):
+    path = str(tmp_path / 'sales.csv')
+
+    assert generate_mock_dataset(path, COLUMNS, 0, seed=1) == [path]
+
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == 'transaction_id,quantity,timestamp\n'
+
+
+def test_zero_rows_writes_empty_parquet(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'sales.parquet')
+
+    generate_mock_dataset(path, COLUMNS, 0, seed=1, file_format='parquet')
+
+    df = pd.read_parquet(path)
+    assert len(df) == 0
+    assert list(df.columns) == list(COLUMNS)
+
+
+def test_same_seed_gives_same_rows(tmp_path):
+    first = generate_mock_dataset(str(tmp_path / 'first.csv'), COLUMNS, 500, seed=7, block_size=200)
+    second = generate_mock_dataset(str(tmp_path / 'second.csv'), COLUMNS, 500, seed=7, block_size=200)
+
+    pd.testing.assert_frame_equal(pd.read_csv(first[0]).drop(columns='timestamp'),
+                                  pd.read_csv(second[0]).drop(columns='timestamp'))
+
+
+def test_shards_split_rows_with_unique_ids(tmp_path):
+    paths = generate_mock_dataset(str(tmp_path / 'sales.csv'), COLUMNS, 1000, seed=7, block_size=300, shards=3)
+
+    df = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+    assert [path.rsplit('/', 1)[1] for path in paths] == ['sales_part000.csv', 'sales_part001.csv', 'sales_part002.csv']
+    assert len(df) == 1000
+    assert df['transaction_id'].is_unique
+    assert df['quantity'].between(1, 10).all()
@@ -0,0 +1,84 @@
+from datetime import date, datetime
+import pytest
+from sqlalchemy import text
+from conftest import TEST_SCHEMA
+from load.partitions import _partition_bounds, ensure_partition, ensure_partitions_for_rows, finish_partition, \
+    is_missing_partition_error, partition_info
+
+LIST_INFO = {'strategy': 'list', 'column': 'process_id', 'type': 'integer', 'default': None}
+MONTH_INFO = {'strategy': 'range', 'column': 'timestamp', 'type': 'timestamp without time zone', 'default': None}
+
+
+def test_process_partition_names():
+    assert _partition_bounds(LIST_INFO, 'sales_tmp', 42) == ('sales_tmp_pid42', 'IN (42)')
+    assert _partition_bounds(LIST_INFO, 'sales_tmp', -1) == ('sales_tmp_pid_neg1', 'IN (-1)')
+    assert _partition_bounds({**LIST_INFO, 'strategy': 'range'}, 'sales_tmp', 7) == ('sales_tmp_pid7', 'FROM (7) TO (8)')
+
+
+def test_month_partition_names():
+    assert _partition_bounds(MONTH_INFO, 'sales', datetime(2025, 1, 31, 23, 59)) == \
+        ('sales_202501', "FROM ('2025-01-01') TO ('2025-02-01')")
+    assert _partition_bounds(MONTH_INFO, 'sales', date(2024, 12, 5)) == \
+        ('sales_202412', "FROM ('2024-12-01') TO ('2025-01-01')")
+    with pytest.raises(ValueError):
+        _partition_bounds({**MONTH_INFO, 'strategy': 'list'}, 'sales', date(2025, 1, 1))
+
+
+def test_missing_partition_error():
+    assert is_missing_partition_error('no partition of relation "sales" found for row')
+    assert not is_missing_partition_error('new row for relation "sales" violates check constraint')
+    assert not is_missing_partition_error(None)
+
+
+@pytest.fixture
+def engine(pg_engine):
+    with pg_engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE {TEST_SCHEMA}.staging (id int4, "timestamp" timestamp, process_id int4 NOT NULL)
+                PARTITION BY LIST (process_id);
+            CREATE TABLE {TEST_SCHEMA}.staging_default PARTITION OF {TEST_SCHEMA}.staging DEFAULT;
+            CREATE TABLE {TEST_SCHEMA}.target (id int4, "timestamp" timestamp NOT NULL, process_id int4)
+                PARTITION BY RANGE ("timestamp");
+        """))
+    return pg_engine
+
+
+def partitions(engine, table):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = CAST(:table AS regclass) ORDER BY 1"),
+                            {"table": f'{TEST_SCHEMA}.{table}'}).scalars().all()
+
+
+def test_process_and_month_partitions_are_created_and_finished(engine):
+    assert partition_info(engine, TEST_SCHEMA, 'staging')['default'] == f'{TEST_SCHEMA}.staging_default'
+    assert ensure_partition(engine, TEST_SCHEMA, 'staging', 3) == 'staging_pid3'
+    assert ensure_partition(engine, TEST_SCHEMA, 'staging', 3) == 'staging_pid3'
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            INSERT INTO {TEST_SCHEMA}.staging VALUES
+                (1, '2025-01-05', 3), (2, '2025-03-01', 3), (3, NULL, 3), (4, '2024-06-01', 4)
+        """))
+
+    assert ensure_partitions_for_rows(engine, TEST_SCHEMA, 'target', TEST_SCHEMA, 'staging', 3) == ['target_202501', 'target_202503']
+    assert partitions(engine, 'target') == [f'{TEST_SCHEMA}.target_202501', f'{TEST_SCHEMA}.target_202503']
+
+    # Rows of process 4 went to the DEFAULT partition; finishing a process removes them too
+    finish_partition(engine, TEST_SCHEMA, 'staging', 3, 'detach')
+    finish_partition(engine, TEST_SCHEMA, 'staging', 4, 'drop')
+
+    assert partitions(engine, 'staging') == [f'{TEST_SCHEMA}.staging_default']
+    with engine.connect() as conn:
+        assert conn.execute(text(f"SELECT count(*) FROM {TEST_SCHEMA}.staging")).scalar() == 0
+        assert conn.execute(text(f"SELECT count(*) FROM {TEST_SCHEMA}.staging_pid3")).scalar() == 3
+
+
+def test_keep_leaves_the_partition_and_unpartitioned_tables_are_ignored(engine):
+    ensure_partition(engine, TEST_SCHEMA, 'staging', 5)
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE {TEST_SCHEMA}.plain (id int4, process_id int4)"))
+
+    finish_partition(engine, TEST_SCHEMA, 'staging', 5, 'keep')
+
+    assert f'{TEST_SCHEMA}.staging_pid5' in partitions(engine, 'staging')
+    assert ensure_partition(engine, TEST_SCHEMA, 'plain', 5) is None
+    assert ensure_partitions_for_rows(engine, TEST_SCHEMA, 'plain', TEST_SCHEMA, 'staging', 5) == []
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+from load.csv_split import read_csv_range, split_csv_ranges
+from load.readers import iter_csv_chunks
+
+READ_OPTIONS = {
+    'usecols': ['id', 'note', 'quantity'],
+    'dtype': {'id': 'Int64', 'note': str, 'quantity': 'Int64'},
+    'parse_dates': [],
+}
+
+
+@pytest.fixture
+def malformed_csv(tmp_path):
+    path = tmp_path / 'sales.csv'
+    rows = ''.join(f'{i},"line\nbreak {i}",{ {5: "abc", 7: "1.5"}.get(i, i) }\n' for i in range(10))
+    path.write_text('id,note,quantity\n' + rows)
+    return str(path)
+
+
+@pytest.mark.parametrize('parse_engine', ['c', 'pyarrow'])
+def test_malformed_numbers_become_null_instead_of_failing_the_file(malformed_csv, parse_engine):
+    if parse_engine == 'pyarrow':
+        pytest.importorskip('pyarrow')
+
+    df = pd.concat(iter_csv_chunks(malformed_csv, 3, READ_OPTIONS, parse_engine=parse_engine), ignore_index=True)
+
+    assert df['id'].tolist() == list(range(10))
+    assert df['quantity'].tolist() == [0, 1, 2, 3, 4, pd.NA, 6, pd.NA, 8, 9]
+    assert df['quantity'].dtype == 'Int64'
+    assert df['note'].iloc[9] == 'line\nbreak 9'
+
+
+def test_malformed_numbers_in_a_byte_range_become_null(malformed_csv):
+    split = split_csv_ranges(malformed_csv, rows_per_range=3)
+
+    df = pd.concat([read_csv_range(malformed_csv, *byte_range, split['columns'], READ_OPTIONS)
+                    for byte_range in split['ranges']], ignore_index=True)
+
+    assert df['id'].tolist() == list(range(10))
+    assert df['quantity'].tolist() == [0, 1, 2, 3, 4, pd.NA, 6, pd.NA, 8, 9]
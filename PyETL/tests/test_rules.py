@@ -0,0 +1,61 @@
+import pandas as pd
+from transform.rules import compile_table_rules, evaluate_rules
+
+
+def timestamp_violations(config, values):
+    plan = compile_table_rules(config, 'sales_tmp')
+    masks, _ = evaluate_rules(pd.DataFrame({'timestamp': values}), plan)
+    return masks['timestamp_range'].tolist()
+
+
+def test_timestamp_max_defaults_to_now_at_compile_time():
+    past = (pd.Timestamp.now(tz='UTC') - pd.Timedelta(minutes=1)).isoformat()
+    future = (pd.Timestamp.now(tz='UTC') + pd.Timedelta(days=1)).isoformat()
+
+    assert timestamp_violations({}, [past, future, None]) == [False, True, True]
+
+
+def test_now_bounds_from_filters():
+    now = pd.Timestamp.now(tz='UTC')
+    config = {'tables': {'sales_tmp': {'filters': {'timestamp': {'min': 'now', 'max': '2100-01-01'}}}}}
+
+    plan = compile_table_rules(config, 'sales_tmp')
+    rule = plan['columns']['timestamp']['rules'][0]
+
+    assert plan['columns']['timestamp']['datetime']
+    assert abs(pd.Timestamp(rule['min']) - now.tz_localize(None)) < pd.Timedelta(minutes=1)
+    assert timestamp_violations(config, [(now - pd.Timedelta(days=1)).isoformat(),
+                                         (now + pd.Timedelta(days=1)).isoformat()]) == [True, False]
+
+
+def test_bounds_and_values_are_compared_in_utc():
+    config = {'validation': {'max_timestamp': '2020-01-01T00:00:00Z'}}
+
+    # 01:00+02:00 is 23:00 UTC the day before; 01:00 UTC is past the bound
+    assert timestamp_violations(config, ['2020-01-01T01:00:00+02:00', '2020-01-01T01:00:00Z']) == [False, True]
+
+
+def test_numeric_bounds_are_not_timestamps():
+    config = {'tables': {'sales_tmp': {'filters': {'quantity': {'min': 1, 'max': '10'}}}}}
+
+    plan = compile_table_rules(config, 'sales_tmp')
+    masks, _ = evaluate_rules(pd.DataFrame({'quantity': [0, 5, 11, None], 'timestamp': ['2020-01-01'] * 4}), plan)
+
+    assert not plan['columns']['quantity']['datetime']
+    assert masks['quantity_range'].tolist() == [True, False, True, True]
+
+
+def test_exponent_and_negative_bounds_are_numbers():
+    config = {'tables': {'sales_tmp': {'filters': {'quantity': {'min': '-2.5', 'max': '1e3'}}}}}
+
+    plan = compile_table_rules(config, 'sales_tmp')
+    masks, _ = evaluate_rules(pd.DataFrame({'quantity': [-3, 0, 1000, 1001], 'timestamp': ['2020-01-01'] * 4}), plan)
+
+    assert not plan['columns']['quantity']['datetime']
+    assert masks['quantity_range'].tolist() == [True, False, False, True]
+
+
+def test_far_future_bound_does_not_overflow():
+    config = {'tables': {'sales_tmp': {'filters': {'timestamp': {'max': '9999-12-31'}}}}}
+
+    assert timestamp_violations(config, ['2020-01-01', '2262-05-01']) == [False, False]
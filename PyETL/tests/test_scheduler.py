@@ -0,0 +1,105 @@
+import threading
+import time
+import pytest
+from utils.scheduler import add_task, connection_budget, run_task_graph
+
+
+def recorder(log, name, seconds=0.0, result=None):
+    def run():
+        log.append(('start', name))
+        time.sleep(seconds)
+        log.append(('end', name))
+        return result
+    return run
+
+
+def test_tasks_start_after_their_dependencies():
+    log = []
+    tasks = {}
+    add_task(tasks, 'encrypt:a', recorder(log, 'encrypt:a', 0.05))
+    add_task(tasks, 'encrypt:b', recorder(log, 'encrypt:b'))
+    add_task(tasks, 'load:a', recorder(log, 'load:a', result=3), deps=['encrypt:a'])
+    add_task(tasks, 'merge', recorder(log, 'merge'), deps=['load:a', 'encrypt:b'])
+
+    results = run_task_graph(tasks, max_workers=4)
+
+    assert results['load:a'] == 3
+    assert log.index(('end', 'encrypt:a')) < log.index(('start', 'load:a'))
+    assert log.index(('end', 'load:a')) < log.index(('start', 'merge'))
+    assert log.index(('end', 'encrypt:b')) < log.index(('start', 'merge'))
+
+
+def test_one_worker_runs_tasks_in_the_order_they_were_added():
+    log = []
+    tasks = {}
+    for name in ('c', 'a', 'b'):
+        add_task(tasks, name, recorder(log, name))
+
+    run_task_graph(tasks, max_workers=1)
+
+    assert [name for event, name in log if event == 'start'] == ['c', 'a', 'b']
+
+
+def test_running_tasks_stay_within_the_connection_budget():
+    lock = threading.Lock()
+    state = {'connections': 0, 'peak': 0, 'alongside_big': None}
+
+    def uses(connections):
+        def run():
+            with lock:
+                if connections > 4:
+                    state['alongside_big'] = state['connections']
+                else:
+                    state['peak'] = max(state['peak'], state['connections'] + connections)
+                state['connections'] += connections
+            time.sleep(0.02)
+            with lock:
+                state['connections'] -= connections
+        return run
+
+    tasks = {}
+    for i in range(6):
+        add_task(tasks, f'load:{i}', uses(2), connections=2)
+    # Needs more than the whole budget: runs alone instead of never
+    add_task(tasks, 'load:big', uses(5), connections=5)
+
+    run_task_graph(tasks, max_workers=6, max_connections=4)
+
+    assert state['peak'] == 4
+    assert state['alongside_big'] == 0
+
+
+def test_failure_skips_tasks_not_started_and_keeps_finished_results():
+    def fail():
+        raise RuntimeError('boom')
+
+    tasks = {}
+    add_task(tasks, 'ok', lambda: 1)
+    add_task(tasks, 'bad', fail, deps=['ok'])
+    add_task(tasks, 'after', lambda: 2, deps=['bad'])
+    results = {}
+
+    with pytest.raises(RuntimeError, match='boom'):
+        run_task_graph(tasks, max_workers=2, results=results)
+
+    assert results == {'ok': 1}
+
+
+def test_invalid_graphs_are_rejected():
+    tasks = {}
+    add_task(tasks, 'a', lambda: None, deps=['b'])
+    add_task(tasks, 'b', lambda: None, deps=['a'])
+    with pytest.raises(ValueError, match='cycle'):
+        run_task_graph(tasks)
+
+    with pytest.raises(ValueError, match='Duplicate'):
+        add_task(tasks, 'a', lambda: None)
+
+    with pytest.raises(ValueError, match='unknown'):
+        run_task_graph({'a': {'func': lambda: None, 'deps': ['missing'], 'connections': 0}})
+
+
+def test_connection_budget():
+    assert connection_budget({'scheduler': {'max_parallel_tasks': 3}}, copy_workers=4) == 12
+    assert connection_budget({'scheduler': {'max_connections': 5, 'max_parallel_tasks': 3}}, copy_workers=4) == 5
+    assert connection_budget({}, copy_workers=0) == 1
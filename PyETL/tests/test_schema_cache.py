@@ -0,0 +1,48 @@
+import pandas as pd
+from sqlalchemy import create_engine, text, types
+from utils.schema_cache import CASTS, _cast_kind, get_cast_plan, get_table_metadata, invalidate_table_metadata, is_aligned
+
+
+def test_cast_kinds():
+    assert _cast_kind(types.BigInteger()) == 'int'
+    assert _cast_kind(types.Numeric(10, 2)) == 'float'
+    assert _cast_kind(types.DateTime()) == 'datetime'
+    assert _cast_kind(types.Date()) == 'datetime'
+    assert _cast_kind(types.Boolean()) == 'bool'
+    assert _cast_kind(types.String(100)) == 'str'
+
+
+def test_metadata_is_reflected_once_until_invalidated():
+    # Reflection works the same on an in-memory SQLite database, which needs no server
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE sales (id INTEGER, quantity INTEGER, sold_at TIMESTAMP)"))
+
+    metadata = get_table_metadata(engine, None, 'sales')
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE sales ADD COLUMN customer_id VARCHAR(100)"))
+
+    assert get_table_metadata(engine, None, 'sales') is metadata
+    assert metadata['columns'] == ['id', 'quantity', 'sold_at']
+
+    invalidate_table_metadata(engine, None, 'sales')
+
+    assert get_cast_plan(engine, None, 'sales') == {'id': 'int', 'quantity': 'int', 'sold_at': 'datetime', 'customer_id': 'str'}
+    assert get_table_metadata(engine, None, 'sales')['type_strings']['customer_id'] == 'VARCHAR(100)'
+    invalidate_table_metadata(engine, None, 'sales')
+
+
+def test_casts_produce_aligned_columns():
+    columns = {
+        'int': pd.Series(['1', 'x', None]),
+        'float': pd.Series(['1.5', 'x']),
+        'datetime': pd.Series(['2025-01-01', 'x']),
+        'bool': pd.Series([1, 0]),
+    }
+
+    for kind, series in columns.items():
+        assert not is_aligned(series, kind)
+        assert is_aligned(CASTS[kind](series), kind)
+
+    assert CASTS['int'](columns['int']).isna().tolist() == [False, True, True]
+    assert is_aligned(pd.Series(['a'], dtype='string'), 'str')
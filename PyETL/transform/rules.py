@@ -0,0 +1,242 @@
+import operator
+import re
+import time
+from datetime import date
+import numpy as np
+import pandas as pd
+
+# Comparison operators for cross-column checks under tables.<table>.checks
+CHECK_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>=': operator.ge,
+    '>': operator.gt,
+}
+
+
+def _is_datetime_bound(value):
+    """
+    Tell whether a range bound is a timestamp ("now" or a date string) rather than a number.
+    """
+    if isinstance(value, date):
+        return True
+    if not isinstance(value, str):
+        return False
+    # Anything float() accepts ("10", "-2.5", "1e3") is a number
+    try:
+        float(value)
+    except ValueError:
+        return True
+    return False
+
+
+def _resolve_bound(value):
+    """
+    Turn a configured range bound into the scalar it is compared with: a float, or a naive UTC datetime64
+    for timestamps ("now" is resolved when the rules are compiled).
+    """
+    if value is None:
+        return None
+    if _is_datetime_bound(value):
+        timestamp = pd.Timestamp.now(tz='UTC') if value == 'now' else pd.to_datetime(value, utc=True)
+        return timestamp.tz_localize(None).to_datetime64()
+    return float(value)
+
+
+def compile_table_rules(config, table):
+    """
+    Compile the validation rules of a table from the 'tables' config section into a rule plan.
+
+    Supported declarations under tables.<table>:
+        required_columns: [col, ...]             -> '<col>_not_null'
+        filters:
+          <col>:
+            min / max: number, timestamp or "now" -> '<col>_range' (nulls fail)
+            not_null: true                        -> '<col>_not_null'
+            regex: "^pattern$"                    -> '<col>_regex' (full match, nulls fail)
+            allowed: [value, ...]                 -> '<col>_allowed' (nulls fail)
+        checks:
+          - {name: ..., left: col, op: "<=", right: col}  -> cross-column check (rows with nulls fail)
+
+    If a table declares no 'timestamp' max, validation.max_timestamp is used for the 'timestamp' column as before.
+    The plan only holds plain data so it can be sent to worker processes.
+
+    Parameters:
+        config (dict): Configuration dictionary.
+        table (str): Table whose rules are compiled.
+
+    Returns:
+        dict: Rule plan with:
+            - 'columns' (dict): Column name to {'datetime': bool, 'rules': list of rule dicts}.
+            - 'checks' (list): Cross-column rule dicts.
+
+    Raises:
+        ValueError: If a rule is malformed (unknown operator, empty allowed set, invalid regex).
+    """
+    table_config = config.get('tables', {}).get(table, {})
+    filters = dict(table_config.get('filters') or {})
+    columns = {}
+
+    def add_rule(column, rule):
+        plan = columns.setdefault(column, {'datetime': False, 'rules': []})
+        if rule['name'] not in {existing['name'] for existing in plan['rules']}:
+            plan['rules'].append(rule)
+
+    # Fall back to the global max timestamp when the table does not declare one
+    max_ts = config.get('validation', {}).get('max_timestamp')
+    if 'max' not in (filters.get('timestamp') or {}):
+        filters['timestamp'] = {**(filters.get('timestamp') or {}), 'max': max_ts or 'now'}
+
+    for column in table_config.get('required_columns', []):
+        add_rule(column, {'name': f"{column}_not_null", 'kind': 'not_null'})
+
+    for column, spec in filters.items():
+        spec = spec or {}
+        if spec.get('not_null'):
+            add_rule(column, {'name': f"{column}_not_null", 'kind': 'not_null'})
+        if spec.get('min') is not None or spec.get('max') is not None:
+            is_datetime = any(_is_datetime_bound(spec.get(bound)) for bound in ('min', 'max'))
+            add_rule(column, {'name': f"{column}_range", 'kind': 'range',
+                              'min': _resolve_bound(spec.get('min')), 'max': _resolve_bound(spec.get('max'))})
+            if is_datetime:
+                columns[column]['datetime'] = True
+        if spec.get('regex') is not None:
+            try:
+                re.compile(spec['regex'])
+            except re.error as e:
+                raise ValueError(f"Invalid regex for tables.{table}.filters.{column}: {e}") from e
+            add_rule(column, {'name': f"{column}_regex", 'kind': 'regex', 'pattern': spec['regex']})
+        if spec.get('allowed') is not None:
+            if not spec['allowed']:
+                raise ValueError(f"tables.{table}.filters.{column}.allowed must not be empty")
+            add_rule(column, {'name': f"{column}_allowed", 'kind': 'allowed', 'values': list(spec['allowed'])})
+
+    checks = []
+    for i, check in enumerate(table_config.get('checks') or []):
+        if check.get('op') not in CHECK_OPERATORS:
+            raise ValueError(f"Unsupported operator '{check.get('op')}' in tables.{table}.checks[{i}]. "
+                             f"Expected one of {list(CHECK_OPERATORS)}")
+        checks.append({'name': check.get('name', f"{check['left']}_{check['right']}_check"), 'kind': 'check',
+                       'left': check['left'], 'op': check['op'], 'right': check['right']})
+
+    return {'columns': columns, 'checks': checks}
+
+
+def _column_values(series, is_datetime):
+    """
+    Convert a column once into the NumPy array its comparison rules run on.
+
+    Returns:
+        tuple: (converted series or None, comparable NumPy array, null mask)
+    """
+    if is_datetime:
+        converted = pd.to_datetime(series, utc=True, errors='coerce')
+        # Microseconds, as the bounds: nanoseconds overflow on bounds past 2262 (e.g. '9999-12-31')
+        values = converted.dt.tz_localize(None).to_numpy(dtype='datetime64[us]')
+        return converted, values, np.isnat(values)
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    return None, values, np.isnan(values)
+
+
+def _evaluate_rule(rule, series, values, null_mask):
+    """
+    Return the violation mask of a single column rule.
+    """
+    kind = rule['kind']
+    if kind == 'not_null':
+        return series.isna().to_numpy(dtype=bool)
+    if kind == 'range':
+        violations = null_mask.copy()
+        with np.errstate(invalid='ignore'):
+            if rule['min'] is not None:
+                violations |= values < rule['min']
+            if rule['max'] is not None:
+                violations |= values > rule['max']
+        return violations
+    if kind == 'regex':
+        matches = series.astype('string').str.fullmatch(rule['pattern'])
+        return ~matches.fillna(False).to_numpy(dtype=bool)
+    return ~series.isin(rule['values']).to_numpy(dtype=bool)
+
+
+def evaluate_rules(chunk, plan):
+    """
+    Evaluate a compiled rule plan against a chunk.
+
+    Rules are fused per column: each column is read and converted once (to float64 or naive UTC datetime64)
+    and every rule on it runs on that array. Columns with timestamp rules are written back to the chunk as
+    UTC datetimes. Rules on columns the chunk does not have are skipped.
+
+    Parameters:
+        chunk (pandas.DataFrame): Chunk to validate; timestamp-ruled columns are converted in place.
+        plan (dict): Rule plan from compile_table_rules.
+
+    Returns:
+        tuple: (dict of rule name to violation mask, stats) where stats maps each evaluated rule name to
+               {'hits': rows violating it, 'seconds': evaluation time} and the time spent converting a
+               column for comparisons is reported under '<column>_scan'.
+    """
+    masks = {}
+    stats = {}
+    converted = {}
+
+    for column, column_plan in plan['columns'].items():
+        if column not in chunk.columns:
+            continue
+        series = chunk[column]
+
+        values, null_mask = None, None
+        if column_plan['datetime'] or any(rule['kind'] == 'range' for rule in column_plan['rules']):
+            start = time.perf_counter()
+            converted_series, values, null_mask = _column_values(series, column_plan['datetime'])
+            if converted_series is not None:
+                chunk[column] = series = converted_series
+            converted[column] = values
+            stats[f"{column}_scan"] = {'hits': 0, 'seconds': time.perf_counter() - start}
+
+        for rule in column_plan['rules']:
+            start = time.perf_counter()
+            masks[rule['name']] = _evaluate_rule(rule, series, values, null_mask)
+            stats[rule['name']] = {'hits': int(masks[rule['name']].sum()), 'seconds': time.perf_counter() - start}
+
+    for check in plan['checks']:
+        if check['left'] not in chunk.columns or check['right'] not in chunk.columns:
+            continue
+        start = time.perf_counter()
+        left, right = (pd.Series(converted[col], index=chunk.index) if col in converted else chunk[col]
+                       for col in (check['left'], check['right']))
+        comparable = (left.notna() & right.notna()).to_numpy(dtype=bool)
+        violations = np.ones(len(chunk), dtype=bool)
+        violations[comparable] = ~np.asarray(CHECK_OPERATORS[check['op']](left[comparable], right[comparable]), dtype=bool)
+        masks[check['name']] = violations
+        stats[check['name']] = {'hits': int(masks[check['name']].sum()), 'seconds': time.perf_counter() - start}
+
+    return masks, stats
+
+
+def merge_rule_stats(total, stats):
+    """
+    Accumulate the stats of one chunk (from evaluate_rules) into running totals, in place.
+
+    Parameters:
+        total (dict): Running totals, updated in place.
+        stats (dict): Stats of one chunk.
+
+    Returns:
+        dict: The updated totals.
+    """
+    for name, rule_stats in stats.items():
+        entry = total.setdefault(name, {'hits': 0, 'seconds': 0.0})
+        entry['hits'] += rule_stats['hits']
+        entry['seconds'] += rule_stats['seconds']
+    return total
+
+
+def format_rule_stats(stats):
+    """
+    Render rule stats as one 'name: hits, milliseconds' item per rule, slowest first, for logging.
+    """
+    ordered = sorted(stats.items(), key=lambda item: item[1]['seconds'], reverse=True)
+    return '; '.join(f"{name}: {entry['hits']} hits, {entry['seconds'] * 1000:.1f}ms" for name, entry in ordered)
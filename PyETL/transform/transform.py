@@ -1,46 +1,117 @@
 import pandas as pd
-from utils.encryptation import load_key, encrypt_value
-from cryptography.fernet import Fernet
+from utils.encryptation import load_key, derive_hmac_key, encrypt_array
+from utils.metrics_exporter import ENCRYPTED_CELLS, ENCRYPTION_SECONDS
+from utils.file_formats import read_frame, ChunkFileWriter
 import logging
+import time
 
-def data_encryptation(file_path, output_path, encryption_config):
+def get_encryption_key(encryption_config):
+    """
+    Load the encryption key described by the encryption configuration.
+
+    In 'hmac_sha256' mode this is the HMAC key: the contents of 'hmac_key_path' when set, otherwise a key
+    derived from the Fernet key with HKDF (see derive_hmac_key), so the Fernet key is never the HMAC secret.
+
+    Parameters:
+        encryption_config (dict): Encryption configuration with 'enabled', 'key_path' and optionally
+                                  'mode' and 'hmac_key_path'.
+
+    Returns:
+        bytes or None: The key, or None if encryption is disabled.
+    """
+    if not encryption_config.get("enabled", False):
+        return None
+    if encryption_config.get("mode", "fernet") == "hmac_sha256":
+        if encryption_config.get("hmac_key_path"):
+            return load_key(encryption_config["hmac_key_path"])
+        return derive_hmac_key(load_key(encryption_config["key_path"]))
+    # Load the encryption key from file
+    return load_key(encryption_config["key_path"])
+
+
+def encrypt_dataframe(df, encryption_config, key, stats=None):
+    """
+    Encrypt the configured columns of a DataFrame in place, one whole column at a time.
+
+    Parameters:
+        df (pandas.DataFrame): Data to encrypt (e.g. a single chunk of a larger file).
+        encryption_config (dict): Encryption configuration with:
+            - 'columns_to_encrypt' (list of str): Columns to encrypt; columns missing from df are ignored.
+            - 'deterministic' (bool, optional): Reuse one token per distinct plaintext within a batch.
+            - 'workers' (int, optional): Processes used to encrypt large batches.
+            - 'parallel_min_cells' (int, optional): Minimum batch size before the process pool is used.
+            - 'mode' (str, optional): 'fernet' (default) or 'hmac_sha256' for stable, one-way tokens.
+            - 'token_cache_size' (int, optional): LRU token cache size in 'hmac_sha256' mode.
+        key (bytes): Encryption key from get_encryption_key.
+        stats (dict, optional): If given, the encrypted cells and seconds are added to its 'cells' and 'seconds'
+                                entries instead of the live metrics, for the caller to record them (e.g. in the
+                                parent of a worker process, whose metrics would otherwise be lost).
+
+    Returns:
+        pandas.DataFrame: The same DataFrame with the columns encrypted.
+    """
+    deterministic = encryption_config.get("deterministic", False)
+    workers = encryption_config.get("workers", 1)
+    parallel_min_cells = encryption_config.get("parallel_min_cells", 50000)
+    mode = encryption_config.get("mode", "fernet")
+    token_cache_size = encryption_config.get("token_cache_size", 4096)
+
+    # Encrypt specified columns if they exist in the DataFrame
+    for col in encryption_config.get("columns_to_encrypt", []):
+        if col in df.columns:
+            start = time.perf_counter()
+            df[col] = encrypt_array(df[col], key, deterministic=deterministic, workers=workers,
+                                    parallel_min_cells=parallel_min_cells, mode=mode,
+                                    token_cache_size=token_cache_size)
+            elapsed = time.perf_counter() - start
+            if stats is None:
+                ENCRYPTED_CELLS.inc(len(df))
+                ENCRYPTION_SECONDS.inc(elapsed)
+            else:
+                stats["cells"] = stats.get("cells", 0) + len(df)
+                stats["seconds"] = stats.get("seconds", 0.0) + elapsed
+            rate = len(df) / elapsed if elapsed > 0 else float('inf')
+            logging.info(f"Encrypted {len(df)} cells of column '{col}' in {elapsed:.3f}s ({rate:,.0f} cells/s)")
+    return df
+
+
+def data_encryptation(file_path, output_path, encryption_config, source_format=None):
     """
     Load a CSV file, encrypt specified columns, and write the result to a new CSV file.
 
+    Parquet and Arrow IPC inputs are read as well, and the output is written as Parquet when output_path
+    ends in '.parquet' (see encryption.intermediate_format).
+
     Parameters:
-        file_path (str): Path to the input CSV file.
-        output_path (str): Path where the encrypted CSV will be saved.
+        file_path (str): Path to the input CSV, Parquet or Arrow IPC file.
+        output_path (str): Path where the encrypted CSV (or Parquet) file will be saved.
         encryption_config (dict): Configuration dictionary with:
             - 'enabled' (bool): Whether encryption is enabled.
             - 'key_path' (str): File path to the encryption key.
             - 'columns_to_encrypt' (list of str): List of column names to encrypt.
+        source_format (str, optional): Format of the input file; resolved from its extension if not given.
 
     Behavior:
         - Reads the CSV into a DataFrame.
         - If encryption is disabled in config, logs info and skips encryption.
-        - Encrypts specified columns using Fernet.
+        - Encrypts specified columns using Fernet, a whole column at a time.
         - Saves encrypted DataFrame to output CSV without index.
         - Logs a message upon successful writing.
     """
     #logging.info(f"file path'{file_path}'")
-    df = pd.read_csv(file_path)
+    df = read_frame(file_path, source_format)
 
-    if not encryption_config.get("enabled", False):
+    key = get_encryption_key(encryption_config)
+    if key is None:
         logging.info("Encryption is disabled in config.")
         return
 
-    key_path = encryption_config["key_path"]
-    columns = encryption_config["columns_to_encrypt"]
-
-    # Load the encryption key from file
-    key = load_key(key_path)
-    fernet = Fernet(key)
-
-    # Encrypt specified columns if they exist in the DataFrame
-    for col in columns:
-        if col in df.columns:
-            df[col] = df[col].apply(lambda x: encrypt_value(x, fernet))
+    df = encrypt_dataframe(df, encryption_config, key)
 
-    # Write the encrypted DataFrame to CSV
-    df.to_csv(output_path, index=False)
-    logging.info(f"Encrypted CSV written to '{output_path}'")
+    # Write the encrypted DataFrame to CSV or Parquet
+    writer = ChunkFileWriter(output_path)
+    try:
+        writer.write(df)
+    finally:
+        writer.close()
+    logging.info(f"Encrypted {writer.format} written to '{output_path}'")
@@ -1,6 +1,29 @@
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from functools import lru_cache
+import hashlib
+import hmac
+import threading
+import time
+import numpy as np
 import pandas as pd
 import logging
+from utils.scheduler import process_pool
+
+# Process pool shared by all encrypt_array calls, created on first parallel use
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# Encryption modes: randomized Fernet encryption or deterministic HMAC-SHA256 tokenization
+ENCRYPTION_MODES = ('fernet', 'hmac_sha256')
+
+# LRU-cached tokenizers keyed by (key, cache size), one set per process
+_tokenizers = {}
+
+# HKDF label of the HMAC key derived from the Fernet key; changing it changes every token
+HMAC_KEY_INFO = b'etl_assesment hmac_sha256 tokenization key'
 
 
 def load_key(key_path):
@@ -30,6 +53,22 @@ def load_key(key_path):
         raise
 
 
+def derive_hmac_key(key):
+    """
+    Derive the HMAC-SHA256 tokenization key from the Fernet key with HKDF-SHA256.
+
+    Using the Fernet key itself as the HMAC secret would tie two algorithms to the same secret; the
+    derived key is independent of it for every practical purpose, yet needs no second key file.
+
+    Parameters:
+        key (bytes): Fernet key, as returned by load_key.
+
+    Returns:
+        bytes: 32-byte HMAC key.
+    """
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=HMAC_KEY_INFO).derive(key)
+
+
 def encrypt_value(value, fernet):
     """
     Encrypt a single value using Fernet symmetric encryption.
@@ -50,6 +89,136 @@ def encrypt_value(value, fernet):
     return fernet.encrypt(str(value).encode()).decode()
 
 
+def tokenize_value(value, key):
+    """
+    Tokenize a single value with HMAC-SHA256.
+
+    Unlike Fernet encryption the token is deterministic: the same value and key always produce the
+    same token, so tokenized columns can be compared, deduplicated and indexed. Tokens cannot be decrypted.
+
+    Parameters:
+        value (any): The value to tokenize; it is converted to a string first.
+        key (bytes): Secret key used for the HMAC.
+
+    Returns:
+        str: The token as a 64-character hex digest.
+    """
+    return hmac.new(key, str(value).encode(), hashlib.sha256).hexdigest()
+
+
+def _get_tokenizer(key, cache_size):
+    """
+    Return an LRU-cached tokenizer for the key, so values repeating across batches are hashed only once.
+    """
+    tokenizer = _tokenizers.get((key, cache_size))
+    if tokenizer is None:
+        tokenizer = lru_cache(maxsize=cache_size)(lambda value: tokenize_value(value, key))
+        _tokenizers[(key, cache_size)] = tokenizer
+    return tokenizer
+
+
+def _encrypt_batch(key, values, mode='fernet', token_cache_size=4096):
+    """
+    Encrypt or tokenize a list of plaintext strings (process pool worker entry point).
+    """
+    if mode == 'hmac_sha256':
+        tokenizer = _get_tokenizer(key, token_cache_size)
+        return [tokenizer(value) for value in values]
+    fernet = Fernet(key)
+    return [fernet.encrypt(value.encode()).decode() for value in values]
+
+
+def _get_pool(workers):
+    """
+    Return the shared process pool, (re)creating it if the requested size changed.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=True)
+            _pool = process_pool(workers)
+            _pool_workers = workers
+        return _pool
+
+
+def _plaintexts(values):
+    """
+    Render the non-null values of a column as the strings that are encrypted or tokenized.
+
+    A chunk with nulls in an integer column is read as float64, so integral floats are rendered without
+    the trailing '.0': 1047 gives '1047' whether its chunk was read as int64, float64 or str, and its
+    HMAC token does not depend on the other rows of the chunk.
+    """
+    plaintexts = values.astype(str).to_numpy(dtype=object)
+    if pd.api.types.is_float_dtype(values.dtype):
+        numbers = values.to_numpy(dtype=np.float64)
+        # Beyond 2**53 floats are no longer exact integers, so they keep their float rendering
+        integral = np.isfinite(numbers) & (np.trunc(numbers) == numbers) & (np.abs(numbers) < 2**53)
+        plaintexts[integral] = numbers[integral].astype(np.int64).astype(str).astype(object)
+    return plaintexts
+
+
+def encrypt_array(values, key, deterministic=False, workers=1, parallel_min_cells=50000, mode='fernet',
+                  token_cache_size=4096):
+    """
+    Encrypt a whole column at once using Fernet symmetric encryption or HMAC-SHA256 tokenization.
+
+    Nulls are detected and plaintexts converted to strings once for the whole array instead of per cell;
+    integral floats are rendered as integers, so a value gets the same token in any chunk.
+    In deterministic mode repeated plaintexts are encrypted only once and share the same token within
+    the batch. Batches with at least parallel_min_cells values to encrypt are split across a process pool.
+
+    The 'hmac_sha256' mode always produces stable tokens across runs (and is therefore always deterministic);
+    tokens are memoized in an LRU cache of token_cache_size entries, so the few distinct values that repeat
+    across millions of rows are hashed once per process.
+
+    Parameters:
+        values (pandas.Series): Column to encrypt.
+        key (bytes): Fernet key, as returned by load_key; in 'hmac_sha256' mode the HMAC key instead (see
+                     transform.get_encryption_key).
+        deterministic (bool): Encrypt each distinct plaintext once per batch and reuse its token.
+        workers (int): Number of worker processes for large batches; 1 disables the pool.
+        parallel_min_cells (int): Minimum number of cells to encrypt before the pool is used.
+        mode (str): 'fernet' (randomized, reversible) or 'hmac_sha256' (deterministic, one-way).
+        token_cache_size (int): Size of the LRU token cache in 'hmac_sha256' mode.
+
+    Returns:
+        pandas.Series: Encrypted tokens as strings, with nulls left unchanged.
+
+    Raises:
+        ValueError: If the mode is not supported.
+    """
+    if mode not in ENCRYPTION_MODES:
+        raise ValueError(f"Unsupported encryption mode '{mode}'. Expected one of {ENCRYPTION_MODES}")
+
+    null_mask = values.isna().to_numpy()
+    plaintexts = _plaintexts(values[~null_mask])
+
+    if deterministic or mode == 'hmac_sha256':
+        # Encrypt each distinct plaintext once and map the tokens back to every row
+        inverse, plaintexts = pd.factorize(plaintexts)
+
+    plaintexts = plaintexts.tolist()
+    if workers > 1 and len(plaintexts) >= parallel_min_cells:
+        batch_size = -(-len(plaintexts) // workers)
+        batches = [plaintexts[i:i + batch_size] for i in range(0, len(plaintexts), batch_size)]
+        pool = _get_pool(workers)
+        repeat = len(batches)
+        tokens = [token for batch in pool.map(_encrypt_batch, [key] * repeat, batches, [mode] * repeat, [token_cache_size] * repeat)
+                  for token in batch]
+    else:
+        tokens = _encrypt_batch(key, plaintexts, mode, token_cache_size)
+
+    tokens = np.array(tokens, dtype=object)
+    if deterministic or mode == 'hmac_sha256':
+        tokens = tokens[inverse]
+
+    encrypted = values.astype(object)
+    encrypted[~null_mask] = tokens
+    return encrypted
+
+
 def decrypt_value(value, fernet):
     """
     Decrypt a single value using Fernet symmetric encryption.
@@ -1,6 +1,62 @@
 import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from sqlalchemy import text
+from utils.file_manifest import manifest_table, record_manifest_entries
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Columns of the stage metrics table, in the order records are buffered
+METRIC_FIELDS = ('stage', 'target', 'chunk_idx', 'started_at', 'duration_ms', 'rows_in', 'rows_out',
+                 'rows_rejected', 'bytes_copied', 'peak_rss_bytes')
+
+# Metrics buffered until flush_stage_metrics; list.append is atomic, so worker threads need no lock
+_stage_metrics = []
+
+# Stages running right now (id -> state of each stage_timer block), to tell whether a stage ran alone
+_active_stages = {}
+_active_stages_lock = threading.Lock()
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident set size of the current process so the next get_peak_rss_bytes call
+    reports the peak of the work done in between (Linux only; a no-op elsewhere).
+
+    Returns:
+        bool: True if the peak was reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss_bytes():
+    """
+    Return the peak resident set size of the current process in bytes, since start or since the last
+    successful reset_peak_rss, or None if the platform does not report it.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
 
 
 def start_etl_process(engine, config):
@@ -45,11 +101,56 @@ def start_etl_process(engine, config):
     return process_id
 
 
-def end_etl_process(engine, config, process_id, num_records_loaded, error_message=None):
+def resume_etl_process(engine, config, process_id):
+    """
+    Reopen a failed ETL process so it can be resumed under the same process_id.
+
+    The tracking record is set back to "RUNNING" and its end time and error message are cleared;
+    the original start time is kept.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the target database.
+        config (dict): Configuration dictionary containing 'load_process' keys such as schema
+                       and table_name.
+        process_id (int): The process to resume.
+
+    Returns:
+        int: The resumed process_id.
+
+    Raises:
+        ValueError: If the process does not exist or already completed.
+    """
+    load_proc = config['load_process']
+    full_table = f"{load_proc['schema']}.{load_proc['table_name']}"
+
+    with engine.connect() as conn:
+        status = conn.execute(text(f"SELECT status FROM {full_table} WHERE process_id = :process_id"),
+                              {"process_id": process_id}).scalar()
+        if status is None:
+            raise ValueError(f"Cannot resume process_id={process_id}: it is not in {full_table}")
+        if status == "COMPLETED":
+            raise ValueError(f"Cannot resume process_id={process_id}: it already completed")
+
+        conn.execute(text(f"""
+            UPDATE {full_table}
+            SET end_time = NULL,
+                status = :status,
+                error_message = NULL
+            WHERE process_id = :process_id
+        """), {"status": "RUNNING", "process_id": process_id})
+        conn.commit()
+    logging.info(f"Resuming ETL process process_id={process_id} (previous status {status})")
+    return process_id
+
+
+def end_etl_process(engine, config, process_id, num_records_loaded, error_message=None, manifest_entries=None):
     """
     Finalize an ETL process by updating the tracking record with end time, status,
     number of records loaded, and an optional error message.
 
+    When the process completed, the source file manifest entries of the run are written in the same
+    transaction, so the manifest only ever records files whose load committed.
+
     Parameters:
         engine (sqlalchemy.Engine): SQLAlchemy engine connected to the target database.
         config (dict): Configuration dictionary containing 'load_process' keys such as schema
@@ -57,6 +158,7 @@ def end_etl_process(engine, config, process_id, num_records_loaded, error_messag
         process_id (int): The unique identifier of the ETL process being finalized.
         num_records_loaded (int): The count of records successfully loaded during the process.
         error_message (str, optional): Error message if the ETL process failed; defaults to None.
+        manifest_entries (list of dict, optional): Results of detect_file_change for the files of the run.
 
     Returns:
         None
@@ -85,4 +187,109 @@ def end_etl_process(engine, config, process_id, num_records_loaded, error_messag
             "error_message": error_message,
             "process_id": process_id
         })
+        if status == "COMPLETED" and manifest_entries:
+            record_manifest_entries(conn, manifest_table(config), process_id, manifest_entries)
         conn.commit()
+    if status == "COMPLETED" and manifest_entries:
+        logging.info(f"Recorded {len(manifest_entries)} files in the manifest for process_id={process_id}")
+
+
+def record_metric(stage, target=None, chunk_idx=None, started_at=None, duration=None, rows_in=None, rows_out=None,
+                  rows_rejected=None, bytes_copied=None, peak_rss_bytes=None):
+    """
+    Buffer one stage or chunk measurement in memory. Cheap enough for the chunk hot path: it only
+    appends a tuple, and nothing touches the database until flush_stage_metrics.
+
+    Parameters:
+        stage (str): Stage name, e.g. 'encrypt', 'validate_serialize', 'copy', 'merge'.
+        target (str, optional): File or table the stage worked on.
+        chunk_idx (int, optional): Chunk index for chunk-level measurements.
+        started_at (datetime, optional): Start time; defaults to now.
+        duration (float, optional): Duration in seconds.
+        rows_in, rows_out, rows_rejected (int, optional): Row counters.
+        bytes_copied (int, optional): Bytes sent to the database.
+        peak_rss_bytes (int, optional): Peak resident memory during the stage.
+    """
+    _stage_metrics.append((stage, target, chunk_idx, started_at or datetime.now(),
+                           duration * 1000 if duration is not None else None, rows_in, rows_out,
+                           rows_rejected, bytes_copied, peak_rss_bytes))
+
+
+@contextmanager
+def stage_timer(stage, target=None):
+    """
+    Time a pipeline stage and buffer its metrics when the block exits, also when it raises.
+
+    The block receives a dict of counters it can fill in ('rows_in', 'rows_out', 'rows_rejected',
+    'bytes_copied'). The peak RSS is process-wide, so it is only reset and recorded for a stage that
+    runs alone; stages overlapping another one (concurrent tasks of the scheduler) record no peak RSS.
+
+    Example:
+        with stage_timer('merge', 'etl_assesment_data.sales') as counters:
+            counters['rows_out'] = merge_insert(...)['inserted']
+
+    Parameters:
+        stage (str): Stage name.
+        target (str, optional): File or table the stage works on.
+
+    Yields:
+        dict: Counters recorded with the stage.
+    """
+    counters = {'rows_in': None, 'rows_out': None, 'rows_rejected': None, 'bytes_copied': None}
+    started_at = datetime.now()
+    active = {'overlapped': False}
+    with _active_stages_lock:
+        if _active_stages:
+            # Resetting now would also wipe the peak of the running stages
+            for other in _active_stages.values():
+                other['overlapped'] = True
+            active['overlapped'] = True
+        else:
+            reset_peak_rss()
+        _active_stages[id(active)] = active
+    start = time.perf_counter()
+    try:
+        yield counters
+    finally:
+        duration = time.perf_counter() - start
+        with _active_stages_lock:
+            del _active_stages[id(active)]
+        peak_rss_bytes = None if active['overlapped'] else get_peak_rss_bytes()
+        record_metric(stage, target, started_at=started_at, duration=duration, peak_rss_bytes=peak_rss_bytes,
+                      **counters)
+        logging.info(f"Stage {stage}{f' ({target})' if target else ''} took {duration:.3f}s")
+
+
+def flush_stage_metrics(engine, config, process_id):
+    """
+    Write all buffered metrics to the stage metrics table in a single bulk insert and clear the buffer.
+
+    The table is load_process.metrics_table in the load_process schema; without it the buffer is
+    only cleared.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the target database.
+        config (dict): Configuration dictionary containing the 'load_process' section.
+        process_id (int): The ETL process the metrics belong to.
+
+    Returns:
+        int: Number of metric rows written.
+    """
+    records = _stage_metrics[:]
+    del _stage_metrics[:len(records)]
+
+    load_proc = config['load_process']
+    metrics_table = load_proc.get('metrics_table')
+    if not metrics_table or not records:
+        return 0
+
+    full_table = f"{load_proc['schema']}.{metrics_table}"
+    columns = ('process_id',) + METRIC_FIELDS
+    rows = [dict(zip(columns, (process_id,) + record)) for record in records]
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            INSERT INTO {full_table} ({', '.join(columns)})
+            VALUES ({', '.join(f':{col}' for col in columns)})
+        """), rows)
+    logging.info(f"Flushed {len(rows)} stage metrics to {full_table} (process_id={process_id})")
+    return len(rows)
@@ -0,0 +1,149 @@
+import logging
+import os
+import pandas as pd
+
+# File formats the pipeline reads and writes, by file extension
+FILE_FORMATS = ('csv', 'parquet', 'arrow')
+FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.arrows': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+# Formats the encrypted intermediate file can be written in, with their extension
+INTERMEDIATE_FORMATS = {'csv': '.csv', 'parquet': '.parquet'}
+
+
+def file_format(file_path, declared=None):
+    """
+    Resolve the format of a data file from its declared format or, failing that, its extension.
+
+    Parameters:
+        file_path (str): Path to the file.
+        declared (str, optional): Format set in the config (e.g. files_to_tables_tmp[].format).
+
+    Returns:
+        str: 'csv', 'parquet' or 'arrow' (Arrow IPC file or stream, also known as Feather v2).
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+    resolved = declared or FORMAT_EXTENSIONS.get(os.path.splitext(file_path)[1].lower(), 'csv')
+    if resolved not in FILE_FORMATS:
+        raise ValueError(f"Unsupported file format '{resolved}' for {file_path}. Expected one of {FILE_FORMATS}")
+    return resolved
+
+
+def require_pyarrow(fmt):
+    """
+    Import pyarrow, raising an ImportError that names the format needing it when it is not installed.
+    """
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(f"File format '{fmt}' requires the pyarrow package (pip install pyarrow)") from e
+    return pyarrow
+
+
+def open_arrow_ipc(file_path):
+    """
+    Open an Arrow IPC file (random access) or stream, memory-mapped so record batches are read without copying.
+
+    Returns:
+        pyarrow.ipc.RecordBatchFileReader or pyarrow.ipc.RecordBatchStreamReader
+    """
+    pa = require_pyarrow('arrow')
+    source = pa.memory_map(file_path, 'r')
+    try:
+        return pa.ipc.open_file(source)
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_stream(source)
+
+
+def read_columns(file_path, fmt):
+    """
+    Column names of a data file, read from its header or schema only.
+    """
+    if fmt == 'parquet':
+        require_pyarrow(fmt)
+        import pyarrow.parquet as pq
+        return pq.read_schema(file_path).names
+    if fmt == 'arrow':
+        return open_arrow_ipc(file_path).schema.names
+    return pd.read_csv(file_path, nrows=0).columns.tolist()
+
+
+def arrow_to_pandas(table):
+    """
+    Convert an Arrow table or record batch to pandas without materializing Python objects: numeric and
+    timestamp columns become NumPy arrays, nullable integers and booleans keep their pandas extension
+    dtypes and strings stay in Arrow memory (pyarrow-backed string dtype).
+    """
+    pa = require_pyarrow('arrow')
+    types_mapper = {pa.int64(): pd.Int64Dtype(), pa.int32(): pd.Int64Dtype(), pa.bool_(): pd.BooleanDtype(),
+                    pa.string(): pd.StringDtype('pyarrow'), pa.large_string(): pd.StringDtype('pyarrow')}.get
+    return table.to_pandas(types_mapper=types_mapper)
+
+
+def read_frame(file_path, fmt=None):
+    """
+    Read a whole CSV, Parquet or Arrow IPC file into a DataFrame.
+
+    Parameters:
+        file_path (str): Path to the file.
+        fmt (str, optional): File format; resolved from the extension if not given.
+
+    Returns:
+        pandas.DataFrame: The file contents.
+    """
+    fmt = file_format(file_path, fmt)
+    if fmt == 'parquet':
+        require_pyarrow(fmt)
+        import pyarrow.parquet as pq
+        return arrow_to_pandas(pq.read_table(file_path))
+    if fmt == 'arrow':
+        return arrow_to_pandas(open_arrow_ipc(file_path).read_all())
+    return pd.read_csv(file_path)
+
+
+class ChunkFileWriter:
+    """
+    Append DataFrame chunks to a CSV or Parquet file, chosen by the file extension.
+
+    CSV chunks are appended with pandas; Parquet chunks are written as row groups of a single file whose
+    schema is taken from the first chunk. Call close() to finish the file (required for Parquet).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.format = file_format(path)
+        if self.format not in INTERMEDIATE_FORMATS:
+            raise ValueError(f"Cannot write chunks as '{self.format}'. Expected one of {list(INTERMEDIATE_FORMATS)}")
+        self._writer = None
+        self._chunks = 0
+
+    def write(self, chunk):
+        if self.format == 'parquet':
+            pa = require_pyarrow(self.format)
+            import pyarrow.parquet as pq
+            if self._writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                # Later chunks are cast to the schema of the first one
+                table = pa.Table.from_pandas(chunk, schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode='w' if self._chunks == 0 else 'a', header=(self._chunks == 0), index=False)
+        self._chunks += 1
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            logging.debug(f"Closed Parquet writer for {self.path} after {self._chunks} row groups")
@@ -0,0 +1,197 @@
+import hashlib
+import logging
+import os
+import time
+from sqlalchemy import text
+
+# Bytes read at a time while hashing a file
+HASH_READ_BYTES = 1 << 20
+
+MANIFEST_COLUMNS = ('feed', 'process_id', 'file_path', 'file_size', 'file_mtime_ns', 'content_hash', 'block_size',
+                    'block_hashes', 'change_type', 'loaded_from_byte')
+
+# Results of detect_file_change
+CHANGE_TYPES = ('new', 'changed', 'appended', 'unchanged')
+
+
+def manifest_table(config):
+    """
+    Full name of the source file manifest table (load_process.manifest_table), or None if change detection is disabled.
+    """
+    load_proc = config.get('load_process', {})
+    table_name = load_proc.get('manifest_table')
+    if not table_name:
+        return None
+    return f"{load_proc['schema']}.{table_name}"
+
+
+def fingerprint_file(file_path, block_size=None, prefix_size=None):
+    """
+    Fingerprint a file in one streaming pass: size, modification time, SHA-256 of the whole content and,
+    optionally, SHA-256 of every block_size block and of the first prefix_size bytes.
+
+    The file is read in fixed-size buffers, so memory stays constant for any file size. The prefix hash is
+    a snapshot of the running content hash, so checking whether a file only grew costs no extra read.
+
+    Parameters:
+        file_path (str): Path to the file.
+        block_size (int, optional): Size of the hashed blocks; no block hashes if not given.
+        prefix_size (int, optional): Length of the prefix to hash (e.g. the size of the previous version).
+
+    Returns:
+        dict: 'file_size', 'file_mtime_ns', 'content_hash', 'block_size', 'block_hashes' (list of hex digests
+              or None) and 'prefix_hash' (None unless prefix_size is within the file).
+    """
+    stat = os.stat(file_path)
+    size = stat.st_size
+    content = hashlib.sha256()
+    block = hashlib.sha256() if block_size else None
+    block_hashes = [] if block_size else None
+    prefix_hash = content.hexdigest() if prefix_size == 0 else None
+    buffer = memoryview(bytearray(HASH_READ_BYTES))
+    position = 0
+    block_end = block_size or None
+    start_time = time.perf_counter()
+
+    with open(file_path, 'rb') as f:
+        while position < size:
+            # Reads stop exactly at the prefix and block boundaries
+            stop = min(size, position + HASH_READ_BYTES)
+            if prefix_size and position < prefix_size:
+                stop = min(stop, prefix_size)
+            if block_end is not None:
+                stop = min(stop, block_end)
+            read = f.readinto(buffer[:stop - position])
+            if not read:
+                break
+            data = buffer[:read]
+            content.update(data)
+            position += read
+            if block is not None:
+                block.update(data)
+                if position == block_end or position == size:
+                    block_hashes.append(block.hexdigest())
+                    block = hashlib.sha256()
+                    block_end += block_size
+            if prefix_size and position == prefix_size:
+                prefix_hash = content.hexdigest()
+
+    elapsed = time.perf_counter() - start_time
+    logging.info(f"Hashed {file_path} ({size} bytes) in {elapsed:.3f}s ({size / max(elapsed, 1e-9) / 2**20:.1f} MB/s)")
+    return {
+        "file_size": size,
+        "file_mtime_ns": stat.st_mtime_ns,
+        "content_hash": content.hexdigest(),
+        "block_size": block_size,
+        "block_hashes": block_hashes,
+        "prefix_hash": prefix_hash,
+    }
+
+
+def load_manifest_entry(engine, table_fullname, feed):
+    """
+    Read the manifest entry of a feed, as recorded by the last successful run that saw it.
+
+    Returns:
+        dict or None: The MANIFEST_COLUMNS of the entry, or None if the feed was never loaded.
+    """
+    with engine.connect() as conn:
+        row = conn.execute(text(f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM {table_fullname} WHERE feed = :feed"),
+                           {"feed": feed}).mappings().first()
+    return dict(row) if row is not None else None
+
+
+def _first_changed_block(previous, fingerprint):
+    """
+    Offset of the first block whose hash differs from the previous version, or None if it cannot be told.
+    """
+    if not previous.get('block_hashes') or not fingerprint['block_hashes'] or previous['block_size'] != fingerprint['block_size']:
+        return None
+    for idx, (old, new) in enumerate(zip(previous['block_hashes'], fingerprint['block_hashes'])):
+        if old != new:
+            return idx * fingerprint['block_size']
+    return min(len(previous['block_hashes']), len(fingerprint['block_hashes'])) * fingerprint['block_size']
+
+
+def _ends_with_newline(file_path, offset):
+    """
+    True if the byte before offset is a newline, i.e. a previous version of offset bytes ended on a record.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(offset - 1)
+        return f.read(1) == b'\n'
+
+
+def detect_file_change(engine, config, feed, file_path, append_only=False):
+    """
+    Compare a source file with the manifest entry of its feed.
+
+    A file with the size and modification time of the recorded version is taken as unchanged without
+    being read (the same quick check rsync uses); otherwise it is hashed. For append-only CSV feeds, a
+    file that grew and whose first bytes hash to the recorded content is reported as appended, and only
+    the bytes from the previous size on need loading.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        config (dict): Configuration dictionary ('load_process.manifest_table' and 'manifest_block_size').
+        feed (str): Stable name of the feed, e.g. the file_path configured in files_to_tables_tmp.
+        file_path (str): Path of the file received for this run.
+        append_only (bool): The feed only ever appends rows to the previous version.
+
+    Returns:
+        dict: 'change_type' (one of CHANGE_TYPES), 'loaded_from_byte' (offset the load starts at, None if the
+              file is skipped) and the manifest columns to record for the file.
+    """
+    table_fullname = manifest_table(config)
+    block_size = config['load_process'].get('manifest_block_size')
+    previous = load_manifest_entry(engine, table_fullname, feed)
+    stat = os.stat(file_path)
+    entry = {"feed": feed, "file_path": file_path}
+
+    if previous is not None and previous['file_size'] == stat.st_size and previous['file_mtime_ns'] == stat.st_mtime_ns:
+        logging.info(f"{file_path} has the size and mtime recorded for feed {feed} by process_id={previous['process_id']}; unchanged")
+        entry.update({key: previous[key] for key in ('file_size', 'file_mtime_ns', 'content_hash', 'block_size', 'block_hashes')})
+        entry.update({"change_type": "unchanged", "loaded_from_byte": None})
+        return entry
+
+    grew = previous is not None and 0 < previous['file_size'] < stat.st_size
+    fingerprint = fingerprint_file(file_path, block_size, previous['file_size'] if append_only and grew else None)
+    entry.update({key: fingerprint[key] for key in ('file_size', 'file_mtime_ns', 'content_hash', 'block_size', 'block_hashes')})
+
+    if previous is None:
+        entry.update({"change_type": "new", "loaded_from_byte": 0})
+    elif fingerprint['content_hash'] == previous['content_hash']:
+        logging.info(f"{file_path} has the content recorded for feed {feed} by process_id={previous['process_id']}; unchanged")
+        entry.update({"change_type": "unchanged", "loaded_from_byte": None})
+    elif fingerprint['prefix_hash'] == previous['content_hash'] and _ends_with_newline(file_path, previous['file_size']):
+        logging.info(f"{file_path} appended {stat.st_size - previous['file_size']} bytes to the {previous['file_size']} "
+                     f"recorded for feed {feed}; only the tail is loaded")
+        entry.update({"change_type": "appended", "loaded_from_byte": previous['file_size']})
+    else:
+        changed_at = _first_changed_block(previous, fingerprint)
+        detail = f" (first difference in the block at byte {changed_at})" if changed_at is not None else ""
+        if append_only:
+            logging.warning(f"Append-only feed {feed} was rewritten{detail}; {file_path} is loaded in full")
+        else:
+            logging.info(f"{file_path} changed since the version recorded for feed {feed}{detail}")
+        entry.update({"change_type": "changed", "loaded_from_byte": 0})
+    return entry
+
+
+def record_manifest_entries(conn, table_fullname, process_id, entries):
+    """
+    Upsert the manifest entries of a run on an open connection, so they commit together with the process status.
+
+    Parameters:
+        conn (sqlalchemy.Connection): Connection whose transaction finalizes the process.
+        table_fullname (str): Manifest table from manifest_table.
+        process_id (int): ETL process that loaded the files.
+        entries (list of dict): Results of detect_file_change.
+    """
+    columns = ', '.join(MANIFEST_COLUMNS)
+    updates = ', '.join(f"{col} = EXCLUDED.{col}" for col in MANIFEST_COLUMNS if col != 'feed')
+    conn.execute(text(f"""
+        INSERT INTO {table_fullname} ({columns}, updated_at)
+        VALUES ({', '.join(f':{col}' for col in MANIFEST_COLUMNS)}, now())
+        ON CONFLICT (feed) DO UPDATE SET {updates}, updated_at = now()
+    """), [{**{col: entry.get(col) for col in MANIFEST_COLUMNS}, "process_id": process_id} for entry in entries])
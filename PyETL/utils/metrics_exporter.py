@@ -0,0 +1,234 @@
+import bisect
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Exporters selectable with metrics.exporter
+EXPORTERS = ('none', 'http', 'textfile')
+
+# Default COPY latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+class _ThreadCells:
+    """
+    Per-thread storage for a metric: every thread updates only its own cell, so increments need no
+    lock; a lock is taken once per thread to register its cell and when the cells are read for export.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()
+
+    def cell(self):
+        cell = getattr(self._local, 'cell', None)
+        if cell is None:
+            cell = self._factory()
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+        return cell
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._cells)
+
+
+class Counter:
+    """
+    Monotonic counter exported as '<name>_total'.
+    """
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._cells = _ThreadCells(lambda: [0])
+        _register(self)
+
+    def inc(self, amount=1):
+        self._cells.cell()[0] += amount
+
+    def value(self):
+        return sum(cell[0] for cell in self._cells.snapshot())
+
+    def render(self):
+        return [f"# HELP {self.name}_total {self.documentation}", f"# TYPE {self.name}_total counter",
+                f"{self.name}_total {self.value()}"]
+
+
+class Gauge:
+    """
+    Value that goes up and down, set by a single owner (e.g. the loader's in-flight window).
+    """
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0
+        _register(self)
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        return self._value
+
+    def render(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {self._value}"]
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, exported as '<name>_bucket', '<name>_sum' and '<name>_count'.
+    """
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket plus +Inf, then the running sum
+        self._cells = _ThreadCells(lambda: [0] * (len(self.buckets) + 2))
+        _register(self)
+
+    def observe(self, value):
+        cell = self._cells.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def render(self):
+        totals = [0] * (len(self.buckets) + 2)
+        for cell in self._cells.snapshot():
+            totals = [a + b for a, b in zip(totals, cell)]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), totals[:-1]):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {totals[-1]}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+
+
+def render_metrics():
+    """
+    Render every registered metric in the Prometheus text exposition format.
+
+    Returns:
+        str: Exposition text, ending with a newline.
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Live progress metrics of the loader
+ROWS_PARSED = Counter('etl_rows_parsed', 'Rows read from source files.')
+ROWS_LOADED = Counter('etl_rows_loaded', 'Rows copied into staging tables.')
+ROWS_REJECTED = Counter('etl_rows_rejected', 'Rows rejected by validation rules.')
+COPY_BYTES = Counter('etl_copy_bytes', 'Bytes sent to PostgreSQL with COPY.')
+ENCRYPTED_CELLS = Counter('etl_encrypted_cells', 'Cells encrypted.')
+ENCRYPTION_SECONDS = Counter('etl_encryption_seconds', 'Seconds spent encrypting; divide etl_encrypted_cells by it for throughput.')
+CHUNKS_IN_FLIGHT = Gauge('etl_chunks_in_flight', 'Chunks read but not yet loaded.')
+COPY_LATENCY = Histogram('etl_copy_latency_seconds', 'Duration of each chunk COPY.')
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Metrics endpoint: {format % args}")
+
+
+def write_textfile(path):
+    """
+    Write the current metrics to a textfile-collector file, atomically (write then rename).
+
+    Parameters:
+        path (str): Target '.prom' file.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render_metrics())
+    os.replace(tmp_path, path)
+
+
+def start_metrics_exporter(metrics_config):
+    """
+    Start the exporter selected by the 'metrics' config section.
+
+    - 'http': serves /metrics on metrics.host:metrics.port (default 127.0.0.1:9108) from a daemon thread.
+    - 'textfile': rewrites metrics.textfile_path every metrics.interval seconds (default 5) for the
+      node_exporter textfile collector.
+    - 'none' (default): counters are still kept in memory but not exported.
+
+    Parameters:
+        metrics_config (dict): The 'metrics' config section.
+
+    Returns:
+        callable: Function stopping the exporter; the textfile exporter writes a final snapshot.
+
+    Raises:
+        ValueError: If the exporter is not supported.
+    """
+    exporter = (metrics_config or {}).get('exporter', 'none')
+    if exporter not in EXPORTERS:
+        raise ValueError(f"Unsupported metrics.exporter '{exporter}'. Expected one of {EXPORTERS}")
+
+    if exporter == 'http':
+        host = metrics_config.get('host', '127.0.0.1')
+        port = metrics_config.get('port', 9108)
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        logging.info(f"Metrics endpoint listening on http://{host}:{server.server_address[1]}/metrics")
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+        return stop
+
+    if exporter == 'textfile':
+        path = metrics_config.get('textfile_path', 'data/metrics/etl.prom')
+        interval = metrics_config.get('interval', 5)
+        stopped = threading.Event()
+
+        def run():
+            while not stopped.wait(interval):
+                try:
+                    write_textfile(path)
+                except OSError as e:
+                    logging.warning(f"Could not write metrics textfile {path}: {e}")
+
+        threading.Thread(target=run, name='metrics-textfile', daemon=True).start()
+        logging.info(f"Writing metrics to {path} every {interval}s")
+
+        def stop():
+            stopped.set()
+            write_textfile(path)
+        return stop
+
+    return lambda: None
@@ -0,0 +1,198 @@
+import logging
+import math
+import os
+import re
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from utils.scheduler import process_pool
+
+# Column generation rules understood by parse_column_rule
+COLUMN_RULE_PATTERNS = {
+    'int_sequence': re.compile(r'^int_sequence$'),
+    'random_int': re.compile(r'^random_int_(-?\d+)_(-?\d+)$'),
+    'random_unique_int': re.compile(r'^random_unique_int_(-?\d+)_(-?\d+)$'),
+    'datetime_now_minus_random_minutes': re.compile(r'^datetime_now_minus_random_minutes_(\d+)_(\d+)$'),
+}
+
+MOCK_FORMATS = ('csv', 'parquet')
+
+# Largest range for which (multiplier * index) of the unique-int permutation fits in int64
+_INT64_SAFE_RANGE = 3_000_000_000
+
+
+def parse_column_rule(rule):
+    """
+    Parse a mock column rule such as 'random_int_1_10' into its kind and integer bounds.
+
+    Parameters:
+        rule (str): Column rule from the mock_data config.
+
+    Returns:
+        tuple: (kind, low, high); low and high are None for 'int_sequence'.
+
+    Raises:
+        ValueError: If the rule is not supported or its bounds are reversed.
+    """
+    for kind, pattern in COLUMN_RULE_PATTERNS.items():
+        match = pattern.match(rule)
+        if match is None:
+            continue
+        if kind == 'int_sequence':
+            return kind, None, None
+        low, high = int(match.group(1)), int(match.group(2))
+        if low > high:
+            raise ValueError(f"Invalid range in column type '{rule}': {low} > {high}")
+        return kind, low, high
+    raise ValueError(f"Unsupported column type: {rule}")
+
+
+def _unique_int_plan(low, high, num_rows, rng):
+    """
+    Choose a random affine permutation i -> (a * i + b) mod n of the range, so unique values can be
+    generated for any row index without materializing or sampling the whole range.
+    """
+    n = high - low + 1
+    if num_rows > n:
+        raise ValueError(f"Cannot draw {num_rows} unique integers from range {low}..{high}")
+    a = int(rng.integers(1, n)) if n > 1 else 1
+    while math.gcd(a, n) != 1:
+        a = int(rng.integers(1, n))
+    return {'low': low, 'n': n, 'a': a, 'b': int(rng.integers(0, n))}
+
+
+def _unique_int_block(plan, start, stop):
+    """
+    Values of the unique-int permutation for row indexes [start, stop).
+    """
+    if plan['n'] < _INT64_SAFE_RANGE:
+        index = np.arange(start, stop, dtype=np.int64)
+        return plan['low'] + (plan['a'] * index + plan['b']) % plan['n']
+    # Ranges this wide overflow int64 products; fall back to Python integers
+    return np.array([plan['low'] + (plan['a'] * i + plan['b']) % plan['n'] for i in range(start, stop)], dtype=np.int64)
+
+
+def generate_block(columns, start, stop, base_time, unique_plans, rng):
+    """
+    Generate the rows [start, stop) of a mock dataset as one DataFrame, one NumPy call per column.
+
+    Parameters:
+        columns (dict): Column name to (kind, low, high) from parse_column_rule.
+        start (int): Global index of the first row.
+        stop (int): Global index after the last row.
+        base_time (numpy.datetime64): Reference time of the 'datetime_now_minus_random_minutes' columns.
+        unique_plans (dict): Column name to its unique-int permutation.
+        rng (numpy.random.Generator): Random generator of this block.
+
+    Returns:
+        pandas.DataFrame: The generated rows.
+    """
+    size = stop - start
+    data = {}
+    for col_name, (kind, low, high) in columns.items():
+        if kind == 'int_sequence':
+            data[col_name] = np.arange(start + 1, stop + 1, dtype=np.int64)
+        elif kind == 'random_int':
+            data[col_name] = rng.integers(low, high, size=size, endpoint=True)
+        elif kind == 'random_unique_int':
+            data[col_name] = _unique_int_block(unique_plans[col_name], start, stop)
+        else:
+            minutes = rng.integers(low, high, size=size, endpoint=True)
+            data[col_name] = base_time - minutes.astype('timedelta64[m]')
+    return pd.DataFrame(data)
+
+
+def _write_shard(path, file_format, columns, start, stop, block_size, base_time, unique_plans, seed, shard):
+    """
+    Generate and write one shard block by block, so at most block_size rows are held in memory.
+    Every block has its own generator seeded from (seed, shard, block), which keeps the output
+    identical however the shards are scheduled. An empty shard is still written, with only the header
+    (or schema).
+    """
+    writer = None
+    try:
+        for block, block_start in enumerate(range(start, max(stop, start + 1), block_size)):
+            rng = np.random.default_rng([seed, shard, block])
+            df = generate_block(columns, block_start, min(block_start + block_size, stop), base_time, unique_plans, rng)
+            if file_format == 'parquet':
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            else:
+                df.to_csv(path, mode='w' if block == 0 else 'a', header=(block == 0), index=False, encoding='utf-8')
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def generate_mock_dataset(path, columns, num_rows, seed=None, block_size=1_000_000, shards=1, workers=1,
+                          file_format='csv'):
+    """
+    Generate a mock dataset with vectorized NumPy generators and write it as CSV or Parquet.
+
+    Rows are produced in blocks of block_size, so memory stays bounded however large num_rows is.
+    With shards > 1 the rows are split over files named '<name>_partNNN<ext>', written by up to
+    `workers` processes in parallel. int_sequence and random_unique_int columns are continuous and
+    unique across all shards. The same seed always produces the same values (timestamps relative to
+    the generation time).
+
+    Parameters:
+        path (str): Output file path (the shard suffix is added before the extension).
+        columns (dict): Column name to column rule (see parse_column_rule).
+        num_rows (int): Total number of rows.
+        seed (int, optional): Random seed; a random one is drawn (and logged) if not given.
+        block_size (int): Rows generated and written at a time per shard.
+        shards (int): Number of output files.
+        workers (int): Processes writing shards in parallel.
+        file_format (str): 'csv' or 'parquet'.
+
+    Returns:
+        list of str: Paths of the written files.
+
+    Raises:
+        ValueError: If a column rule or the file format is not supported.
+    """
+    if file_format not in MOCK_FORMATS:
+        raise ValueError(f"Unsupported mock data format '{file_format}'. Expected one of {MOCK_FORMATS}")
+    if file_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError("Mock data format 'parquet' requires the pyarrow package (pip install pyarrow)") from e
+
+    parsed = {col_name: parse_column_rule(rule) for col_name, rule in columns.items()}
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (2 ** 63))
+        logging.info(f"No mock data seed configured; using seed {seed}")
+
+    plan_rng = np.random.default_rng([seed])
+    unique_plans = {col_name: _unique_int_plan(low, high, num_rows, plan_rng)
+                    for col_name, (kind, low, high) in parsed.items() if kind == 'random_unique_int'}
+    base_time = np.datetime64(datetime.now(), 'us')
+
+    shards = max(1, min(shards, num_rows)) if num_rows else 1
+    block_size = max(1, block_size)
+    bounds = np.linspace(0, num_rows, shards + 1, dtype=np.int64)
+    name, ext = os.path.splitext(path)
+    paths = [path] if shards == 1 else [f"{name}_part{shard:03d}{ext}" for shard in range(shards)]
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    start = time.perf_counter()
+    args = [(shard_path, file_format, parsed, int(bounds[shard]), int(bounds[shard + 1]), block_size, base_time,
+             unique_plans, seed, shard) for shard, shard_path in enumerate(paths)]
+    if workers > 1 and shards > 1:
+        with process_pool(min(workers, shards)) as pool:
+            list(pool.map(_write_shard, *zip(*args)))
+    else:
+        for shard_args in args:
+            _write_shard(*shard_args)
+
+    elapsed = time.perf_counter() - start
+    rate = num_rows / elapsed if elapsed > 0 else float('inf')
+    logging.info(f"Generated {num_rows} mock rows into {len(paths)} {file_format} file(s) in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    return paths
@@ -0,0 +1,166 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+
+def process_pool(max_workers, initializer=None, initargs=()):
+    """
+    Create a ProcessPoolExecutor whose workers do not fork the calling process.
+
+    The ETL creates its pools while other threads are running (COPY threads, the async loader loop,
+    concurrent tasks); a forked worker inherits whatever locks those threads held at that moment, such
+    as the logging lock, and can hang on them. Workers are forked from a clean 'forkserver' process
+    instead, or spawned where it is not available, so they import the modules afresh and need
+    initializer to set up module state such as logging.
+
+    Parameters:
+        max_workers (int): Number of worker processes.
+        initializer (callable, optional): Run once in every worker when it starts.
+        initargs (tuple): Arguments of initializer.
+
+    Returns:
+        concurrent.futures.ProcessPoolExecutor: The pool.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=pool_context(),
+                               initializer=initializer, initargs=initargs)
+
+
+def pool_context():
+    """
+    Multiprocessing context of the pools created by process_pool ('forkserver', or 'spawn' where it is
+    not available), for queues and other objects shared with their workers.
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def connection_budget(config, copy_workers):
+    """
+    Number of database connections the running tasks may hold at once.
+
+    Uses scheduler.max_connections when set; otherwise enough for every parallel task to run a full
+    set of COPY workers, so the budget only throttles when it is configured.
+
+    Parameters:
+        config (dict): Configuration dictionary.
+        copy_workers (int): Connections one file load uses (see load.load.copy_worker_count).
+
+    Returns:
+        int: Connection budget (at least 1).
+    """
+    scheduler_config = config.get('scheduler', {})
+    budget = scheduler_config.get('max_connections')
+    if budget is None:
+        budget = copy_workers * scheduler_config.get('max_parallel_tasks', 1)
+    return max(1, int(budget))
+
+
+def add_task(tasks, name, func, deps=(), connections=0):
+    """
+    Add a task to a task graph for run_task_graph.
+
+    Parameters:
+        tasks (dict): Task graph, updated in place.
+        name (str): Unique task name, used in logs and for dependencies (e.g. 'load:data/sales.csv').
+        func (callable): Function run without arguments; its return value is the task result.
+        deps (iterable of str): Tasks that must finish successfully first.
+        connections (int): Database connections the task holds while it runs.
+
+    Raises:
+        ValueError: If a task with the same name exists.
+    """
+    if name in tasks:
+        raise ValueError(f"Duplicate task '{name}'")
+    tasks[name] = {'func': func, 'deps': list(deps), 'connections': connections}
+
+
+def _check_graph(tasks):
+    """
+    Raise ValueError if a dependency is unknown or the graph has a cycle.
+    """
+    for name, task in tasks.items():
+        for dep in task['deps']:
+            if dep not in tasks:
+                raise ValueError(f"Task '{name}' depends on unknown task '{dep}'")
+    remaining = {name: set(task['deps']) for name, task in tasks.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Task graph has a cycle between {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+def run_task_graph(tasks, max_workers=1, max_connections=None, results=None):
+    """
+    Run a task graph, starting every task as soon as its dependencies have finished.
+
+    At most max_workers tasks run at once and the connections of the running tasks never exceed
+    max_connections (a task needing more than the whole budget runs alone). Ready tasks start in the
+    order they were added, so with max_workers=1 the graph runs sequentially in that order.
+    When a task fails no new task is started; the running ones are allowed to finish, the tasks not
+    started are reported as skipped and the first error is raised.
+
+    Parameters:
+        tasks (dict): Task graph built with add_task.
+        max_workers (int): Tasks running at once.
+        max_connections (int, optional): Connection budget; unlimited if None.
+        results (dict, optional): Filled with the result of each task as it finishes, so the results of
+            the finished tasks are available to the caller after a failure.
+
+    Returns:
+        dict: Task name to the value returned by its function.
+
+    Raises:
+        ValueError: If the graph is invalid.
+        Exception: The first error raised by a task.
+    """
+    _check_graph(tasks)
+    max_workers = max(1, max_workers)
+    free_connections = max_connections
+    pending = dict(tasks)
+    running = {}
+    results = {} if results is None else results
+    failure = None
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='etl-task') as pool:
+        while pending or running:
+            if failure is None:
+                for name, task in list(pending.items()):
+                    if len(running) >= max_workers:
+                        break
+                    if not all(dep in results for dep in task['deps']):
+                        continue
+                    needed = task['connections'] if max_connections is None else min(task['connections'], max_connections)
+                    if free_connections is not None and needed > free_connections:
+                        continue
+                    if free_connections is not None:
+                        free_connections -= needed
+                    del pending[name]
+                    logging.info(f"Task {name} started ({len(running) + 1} running, {needed} connection(s))")
+                    running[pool.submit(task['func'])] = (name, needed, time.perf_counter())
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, needed, started = running.pop(future)
+                if free_connections is not None:
+                    free_connections += needed
+                try:
+                    results[name] = future.result()
+                    logging.info(f"Task {name} finished in {time.perf_counter() - started:.2f}s")
+                except Exception as e:
+                    logging.error(f"Task {name} failed: {e}")
+                    if failure is None:
+                        failure = e
+
+    if failure is not None:
+        if pending:
+            logging.warning(f"Tasks skipped after the failure: {', '.join(pending)}")
+        raise failure
+    return results
@@ -0,0 +1,136 @@
+import logging
+import threading
+import pandas as pd
+from sqlalchemy import inspect, types
+
+# Process-wide table metadata cache keyed by (engine URL, schema, table)
+_table_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _cast_kind(col_type):
+    """
+    Classify a reflected SQLAlchemy column type into the pandas cast applied by align_types_df_to_db_schema.
+
+    Parameters:
+        col_type (sqlalchemy.types.TypeEngine): Reflected column type.
+
+    Returns:
+        str: One of 'int', 'float', 'datetime', 'bool' or 'str'.
+    """
+    if isinstance(col_type, types.Integer):
+        return 'int'
+    if isinstance(col_type, (types.Float, types.Numeric)):
+        return 'float'
+    if isinstance(col_type, (types.DateTime, types.Date, types.Time)):
+        return 'datetime'
+    if isinstance(col_type, types.Boolean):
+        return 'bool'
+    return 'str'
+
+
+def _cache_key(engine, schema, table_name):
+    return (str(engine.url), schema, table_name)
+
+
+def get_table_metadata(engine, schema, table_name):
+    """
+    Return the reflected metadata of a table, reflecting it only on the first request.
+
+    The result is shared by every caller in the process until invalidate_table_metadata is called
+    for the table (e.g. after an ALTER TABLE).
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Name of the schema in the database.
+        table_name (str): Name of the table in the database.
+
+    Returns:
+        dict: Table metadata with keys:
+            - 'columns' (list of str): Column names in table order.
+            - 'types' (dict): Column name to reflected SQLAlchemy type.
+            - 'type_strings' (dict): Column name to the type rendered for the engine dialect (e.g. 'VARCHAR(100)').
+            - 'cast_plan' (dict): Column name to pandas cast kind ('int', 'float', 'datetime', 'bool', 'str').
+    """
+    key = _cache_key(engine, schema, table_name)
+    metadata = _table_cache.get(key)
+    if metadata is not None:
+        return metadata
+
+    with _cache_lock:
+        metadata = _table_cache.get(key)
+        if metadata is None:
+            reflected = inspect(engine).get_columns(table_name, schema=schema)
+            col_types = {col["name"]: col["type"] for col in reflected}
+            metadata = {
+                "columns": [col["name"] for col in reflected],
+                "types": col_types,
+                "type_strings": {name: str(col_type.compile(dialect=engine.dialect)) for name, col_type in col_types.items()},
+                "cast_plan": {name: _cast_kind(col_type) for name, col_type in col_types.items()},
+            }
+            _table_cache[key] = metadata
+            logging.debug(f"Reflected and cached metadata for {schema}.{table_name}")
+    return metadata
+
+
+def get_cast_plan(engine, schema, table_name):
+    """
+    Return the precomputed pandas cast kind of every column of a table.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Name of the schema in the database.
+        table_name (str): Name of the table in the database.
+
+    Returns:
+        dict: Column name to cast kind ('int', 'float', 'datetime', 'bool', 'str').
+    """
+    return get_table_metadata(engine, schema, table_name)["cast_plan"]
+
+
+def invalidate_table_metadata(engine, schema, table_name):
+    """
+    Drop the cached metadata of a table so the next lookup reflects it again.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        schema (str): Name of the schema in the database.
+        table_name (str): Name of the table in the database.
+    """
+    with _cache_lock:
+        _table_cache.pop(_cache_key(engine, schema, table_name), None)
+    logging.debug(f"Invalidated cached metadata for {schema}.{table_name}")
+
+
+# pandas conversion applied for each cast kind
+CASTS = {
+    'int': lambda series: pd.to_numeric(series, errors='coerce').astype('Int64'),
+    'float': lambda series: pd.to_numeric(series, errors='coerce').astype(float),
+    'datetime': lambda series: pd.to_datetime(series, errors='coerce'),
+    'bool': lambda series: series.astype(bool),
+    'str': lambda series: series.astype(str),
+}
+
+
+def is_aligned(series, kind):
+    """
+    Tell whether a column already has the pandas dtype produced by the cast of its kind,
+    e.g. because it was parsed with typed read options, so the cast can be skipped.
+
+    Parameters:
+        series (pandas.Series): Column to check.
+        kind (str): Cast kind from the cast plan.
+
+    Returns:
+        bool: True if casting the column would not change its dtype.
+    """
+    dtype = series.dtype
+    if kind == 'int':
+        return isinstance(dtype, pd.Int64Dtype)
+    if kind == 'float':
+        return dtype == 'float64'
+    if kind == 'datetime':
+        return pd.api.types.is_datetime64_any_dtype(dtype)
+    if kind == 'bool':
+        return pd.api.types.is_bool_dtype(dtype)
+    return isinstance(dtype, pd.StringDtype)
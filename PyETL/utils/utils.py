@@ -1,9 +1,9 @@
 # src/utils.py
-import random
-from datetime import datetime, timedelta
+from datetime import datetime
 import pandas as pd
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from contextlib import contextmanager
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 import os
 import yaml
 from sqlalchemy import create_engine, text,inspect, Column, Table, MetaData, String, text
@@ -11,25 +11,33 @@ from sqlalchemy.exc import SQLAlchemyError
 import traceback
 import re
 import shutil
+from utils.schema_cache import get_table_metadata, invalidate_table_metadata, is_aligned, CASTS
+from utils.mock_data import generate_mock_dataset
+from utils.scheduler import pool_context
 
 def create_mock_data(config, process_id=None):
     """
     Generate mock data based on the provided configuration.
 
-    This function reads mock data settings from the configuration and creates CSV files
-    with fake but structurally consistent data for testing or development.
+    This function reads mock data settings from the configuration and creates CSV (or Parquet) files
+    with fake but structurally consistent data for testing or development. Rows are generated in
+    vectorized blocks by utils.mock_data.generate_mock_dataset, so memory stays bounded for any num_rows.
 
     Supported column types:
     - int_sequence: Generates a sequential integer column starting at 1.
     - random_int_<start>_<end>: Random integer in the given range.
-    - datetime_now_minus_random_minutes_0_100000: Random datetime within the last ~70 days.
-    - random_unique_int_start_end: Ensures unique integers across rows within the range.
+    - datetime_now_minus_random_minutes_<start>_<end>: Random datetime between <end> and <start> minutes ago.
+    - random_unique_int_<start>_<end>: Ensures unique integers across rows within the range.
 
     Parameters:
-    config (dict): Configuration dictionary containing:
+    config (dict): Configuration dictionary containing, per mock_data entry:
         - file_path: Path to save the generated CSV. Can include '{process_id}' placeholder.
         - num_rows: Number of rows to generate.
         - columns: Dictionary defining column names and their generation rules.
+        - seed (optional): Random seed for reproducible data.
+        - block_size (optional): Rows generated at a time (default 1,000,000).
+        - shards / workers (optional): Number of output files and processes writing them (default 1).
+        - format (optional): 'csv' (default) or 'parquet'.
     process_id (int or str, optional): Process identifier to be included in file name.
 
     Returns:
@@ -44,41 +52,17 @@ def create_mock_data(config, process_id=None):
             path = path.format(process_id=process_id)  # reemplaza el placeholder
 
         num_rows = dataset.get("num_rows", 1000)
-        columns = dataset["columns"]
-
-        data = []
-        base_time = datetime.now()
-
-        unique_ids = None
-        for col_type in columns.values():
-            if col_type.startswith("random_unique_int_"):
-                start, end = map(int, col_type[len("random_unique_int_"):].split("_"))
-                unique_ids = random.sample(range(start, end + 1), num_rows)
-
-        for i in range(num_rows):
-            row = {}
-            for col_name, col_type in columns.items():
-                if col_type == "int_sequence":
-                    row[col_name] = i + 1
-                elif col_type == "random_int_1000_1100":
-                    row[col_name] = random.randint(1000, 1100)
-                elif col_type == "random_int_200_250":
-                    row[col_name] = random.randint(200, 250)
-                elif col_type == "random_int_1_10":
-                    row[col_name] = random.randint(1, 10)
-                elif col_type == "datetime_now_minus_random_minutes_0_100000":
-                    row[col_name] = base_time - timedelta(minutes=random.randint(0, 100000))
-                elif col_type.startswith("random_unique_int_"):
-                    row[col_name] = unique_ids[i]
-                else:
-                    raise ValueError(f"Unsupported column type: {col_type}")
-            data.append(row)
-
-        df = pd.DataFrame(data)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        df.to_csv(path, index=False, encoding='utf-8')
-        logging.info(f"Generated mock data saved to {path} with {num_rows} rows.")
-
+        paths = generate_mock_dataset(
+            path,
+            dataset["columns"],
+            num_rows,
+            seed=dataset.get("seed"),
+            block_size=dataset.get("block_size", 1_000_000),
+            shards=dataset.get("shards", 1),
+            workers=dataset.get("workers", 1),
+            file_format=dataset.get("format", "csv"),
+        )
+        logging.info(f"Generated mock data saved to {', '.join(paths)} with {num_rows} rows.")
 
 
 def setup_logging(config):
@@ -116,6 +100,41 @@ def setup_logging(config):
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
+
+@contextmanager
+def forward_worker_logs():
+    """
+    Forward the log records of worker processes to the handlers of this process.
+
+    Workers must not open the rotating log file themselves: each would rotate it on its own. They send
+    their records through the yielded queue instead (see setup_worker_logging), and a listener thread
+    hands them to this process' handlers until the block exits.
+
+    Yields:
+        multiprocessing.Queue: Queue to pass to setup_worker_logging, e.g. as a process_pool initarg.
+    """
+    queue = pool_context().Queue()
+    listener = QueueListener(queue, *logging.getLogger().handlers, respect_handler_level=True)
+    listener.start()
+    try:
+        yield queue
+    finally:
+        listener.stop()
+        queue.close()
+
+
+def setup_worker_logging(queue, config):
+    """
+    Configure logging in a worker process to send its records to the parent through queue
+    (process_pool initializer, see forward_worker_logs).
+    """
+    log_level_str = config.get('logging', {}).get('level', 'INFO').upper()
+    logger = logging.getLogger()
+    logger.setLevel(getattr(logging, log_level_str, logging.INFO))
+    if logger.hasHandlers():
+        logger.handlers.clear()
+    logger.addHandler(QueueHandler(queue))
+
 def infer_pg_type(series):
     """
     Infer the corresponding PostgreSQL data type from a pandas Series dtype.
@@ -222,11 +241,10 @@ def sync_dataframe_with_table_schema(df, engine, schema, table_name):
     Returns:
         pd.DataFrame: The updated DataFrame, with columns added to match the database schema.
     """
-    metadata = MetaData(schema=schema)
-    # Reflect the target table metadata from the database
-    table = Table(table_name, metadata, autoload_with=engine)
-    db_columns = {col.name for col in table.columns}  # Columns existing in the DB table
-    df_columns = set(df.columns)                      # Columns present in the DataFrame
+    # Target table metadata, reflected once per process and shared with align_types_df_to_db_schema
+    table_metadata = get_table_metadata(engine, schema, table_name)
+    db_columns = set(table_metadata["columns"])  # Columns existing in the DB table
+    df_columns = set(df.columns)                 # Columns present in the DataFrame
 
     # Exclude DB-managed columns, e.g. auto-increment id
     ignored_columns = {'id'}
@@ -241,11 +259,8 @@ def sync_dataframe_with_table_schema(df, engine, schema, table_name):
         df[col] = ''
         logging.info(f"Column '{col}' was missing in DataFrame and was added with null values.")
 
-    # Refresh db_columns set to include newly added ones (if done in prior executions)
-    inspector = inspect(engine)
-    existing_db_columns = set([col["name"] for col in inspector.get_columns(table_name, schema=schema)])
-
     # Add missing columns to the database table based on DataFrame columns
+    existing_db_columns = set(table_metadata["columns"])
     missing_in_db = df_columns - existing_db_columns
     for col in missing_in_db:
         try:
@@ -263,18 +278,58 @@ def sync_dataframe_with_table_schema(df, engine, schema, table_name):
                 if logging.getLogger().isEnabledFor(logging.DEBUG):
                     logging.debug(traceback.format_exc())
 
+    if missing_in_db:
+        # The table definition changed (or may have): force the next lookup to reflect it again
+        invalidate_table_metadata(engine, schema, table_name)
+
     return df
 
 
 
 
 
+def sync_table_columns(engine, source_schema, source_table, target_schema, target_table):
+    """
+    Add to a target table the columns of a source table it does not have yet, entirely in SQL.
+
+    This is the table-to-table counterpart of sync_dataframe_with_table_schema, used before merging a
+    staging table into its target so new source columns reach the target without reading the rows
+    back into pandas. The new columns take the source column types.
+
+    Parameters:
+        engine (sqlalchemy.Engine): SQLAlchemy engine connected to the PostgreSQL database.
+        source_schema (str): Schema of the staging table.
+        source_table (str): Name of the staging table.
+        target_schema (str): Schema of the target table.
+        target_table (str): Name of the target table.
+
+    Returns:
+        list of str: Columns added to the target table.
+    """
+    source_types = get_table_metadata(engine, source_schema, source_table)["type_strings"]
+    target_columns = set(get_table_metadata(engine, target_schema, target_table)["columns"])
+
+    # Columns managed by the database, e.g. auto-increment id
+    ignored_columns = {'id'}
+    missing_in_target = [col for col in source_types if col not in target_columns and col not in ignored_columns]
+    if not missing_in_target:
+        return []
+
+    with engine.begin() as conn:
+        for col in missing_in_target:
+            conn.execute(text(f'ALTER TABLE "{target_schema}"."{target_table}" '
+                              f'ADD COLUMN IF NOT EXISTS "{col}" {source_types[col]}'))
+            logging.info(f"Column '{col}' added to {target_schema}.{target_table} with type {source_types[col]}.")
+    invalidate_table_metadata(engine, target_schema, target_table)
+    return missing_in_target
+
+
 def align_types_df_to_db_schema(df, engine, schema, table_name):
     """
     Align the data types of a pandas DataFrame's columns to match the PostgreSQL table schema.
 
-    This function inspects the PostgreSQL table's column types and attempts to cast
-    the corresponding DataFrame columns to compatible pandas data types. Columns in the DataFrame
+    This function looks up the cached cast plan of the PostgreSQL table (see utils.schema_cache) and
+    casts the corresponding DataFrame columns to compatible pandas data types. Columns in the DataFrame
     that do not exist in the database schema are skipped with a warning.
 
     Parameters:
@@ -286,40 +341,24 @@ def align_types_df_to_db_schema(df, engine, schema, table_name):
     Returns:
         pd.DataFrame: The DataFrame with columns cast to types aligned with the database schema.
     """
-    metadata = MetaData(schema=schema)
-    # Reflect the table metadata from the database
-    table = Table(table_name, metadata, autoload_with=engine)
-
-    # Get the set of column names from the DB table
-    db_column_names = {col.name for col in table.columns}
+    # Column cast kinds, computed once per table and cached with its metadata
+    table_metadata = get_table_metadata(engine, schema, table_name)
+    cast_plan = table_metadata["cast_plan"]
 
     # Iterate over DataFrame columns to align types
     for col in df.columns:
-        if col not in db_column_names:
+        if col not in cast_plan:
             logging.warning(f"Column '{col}' not found in DB metadata. Skipping type alignment.")
             continue
 
-        # Get the DB column type as string for matching
-        db_type = table.columns[col].type
+        if is_aligned(df[col], cast_plan[col]):
+            # Already parsed into the target dtype (typed CSV read)
+            continue
+
         try:
-            db_type_str = str(db_type).upper()
-            if 'INT' in db_type_str:
-                # Cast to pandas nullable integer type
-                df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
-            elif 'FLOAT' in db_type_str or 'DOUBLE' in db_type_str or 'NUMERIC' in db_type_str:
-                # Cast to float
-                df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
-            elif 'DATE' in db_type_str or 'TIME' in db_type_str:
-                # Cast to datetime
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-            elif 'BOOL' in db_type_str:
-                # Cast to boolean
-                df[col] = df[col].astype(bool)
-            else:
-                # Default to string type
-                df[col] = df[col].astype(str)
+            df[col] = CASTS[cast_plan[col]](df[col])
         except Exception as e:
-            logging.warning(f"Could not cast column '{col}' to type {db_type}: {e}")
+            logging.warning(f"Could not cast column '{col}' to type {table_metadata['types'][col]}: {e}")
 
     return df
 